@@ -5,16 +5,27 @@ from flask_migrate import Migrate
 from dotenv import load_dotenv   
 import os                       
 
+from . import db_pool, metrics
+from .db_pool import engine_options, load_pool_config
+from instance.database import bind_engine
+
 db = SQLAlchemy()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Войдите в систему'
 login_manager.login_message_category = 'warning'
 
-def create_app():
+def create_app(test_config=None):
+    """Build the app. Nothing connects to the database here: the engine is
+    created lazily and opens connections on first use (after a prefork
+    server has forked). One-time setup is `flask init-db`.
+
+    test_config overrides the configuration and skips reading .env.
+    """
     app = Flask(__name__, instance_relative_config=True)
-    
-    load_dotenv()
+
+    if test_config is None:
+        load_dotenv()
 
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'super-secret-2025')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
@@ -22,8 +33,21 @@ def create_app():
     # URL to Metabase (optional). If set, templates can show a link to Metabase UI.
     # Default opens the databases view for the local Postgres datasource.
     app.config['METABASE_URL'] = os.getenv('METABASE_URL', 'http://localhost:3000/browse/databases/2-postgres')
+    # werkzeug hash method for new passwords, see passwords.py
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    if test_config is not None:
+        app.config.update(test_config)
+
+    # one tuned pool per process, shared with the legacy SessionLocal
+    load_pool_config(app.config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    db_pool.wait_warn_seconds = app.config['DB_POOL_WAIT_WARN_MS'] / 1000.0
 
     db.init_app(app)
+    with app.app_context():
+        bind_engine(db.engine)
+        # per-request SQL counters and /metrics
+        metrics.init_app(app, db.engine)
     migrate = Migrate(app, db)
     login_manager.init_app(app)
 
@@ -36,11 +60,19 @@ def create_app():
     app.register_blueprint(docs_bp)
     app.register_blueprint(people_bp)
 
+    from .cli import clients_cli, orders_cli, init_db_command
+    app.cli.add_command(clients_cli)
+    app.cli.add_command(orders_cli)
+    app.cli.add_command(init_db_command)
+
     from .models.user import User
-    
+    from . import user_cache
+    user_cache.register_events(User)
+
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # id/username/role from a per-process cache, see user_cache
+        return user_cache.load_user(user_id)
 
     # expose some config to templates (e.g. METABASE_URL)
     @app.context_processor
@@ -49,4 +81,8 @@ def create_app():
             'metabase_url': app.config.get('METABASE_URL')
         }
 
+    # sampling cProfile of requests, off unless PROFILE_* is set
+    from . import profiling
+    profiling.install(app)
+
     return app
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""Flask CLI commands for maintaining the legacy tables (practic2, order2).
+
+Run them with the app from run.py, e.g.:
+
+    flask --app run.py init-db
+    flask --app run.py clients backfill-phones
+    flask --app run.py clients dedup [--merge]
+    flask --app run.py orders build-links
+"""
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+clients_cli = AppGroup('clients', help='Обслуживание таблицы клиентов practic2.')
+orders_cli = AppGroup('orders', help='Обслуживание таблицы заказов order2.')
+
+
+@click.command('init-db')
+@click.option('--admin-password', default='12345', show_default=True, help='Пароль администратора, если его ещё нет.')
+def init_db_command(admin_password):
+    """Создать таблицы моделей и администратора (admin) при первом запуске."""
+    from . import db
+    from .models.user import User
+    from .passwords import hash_password
+
+    db.create_all()
+    if not User.query.filter_by(username='admin').first():
+        admin = User(username='admin', password=hash_password(admin_password), role='admin')
+        db.session.add(admin)
+        db.session.commit()
+        click.echo(f'Админ создан → логин: admin | пароль: {admin_password}')
+    else:
+        click.echo('Таблицы созданы, администратор уже есть')
+
+
+def _backfill_phone_digits(db, table, key_col, source_col, batch_size):
+    """Recompute phone_digits from source_col in key ranges of batch_size rows.
+
+    Only rows whose stored value differs are rewritten, so the command is
+    cheap to re-run. Each batch is committed separately to keep locks short.
+    Returns the number of updated rows.
+    """
+    digits_expr = f"regexp_replace(COALESCE(\"{source_col}\"::text, ''), '\\D', '', 'g')"
+    updated = 0
+    last = None
+    while True:
+        # keys of legacy tables may be text, so the first range has no lower
+        # bound instead of assuming a numeric zero
+        lower = f'"{key_col}" > :last' if last is not None else 'TRUE'
+        upper = db.session.execute(db.text(f'''
+            SELECT max(k) FROM (
+                SELECT "{key_col}" AS k FROM {table}
+                WHERE {lower}
+                ORDER BY "{key_col}" LIMIT :batch
+            ) s
+        '''), {'last': last, 'batch': batch_size}).scalar()
+        if upper is None:
+            break
+        updated += db.session.execute(db.text(f'''
+            UPDATE {table} SET phone_digits = {digits_expr}
+            WHERE {lower} AND "{key_col}" <= :upper
+              AND phone_digits IS DISTINCT FROM {digits_expr}
+        '''), {'last': last, 'upper': upper}).rowcount
+        db.session.commit()
+        last = upper
+    return updated
+
+
+@clients_cli.command('backfill-phones')
+@click.option('--batch-size', default=5000, show_default=True, help='Строк в одной транзакции.')
+def backfill_phones(batch_size):
+    """Заполнить phone_digits в practic2 и order2 для уже существующих строк."""
+    from .routes.order_schema import get_order_schema
+
+    db = current_app.extensions['sqlalchemy']
+    n = _backfill_phone_digits(db, 'practic2', 'id', 'Номер_телефона', batch_size)
+    click.echo(f'practic2: обновлено {n} строк')
+
+    schema = get_order_schema(db)
+    client_col, pk_col = schema.client_col, schema.pk_col
+    if not client_col or not pk_col:
+        click.echo('order2: не найдены колонка клиента или первичный ключ, пропущено')
+        return
+    n = _backfill_phone_digits(db, 'order2', pk_col, client_col, batch_size)
+    click.echo(f'order2: обновлено {n} строк')
+
+
+@clients_cli.command('dedup')
+@click.option('--merge', is_flag=True, help='Объединить найденные дубликаты (иначе только отчёт).')
+@click.option('--max-block', default=200, show_default=True,
+              help='Пропускать группы кандидатов больше этого размера (например, общий телефон-заглушка).')
+@click.option('--show', default=20, show_default=True, help='Сколько групп дубликатов вывести.')
+def dedup(merge, max_block, show):
+    """Найти дубликаты клиентов в practic2 (совпадают хотя бы два из ФИО, телефона, почты, даты рождения)."""
+    from .routes.people_dedup import find_duplicates, merge_cluster
+
+    db = current_app.extensions['sqlalchemy']
+    report = find_duplicates(db, max_block=max_block)
+    for block, key, size in report.skipped_blocks:
+        click.echo(f'пропущена группа {block}={key!r}: {size} строк (больше --max-block)')
+    extra = sum(len(ids) - 1 for ids in report.clusters)
+    click.echo(f'групп дубликатов: {len(report.clusters)}, лишних строк: {extra}')
+    for ids in report.clusters[:show]:
+        click.echo(f'  {ids[0]} ← {", ".join(map(str, ids[1:]))}')
+    if len(report.clusters) > show:
+        click.echo(f'  … ещё {len(report.clusters) - show}')
+    if not merge:
+        return
+
+    merged = deleted = 0
+    for ids in report.clusters:
+        try:
+            n = merge_cluster(db, ids)
+        except Exception as e:
+            current_app.logger.exception('dedup: merge of %s failed', ids)
+            click.echo(f'ошибка объединения {ids}: {e}', err=True)
+            continue
+        if n:
+            merged += 1
+            deleted += n
+    click.echo(f'объединено групп: {merged}, удалено строк: {deleted}')
+
+
+@orders_cli.command('build-links')
+@click.option('--rebuild', is_flag=True, help='Пересчитать все найденные связи, а не только для новых заказов.')
+def build_links(rebuild):
+    """Сопоставить заказы order2 с клиентами practic2 (таблица order_client_link)."""
+    from .routes.order_links import link_orders
+
+    db = current_app.extensions['sqlalchemy']
+    added = link_orders(db, rebuild=rebuild)
+    db.session.commit()
+    click.echo(f'order_client_link: добавлено {added} связей')
+
+
+@orders_cli.command('sync-seq')
+def sync_seq():
+    """Создать/подвинуть последовательность номеров заказов за максимальный номер в order2."""
+    from .routes.order_numbers import SEQUENCE, sync_sequence
+    from .routes.order_schema import get_order_schema
+
+    db = current_app.extensions['sqlalchemy']
+    schema = get_order_schema(db)
+    id_column = schema.id_column or schema.pk_col
+    if not id_column:
+        click.echo('order2: не найдена колонка номера заказа, пропущено')
+        return
+    next_value = sync_sequence(db, id_column)
+    db.session.commit()
+    click.echo(f'{SEQUENCE}: следующий номер {next_value} (колонка {id_column})')
@@ -0,0 +1,25 @@
+"""Helpers for settings that live in app.config with environment defaults.
+
+Modules with their own settings (db_pool, metrics, profiling, ...) keep a
+dict of defaults and fill app.config from it with load_defaults(): an
+explicit value (test_config, code) wins, then the environment variable of
+the same name, then the default.
+"""
+import os
+from typing import Any, Dict, Mapping
+
+
+def env_value(name: str, default: Any) -> Any:
+    """Environment variable name converted to the type of default."""
+    raw = os.getenv(name)
+    if raw is None or raw == '':
+        return default
+    if isinstance(default, bool):
+        return raw.strip().lower() in ('1', 'true', 'yes', 'on')
+    return type(default)(raw)
+
+
+def load_defaults(config: Dict[str, Any], defaults: Mapping[str, Any]) -> None:
+    """Fill the keys of defaults in config from the environment, keeping explicit values."""
+    for name, default in defaults.items():
+        config.setdefault(name, env_value(name, default))
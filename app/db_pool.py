@@ -0,0 +1,119 @@
+"""Connection pool settings and checkout timing for the single app engine.
+
+Flask-SQLAlchemy's engine is the only engine in the process; the legacy
+SessionLocal from instance/database.py is bound to it (see create_app).
+Pool settings come from app.config, with environment defaults:
+
+    DB_POOL_SIZE          pool_size            (default 5)
+    DB_MAX_OVERFLOW       max_overflow         (default 10)
+    DB_POOL_TIMEOUT       pool_timeout, sec    (default 30)
+    DB_POOL_PRE_PING      pool_pre_ping        (default on)
+    DB_POOL_RECYCLE       pool_recycle, sec    (default 1800, -1 = off)
+    DB_POOL_WAIT_WARN_MS  log a warning when a checkout waits longer
+
+Time spent waiting for a free connection is measured in TimedQueuePool and
+kept in pool_stats() so it can be logged and exported.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Mapping
+
+from sqlalchemy.pool import QueuePool
+
+from .config import load_defaults
+
+logger = logging.getLogger(__name__)
+
+_DEFAULTS = {
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_PRE_PING': True,
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_WAIT_WARN_MS': 100,
+}
+
+
+def load_pool_config(config: Dict[str, Any]) -> None:
+    """Fill the DB_POOL_* keys in config from the environment, keeping explicit values."""
+    load_defaults(config, _DEFAULTS)
+
+
+def engine_options(config: Mapping[str, Any]) -> Dict[str, Any]:
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database URI.
+
+    SQLite (tests, local experiments) keeps SQLAlchemy's own pool choice:
+    in-memory databases need a single shared connection.
+    """
+    uri = config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if uri.startswith('sqlite'):
+        return {}
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+    }
+
+
+class _WaitStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.waited = 0       # checkouts that had to wait for a connection
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+    def record(self, seconds: float, waited: bool) -> None:
+        with self.lock:
+            self.checkouts += 1
+            if waited:
+                self.waited += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'checkouts': self.checkouts,
+                'waited': self.waited,
+                'wait_seconds_total': self.total_wait,
+                'wait_seconds_max': self.max_wait,
+                'timeouts': self.timeouts,
+            }
+
+
+_stats = _WaitStats()
+# set from DB_POOL_WAIT_WARN_MS by create_app
+wait_warn_seconds = _DEFAULTS['DB_POOL_WAIT_WARN_MS'] / 1000.0
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that measures how long a checkout waits for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        # all connections (including overflow) busy: this checkout will block
+        busy = self._max_overflow >= 0 and self.checkedout() >= self.size() + self._max_overflow
+        try:
+            return super()._do_get()
+        except Exception:
+            with _stats.lock:
+                _stats.timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            _stats.record(elapsed, busy)
+            if elapsed >= wait_warn_seconds:
+                logger.warning('DB pool: waited %.1f ms for a connection (%s)', elapsed * 1000, self.status())
+            else:
+                logger.debug('DB pool: checkout in %.1f ms', elapsed * 1000)
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Checkout counters since process start."""
+    return _stats.as_dict()
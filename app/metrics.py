@@ -0,0 +1,263 @@
+"""Per-request SQL statistics and a Prometheus text endpoint.
+
+Cursor events on the app engine count every statement a request runs
+(including fallback and retry queries), add up their time and remember
+the slowest one; the numbers are in g.sql_stats during the request. When
+the response has been sent (after a streamed body too) they go into
+per-process counters and histograms that /metrics exposes in Prometheus
+text format, together with pool_stats() and the search cache counters.
+
+    SQL_QUERY_WARN_COUNT  warn when one request runs more statements than
+                          this, usually an N+1 loop (default 50, 0 = off)
+    METRICS_ENABLED       serve /metrics at all (default off: 404)
+    METRICS_TOKEN         if set, /metrics requires "Authorization: Bearer <token>"
+    METRICS_ALLOW_IPS     without a token, the client addresses allowed to
+                          scrape (default "127.0.0.1,::1"; behind a proxy
+                          this is the proxy's address unless ProxyFix is used)
+
+Counters are per worker process; Prometheus adds the workers up when each
+is scraped (or use one worker per scrape target).
+"""
+import hmac
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from .config import load_defaults
+from .db_pool import pool_stats
+
+_DEFAULTS = {
+    'SQL_QUERY_WARN_COUNT': 50,
+    'METRICS_ENABLED': False,
+    'METRICS_TOKEN': '',
+    'METRICS_ALLOW_IPS': '127.0.0.1,::1',
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+# longest statement text kept as "slowest"
+STATEMENT_MAX_LEN = 300
+
+
+class SqlStats:
+    """Statements run by one request."""
+
+    __slots__ = ('count', 'seconds', 'slowest_seconds', 'slowest')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest: Optional[str] = None
+
+    def add(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest = statement
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, buckets: Tuple[float, ...], value: float) -> None:
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.latency: Dict[str, _Histogram] = {}
+        self.queries: Dict[str, _Histogram] = {}
+        self.db_seconds: Dict[str, float] = {}
+        self.n_plus_one: Dict[str, int] = {}
+
+    def record(self, endpoint: str, method: str, status: str, seconds: float,
+               sql: SqlStats, warned: bool) -> None:
+        with self.lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.setdefault(endpoint, _Histogram(LATENCY_BUCKETS)).observe(LATENCY_BUCKETS, seconds)
+            self.queries.setdefault(endpoint, _Histogram(QUERY_COUNT_BUCKETS)).observe(QUERY_COUNT_BUCKETS, sql.count)
+            self.db_seconds[endpoint] = self.db_seconds.get(endpoint, 0.0) + sql.seconds
+            if warned:
+                self.n_plus_one[endpoint] = self.n_plus_one.get(endpoint, 0) + 1
+
+    def clear(self) -> None:
+        with self.lock:
+            for store in (self.requests, self.latency, self.queries, self.db_seconds, self.n_plus_one):
+                store.clear()
+
+
+_registry = _Registry()
+
+
+def _label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name: str, label: str, value: str, h: _Histogram, buckets) -> List[str]:
+    lines = [f'{name}_bucket{{{label}="{_label(value)}",le="{b:g}"}} {c}' for b, c in zip(buckets, h.counts)]
+    lines.append(f'{name}_bucket{{{label}="{_label(value)}",le="+Inf"}} {h.count}')
+    lines.append(f'{name}_sum{{{label}="{_label(value)}"}} {h.sum:.6f}')
+    lines.append(f'{name}_count{{{label}="{_label(value)}"}} {h.count}')
+    return lines
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    from .routes import search_cache
+
+    out: List[str] = []
+
+    def metric(name: str, kind: str, help_text: str, lines: List[str]) -> None:
+        out.append(f'# HELP {name} {help_text}')
+        out.append(f'# TYPE {name} {kind}')
+        out.extend(lines)
+
+    r = _registry
+    with r.lock:
+        metric('http_requests_total', 'counter', 'Requests by endpoint, method and status.', [
+            f'http_requests_total{{endpoint="{_label(e)}",method="{m}",status="{s}"}} {n}'
+            for (e, m, s), n in sorted(r.requests.items())])
+        lines: List[str] = []
+        for e, h in sorted(r.latency.items()):
+            lines += _histogram_lines('http_request_duration_seconds', 'endpoint', e, h, LATENCY_BUCKETS)
+        metric('http_request_duration_seconds', 'histogram', 'Request time until the response was sent.', lines)
+        lines = []
+        for e, h in sorted(r.queries.items()):
+            lines += _histogram_lines('db_queries_per_request', 'endpoint', e, h, QUERY_COUNT_BUCKETS)
+        metric('db_queries_per_request', 'histogram', 'SQL statements per request.', lines)
+        metric('db_queries_total', 'counter', 'SQL statements run by requests.', [
+            f'db_queries_total{{endpoint="{_label(e)}"}} {h.sum:.0f}' for e, h in sorted(r.queries.items())])
+        metric('db_query_seconds_total', 'counter', 'Time spent in SQL statements by requests.', [
+            f'db_query_seconds_total{{endpoint="{_label(e)}"}} {s:.6f}' for e, s in sorted(r.db_seconds.items())])
+        metric('db_query_count_warnings_total', 'counter',
+               'Requests over SQL_QUERY_WARN_COUNT statements (likely N+1).', [
+                   f'db_query_count_warnings_total{{endpoint="{_label(e)}"}} {n}'
+                   for e, n in sorted(r.n_plus_one.items())])
+
+    pool = pool_stats()
+    metric('db_pool_checkouts_total', 'counter', 'Connection pool checkouts.', [f'db_pool_checkouts_total {pool["checkouts"]}'])
+    metric('db_pool_waits_total', 'counter', 'Checkouts that waited for a free connection.', [f'db_pool_waits_total {pool["waited"]}'])
+    metric('db_pool_wait_seconds_total', 'counter', 'Time spent in checkouts.', [f'db_pool_wait_seconds_total {pool["wait_seconds_total"]:.6f}'])
+    metric('db_pool_wait_seconds_max', 'gauge', 'Longest checkout.', [f'db_pool_wait_seconds_max {pool["wait_seconds_max"]:.6f}'])
+    metric('db_pool_timeouts_total', 'counter', 'Checkouts that timed out.', [f'db_pool_timeouts_total {pool["timeouts"]}'])
+
+    cache = search_cache.stats()
+    metric('people_search_cache_hits_total', 'counter', 'search_people cache hits.', [f'people_search_cache_hits_total {cache["hits"]}'])
+    metric('people_search_cache_misses_total', 'counter', 'search_people cache misses.', [f'people_search_cache_misses_total {cache["misses"]}'])
+    metric('people_search_cache_entries', 'gauge', 'search_people cache size.', [f'people_search_cache_entries {cache["size"]}'])
+    return '\n'.join(out) + '\n'
+
+
+def clear() -> None:
+    _registry.clear()
+
+
+# ——— hooks ———
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _record(conn, statement: Optional[str]) -> None:
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    started = starts.pop()
+    if not has_request_context():
+        return  # CLI commands, background import jobs
+    stats = g.get('sql_stats')
+    if stats is not None:
+        stats.add(statement, time.perf_counter() - started)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _record(conn, statement)
+
+
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute; it still costs
+    # a round trip (e.g. the probes that fall back when a table is missing)
+    if exception_context.connection is not None and exception_context.execution_context is not None:
+        _record(exception_context.connection, exception_context.statement)
+
+
+def _start_request():
+    g.sql_stats = SqlStats()
+    g.request_started = time.perf_counter()
+
+
+def _finish_request(response):
+    stats = g.get('sql_stats')
+    if stats is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    method, started = request.method, g.request_started
+    app = current_app._get_current_object()
+    limit = app.config.get('SQL_QUERY_WARN_COUNT') or 0
+
+    def done():
+        # runs once the body has been sent, so a streamed page counts in full
+        warned = bool(limit) and stats.count > limit
+        if warned:
+            app.logger.warning('%s ran %d SQL statements (%.1f ms), likely N+1; slowest %.1f ms: %s',
+                               endpoint, stats.count, stats.seconds * 1000, stats.slowest_seconds * 1000,
+                               _shorten(stats.slowest))
+        else:
+            app.logger.debug('%s: %d SQL statements, %.1f ms', endpoint, stats.count, stats.seconds * 1000)
+        _registry.record(endpoint, method, str(response.status_code), time.perf_counter() - started, stats, warned)
+
+    response.call_on_close(done)
+    return response
+
+
+def _shorten(statement: Optional[str]) -> str:
+    text = re.sub(r'\s+', ' ', statement or '').strip()
+    return text if len(text) <= STATEMENT_MAX_LEN else text[:STATEMENT_MAX_LEN] + '…'
+
+
+def _allowed() -> bool:
+    config = current_app.config
+    token = config.get('METRICS_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    allowed = {ip.strip() for ip in (config.get('METRICS_ALLOW_IPS') or '').split(',') if ip.strip()}
+    return request.remote_addr in allowed
+
+
+def metrics_view():
+    if not current_app.config.get('METRICS_ENABLED'):
+        abort(404)
+    if not _allowed():
+        return Response('Unauthorized\n', 401, mimetype='text/plain')
+    return Response(render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app, engine) -> None:
+    """Register the cursor events on engine, the request hooks and /metrics."""
+    load_defaults(app.config, _DEFAULTS)
+    for name, fn in (('before_cursor_execute', _before_cursor_execute),
+                     ('after_cursor_execute', _after_cursor_execute),
+                     ('handle_error', _handle_error)):
+        if not event.contains(engine, name, fn):
+            event.listen(engine, name, fn)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
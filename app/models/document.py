@@ -2,6 +2,12 @@ from datetime import datetime
 from .. import db
 
 class Document(db.Model):
+    # the documents list is ordered by created_at, optionally for one owner
+    __table_args__ = (
+        db.Index('ix_document_created_at', 'created_at'),
+        db.Index('ix_document_owner_created', 'owner_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     full_name = db.Column(db.String(150), nullable=False)
     birth_date = db.Column(db.Date, nullable=False)
@@ -9,7 +15,8 @@ class Document(db.Model):
     email = db.Column(db.String(120))
     address = db.Column(db.Text)
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # NOT NULL: the list pages by (created_at, id), see routes/documents.py
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.func.now())
     
     owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
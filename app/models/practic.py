@@ -13,4 +13,6 @@ class Person(Base):
     Дата_рождения = Column(Date)
     Номер_телефона = Column(String, name="Номер телефона")
     Почта = Column(String)
-    Примечания = Column(String)
\ No newline at end of file
+    Примечания = Column(String)
+    # только цифры номера телефона, заполняется при записи (см. backfill-phones)
+    phone_digits = Column(String)
\ No newline at end of file
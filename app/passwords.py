@@ -0,0 +1,65 @@
+"""Password hashing with a configurable cost and rehash on login.
+
+PASSWORD_HASH_METHOD is a werkzeug method string, e.g. "scrypt" (the
+werkzeug default, scrypt:32768:8:1), "scrypt:16384:8:1" or
+"pbkdf2:sha256:600000". Stored hashes carry their own parameters, so old
+hashes keep working; after a successful login a hash made with other
+parameters is replaced by one with the configured method.
+
+Verification is CPU-bound. It runs on a small shared thread pool
+(PASSWORD_HASH_WORKERS, default: number of CPUs), which only limits how
+many hashes a process computes at once: a burst of logins queues on the
+pool instead of occupying every CPU. The request thread still waits for
+its result, so a login is not faster and holds its thread meanwhile.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt'
+
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_method_prefixes: Dict[str, str] = {}
+
+
+def hash_method() -> str:
+    return current_app.config.get('PASSWORD_HASH_METHOD') or DEFAULT_METHOD
+
+
+def hash_password(password: str) -> str:
+    return generate_password_hash(password, method=hash_method())
+
+
+def _method_prefix(method: str) -> str:
+    """Full parameter string werkzeug writes for method ("scrypt" -> "scrypt:32768:8:1")."""
+    prefix = _method_prefixes.get(method)
+    if prefix is None:
+        prefix = generate_password_hash('', method=method).split('$', 1)[0]
+        _method_prefixes[method] = prefix
+    return prefix
+
+
+def needs_rehash(stored_hash: str) -> bool:
+    """True if stored_hash was made with other parameters than the configured method."""
+    return stored_hash.split('$', 1)[0] != _method_prefix(hash_method())
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            workers = current_app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1
+            _executor = ThreadPoolExecutor(max_workers=int(workers), thread_name_prefix='pwhash')
+        return _executor
+
+
+def verify_password(stored_hash: Optional[str], password: Optional[str]) -> bool:
+    """check_password_hash on the hashing pool; blocks until it is done."""
+    if not stored_hash or password is None:
+        return False
+    return _get_executor().submit(check_password_hash, stored_hash, password).result()
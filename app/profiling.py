@@ -0,0 +1,184 @@
+"""Sampling cProfile middleware.
+
+Profiles a fraction of requests, or every request to selected endpoints,
+and writes one pstats file per request to PROFILE_DIR/<endpoint>/. Only
+the newest PROFILE_KEEP files per endpoint are kept. The files are read by
+scripts/prof_report.py (top functions, DOT call graph). Settings come from
+app.config, with environment defaults:
+
+    PROFILE_SAMPLE_RATE  fraction of requests to profile, 0..1 (default 0)
+    PROFILE_ENDPOINTS    comma-separated endpoints that are always profiled,
+                         e.g. "people.get_people,people.view_orders"
+    PROFILE_DIR          output directory (default: <instance>/profiles)
+    PROFILE_KEEP         files kept per endpoint (default 50)
+
+The middleware is installed only when a rate or an endpoint is set. A
+streamed body is profiled while it is sent, so the file covers the whole
+response. cProfile sees only the thread that handles the request.
+
+One request per process is profiled at a time: from Python 3.12 cProfile
+registers process-wide and enable() raises ValueError while another
+profiler is active. A request picked while another one is being profiled,
+or while some other profiler runs, is served without profiling.
+"""
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional
+
+from werkzeug.exceptions import HTTPException
+
+from .config import load_defaults
+
+logger = logging.getLogger(__name__)
+
+_DEFAULTS = {
+    'PROFILE_SAMPLE_RATE': 0.0,
+    'PROFILE_ENDPOINTS': '',
+    'PROFILE_DIR': '',
+    'PROFILE_KEEP': 50,
+}
+
+
+# held from the first enable() of a profiled request until its body is closed
+_active = threading.Lock()
+
+
+@contextmanager
+def _enabled(profiler: cProfile.Profile):
+    """Profile the block; run it unprofiled if another profiler took over."""
+    try:
+        profiler.enable()
+    except ValueError:
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+
+def load_profile_config(config: Dict[str, Any]) -> None:
+    """Fill the PROFILE_* keys in config from the environment, keeping explicit values."""
+    load_defaults(config, _DEFAULTS)
+
+
+def _endpoint_set(value: Any) -> frozenset:
+    if isinstance(value, str):
+        value = value.split(',')
+    return frozenset(e.strip() for e in value or () if e and e.strip())
+
+
+def profiling_enabled(config: Dict[str, Any]) -> bool:
+    return bool(config.get('PROFILE_SAMPLE_RATE') or _endpoint_set(config.get('PROFILE_ENDPOINTS')))
+
+
+class ProfilerMiddleware:
+    """WSGI middleware around app.wsgi_app, see the module docstring."""
+
+    def __init__(self, wsgi_app, app):
+        self.wsgi_app = wsgi_app
+        self.url_map = app.url_map
+        self.rate = float(app.config.get('PROFILE_SAMPLE_RATE') or 0)
+        self.endpoints = _endpoint_set(app.config.get('PROFILE_ENDPOINTS'))
+        self.directory = app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+        self.keep = int(app.config.get('PROFILE_KEEP') or _DEFAULTS['PROFILE_KEEP'])
+        self._lock = threading.Lock()
+
+    def _endpoint(self, environ) -> Optional[str]:
+        try:
+            endpoint, _args = self.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None  # 404 / 405 / redirects: nothing worth profiling
+        return endpoint
+
+    def __call__(self, environ, start_response):
+        endpoint = self._endpoint(environ)
+        if endpoint is None or not (endpoint in self.endpoints or random.random() < self.rate):
+            return self.wsgi_app(environ, start_response)
+
+        if not _active.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            _active.release()
+            logger.debug('profiling: another profiler is active, %s not profiled', endpoint)
+            return self.wsgi_app(environ, start_response)
+        try:
+            body = self.wsgi_app(environ, start_response)
+        except BaseException:
+            profiler.disable()
+            _active.release()
+            raise
+        profiler.disable()
+
+        def done():
+            try:
+                self._save(profiler, endpoint, time.perf_counter() - started)
+            finally:
+                _active.release()
+        return _ProfiledBody(body, profiler, done)
+
+    def _save(self, profiler, endpoint: str, elapsed: float) -> None:
+        directory = os.path.join(self.directory, endpoint)
+        # time first: files sort by age, the elapsed ms makes slow ones easy to spot
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{int(time.time() * 1e6) % 1000000:06d}-{os.getpid()}-{elapsed * 1000:.0f}ms.prof'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(directory, name))
+            with self._lock:
+                self._rotate(directory)
+        except OSError:
+            logger.exception('profiling: cannot write %s', directory)
+
+    def _rotate(self, directory: str) -> None:
+        files = sorted(f for f in os.listdir(directory) if f.endswith('.prof'))
+        for old in files[:-self.keep]:
+            try:
+                os.remove(os.path.join(directory, old))
+            except OSError:
+                pass  # another process rotated it already
+
+
+class _ProfiledBody:
+    """Response iterable that keeps profiling while the body is produced and
+    calls done once the server closes it."""
+
+    def __init__(self, body: Iterable[bytes], profiler: cProfile.Profile, done):
+        self.body = body
+        self.profiler = profiler
+        self.done = done
+
+    def __iter__(self):
+        it = iter(self.body)
+        while True:
+            with _enabled(self.profiler):
+                try:
+                    chunk = next(it)
+                except StopIteration:
+                    return
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            if hasattr(self.body, 'close'):
+                with _enabled(self.profiler):
+                    self.body.close()
+        finally:
+            self.done()
+
+
+def install(app) -> None:
+    """Wrap app.wsgi_app when profiling is configured."""
+    load_profile_config(app.config)
+    if profiling_enabled(app.config):
+        app.wsgi_app = ProfilerMiddleware(app.wsgi_app, app)
+        logger.info('profiling: rate %s, endpoints %s', app.config['PROFILE_SAMPLE_RATE'],
+                    app.config['PROFILE_ENDPOINTS'] or '-')
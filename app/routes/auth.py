@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from ..models.user import User
+from ..passwords import hash_password, needs_rehash, verify_password
 from flask import current_app
 
 auth_bp = Blueprint('auth', __name__)
@@ -13,7 +13,15 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password, password):
+        if user and verify_password(user.password, password):
+            if needs_rehash(user.password):
+                # stored with older hash parameters: upgrade while we have the password
+                try:
+                    user.password = hash_password(password)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    current_app.logger.warning('password rehash failed for %s', username, exc_info=True)
             login_user(user)
             return redirect(url_for('people.get_people'))
         flash('Неверные данные', 'danger')
@@ -35,16 +43,18 @@ def change_password():
         current_password = request.form.get('current_password') or request.form.get('old_password')
         new_password = request.form.get('new_password')
         new_password2 = request.form.get('new_password2')
+        # current_user is a cached SessionUser without the hash; load the row
+        user = db.session.get(User, current_user.id)
 
         # Валидация полей
         if not current_password or not new_password or not new_password2:
             flash('Заполните все поля', 'danger')
-        elif not check_password_hash(current_user.password, current_password):
+        elif not verify_password(user.password, current_password):
             flash('Неверный текущий пароль', 'danger')
         elif new_password != new_password2:
             flash('Пароли не совпадают', 'danger')
         else:
-            current_user.password = generate_password_hash(new_password)
+            user.password = hash_password(new_password)
             db.session.commit()
             flash('Пароль изменён', 'success')
             return redirect(url_for('people.get_people'))
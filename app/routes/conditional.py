@@ -0,0 +1,113 @@
+"""ETag / Last-Modified for pages built from practic2 and order2.
+
+The 9d2c5a1e7f40 / e5a7c2b9d4f1 migrations keep a change counter per
+table in table_versions, bumped by a deferred trigger when a writing
+transaction commits (so writers do not queue on the counter row). A page
+decorated with @conditional('practic2', ...) gets an ETag made of those
+counters, the URL, the user and the build (APP_VERSION, or the code and
+templates on disk), so a refresh of an unchanged page is answered with
+304 after one primary-key read, before the view's own queries and before
+any template rendering, and a deploy never serves a cached old page. The
+counters are also left in g.table_versions for search_cache, whose keys
+include them: a result cached by another version is not reused.
+
+Pages are not cached when flash messages are waiting to be shown, and
+everything falls back to a normal response while table_versions does not
+exist.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from flask import current_app, g, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import bindparam, text
+
+_VERSIONS_SQL = text(
+    'SELECT table_name, version, changed_at FROM table_versions WHERE table_name IN :names'
+).bindparams(bindparam('names', expanding=True))
+
+
+def table_versions(db: Any, tables: Sequence[str]) -> Optional[Tuple[Tuple, Any]]:
+    """((table, version), ...) and the latest changed_at, or None if unavailable."""
+    try:
+        rows = db.session.execute(_VERSIONS_SQL, {'names': list(tables)}).fetchall()
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        current_app.logger.debug('table_versions unavailable', exc_info=True)
+        return None
+    if len(rows) != len(tables):
+        return None
+    versions = tuple(sorted((r[0], r[1]) for r in rows))
+    return versions, max(r[2] for r in rows)
+
+
+# app.root_path -> (digest, newest mtime) of the code and templates on disk
+_builds: Dict[str, Tuple[str, datetime]] = {}
+
+
+def _build(app: Any) -> Tuple[str, datetime]:
+    cached = _builds.get(app.root_path)
+    if cached is None:
+        digest, newest = hashlib.sha1(), 0
+        for root, dirs, files in os.walk(app.root_path):
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            for name in sorted(files):
+                if name.endswith(('.py', '.html')):
+                    path = os.path.join(root, name)
+                    st = os.stat(path)
+                    newest = max(newest, st.st_mtime)
+                    digest.update(f'{os.path.relpath(path, app.root_path)}:{st.st_size}:{st.st_mtime_ns};'.encode())
+        cached = _builds[app.root_path] = (digest.hexdigest()[:12], datetime.fromtimestamp(newest, timezone.utc))
+    return cached
+
+
+def build_id(app: Any) -> str:
+    """APP_VERSION if configured, else a digest of the app's files (code and templates)."""
+    return str(app.config.get('APP_VERSION') or _build(app)[0])
+
+
+def _etag(versions: Tuple) -> str:
+    user_id = current_user.get_id() if current_user.is_authenticated else ''
+    raw = repr((build_id(current_app), request.full_path, user_id, versions)).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()
+
+
+def conditional(*tables: str):
+    """Answer GET with 304 while none of tables changed since the client's copy."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            db = current_app.extensions['sqlalchemy']
+            state = table_versions(db, tables)
+            if state is None:
+                return view(*args, **kwargs)
+            versions, changed_at = state
+            # search_cache keys on these, so the body matches the ETag
+            g.table_versions = dict(versions)
+            # a deploy changes the page without touching the tables
+            changed_at = max(changed_at, _build(current_app)[1])
+            etag = _etag(versions)
+            # If-None-Match wins; If-Modified-Since only counts without it
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = since is not None and changed_at.replace(microsecond=0) <= since
+
+            response = make_response('', 304) if not_modified else make_response(view(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                response.last_modified = changed_at
+                # the browser must revalidate, and only it may keep the page
+                response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapped
+    return decorator
@@ -1,17 +1,78 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from flask import current_app
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
 from ..models.document import Document
+from .people_search import encode_cursor, decode_cursor
 from datetime import datetime
 
 docs_bp = Blueprint('docs', __name__, url_prefix='/documents')
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def _cursor_position(token):
+    """(created_at, id) from a page cursor, or None."""
+    cursor = decode_cursor(token)
+    if not cursor:
+        return None
+    try:
+        return datetime.fromisoformat(cursor[0]), cursor[1]
+    except ValueError:
+        return None
+
+
 @docs_bp.route('/')
 @login_required
 def index():
+    """Newest documents first, one keyset page per request.
+
+    Args: mine=1 (only the current user's documents), per_page, after /
+    before (cursors). One query per page: the owner is joined in, and the
+    (owner_id, created_at) / created_at indexes serve the order and limit.
+    """
     db = current_app.extensions['sqlalchemy']
-    documents = Document.query.all()
-    return render_template('documents.html', documents=documents)
+    mine = request.args.get('mine') == '1'
+    try:
+        per_page = int(request.args.get('per_page') or current_app.config.get('DOCUMENTS_PAGE_SIZE', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        per_page = DEFAULT_PAGE_SIZE
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+
+    after = _cursor_position(request.args.get('after'))
+    before = _cursor_position(request.args.get('before')) if not after else None
+
+    position = tuple_(Document.created_at, Document.id)
+    query = db.select(Document).options(joinedload(Document.owner))
+    if mine:
+        query = query.where(Document.owner_id == current_user.id)
+    if after:
+        query = query.where(position < after)
+    if before:
+        query = query.where(position > before).order_by(Document.created_at, Document.id)
+    else:
+        query = query.order_by(Document.created_at.desc(), Document.id.desc())
+    # one extra row tells whether there is another page
+    documents = db.session.execute(query.limit(per_page + 1)).scalars().all()
+
+    has_more = len(documents) > per_page
+    documents = documents[:per_page]
+    if before:
+        documents.reverse()
+    page = {'next': None, 'prev': None}
+    if documents:
+        first, last = documents[0], documents[-1]
+        if has_more or before:
+            page['next'] = encode_cursor(last.created_at.isoformat(), last.id)
+        if (has_more and before) or after:
+            page['prev'] = encode_cursor(first.created_at.isoformat(), first.id)
+
+    nav_args = {'mine': '1'} if mine else {}
+    if request.args.get('per_page'):
+        nav_args['per_page'] = per_page
+    return render_template('documents.html', documents=documents, page=page, mine=mine, nav_args=nav_args)
 
 @docs_bp.route('/create', methods=['GET', 'POST'])
 @login_required
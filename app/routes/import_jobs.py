@@ -0,0 +1,161 @@
+"""Background client imports.
+
+A large upload is saved to IMPORT_SPOOL_DIR (the system temp dir by
+default) and imported by a small in-process thread pool (IMPORT_WORKERS,
+default 2), so the request returns a job id at once instead of holding a web
+worker for the whole file. Progress is kept in memory and served by
+`/clients/import/<job_id>`.
+
+Jobs live in the process that accepted the upload: with several worker
+processes the status request has to reach the same process (sticky
+sessions) or, for a single-process deployment, it just works. Finished jobs
+are forgotten after IMPORT_JOB_TTL seconds (default 3600).
+"""
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+
+from . import search_cache
+from .people_import import (
+    DEFAULT_CHUNK_SIZE, ImportFileError, ImportResult, limit_rows, read_rows, run_import,
+)
+
+DEFAULT_WORKERS = 2
+DEFAULT_JOB_TTL = 3600
+
+
+class ImportJob:
+    """State of one background import, updated by the worker thread."""
+
+    def __init__(self, filename: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = 'queued'  # queued -> running -> done / failed
+        self.total: Optional[int] = None
+        self.processed = 0
+        self.success = 0
+        self.failed = 0
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+        self.message: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def update(self, result: ImportResult) -> None:
+        self.processed = result.processed
+        self.success = result.success
+        self.failed = result.failed
+        self.errors = list(result.errors)
+        self.warnings = list(result.warnings)
+
+    def finish(self, status: str, message: Optional[str] = None) -> None:
+        self.status = status
+        self.message = message
+        self.finished_at = time.time()
+
+    def to_dict(self, max_errors: int = 10) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'success': self.success,
+            'failed': self.failed,
+            'errors': self.errors[:max_errors],
+            'warnings': self.warnings[:max_errors],
+            'message': self.message,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+_lock = threading.Lock()
+_jobs: Dict[str, ImportJob] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            workers = int(current_app.config.get('IMPORT_WORKERS', DEFAULT_WORKERS) or DEFAULT_WORKERS)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import')
+        return _executor
+
+
+def _prune(ttl: int) -> None:
+    # caller holds _lock
+    now = time.time()
+    for job_id in [j.id for j in _jobs.values() if j.finished_at and now - j.finished_at > ttl]:
+        del _jobs[job_id]
+
+
+def submit(uploaded: Any, filename: str) -> ImportJob:
+    """Spool an uploaded file (werkzeug FileStorage) and queue its import."""
+    spool_dir = current_app.config.get('IMPORT_SPOOL_DIR') or None
+    if spool_dir:
+        os.makedirs(spool_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix='import-', suffix=os.path.splitext(filename)[1], dir=spool_dir)
+    with os.fdopen(fd, 'wb') as fh:
+        uploaded.save(fh)
+
+    job = ImportJob(filename)
+    with _lock:
+        _prune(current_app.config.get('IMPORT_JOB_TTL', DEFAULT_JOB_TTL))
+        _jobs[job.id] = job
+    try:
+        _get_executor().submit(_run, current_app._get_current_object(), job, path)
+    except Exception:
+        os.unlink(path)
+        with _lock:
+            _jobs.pop(job.id, None)
+        raise
+    current_app.logger.info('Import job %s queued for %s', job.id, filename)
+    return job
+
+
+def get_job(job_id: str) -> Optional[ImportJob]:
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def _run(app: Any, job: ImportJob, path: str) -> None:
+    with app.app_context():
+        db = app.extensions['sqlalchemy']
+        job.status = 'running'
+        try:
+            # rows are read from the spooled file as they are imported, so
+            # the total is only known at the end
+            with open(path, 'rb') as fh:
+                rows = limit_rows(read_rows(fh, job.filename), app.config.get('IMPORT_MAX_ROWS', 100000))
+                result = run_import(db, rows, app.config.get('IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE), job.update,
+                                    app.config.get('IMPORT_STRICT_VALIDATION', False))
+            db.session.commit()
+            job.total = result.processed
+            search_cache.invalidate()
+            job.update(result)
+            job.finish('done')
+            app.logger.info('Import job %s done: %s added, %s failed', job.id, result.success, result.failed)
+        except ImportFileError as e:
+            db.session.rollback()
+            job.success = 0
+            job.finish('failed', str(e))
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception('Import job %s failed', job.id)
+            # nothing was committed, so no row of the file is in the table
+            job.success = 0
+            job.finish('failed', f'Ошибка импорта: {e}')
+        finally:
+            db.session.remove()
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
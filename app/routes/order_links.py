@@ -0,0 +1,182 @@
+"""Precomputed order → client links (table order_client_link).
+
+An order in the legacy order2 table refers to its client only through a
+free-text client column holding a phone number or an FIO. Instead of
+matching on every page view, the match is stored once per order:
+
+    order_client_link(order_key, client_id, matched_by, linked_at)
+
+order_key is the order2 primary key value as text; matched_by is one of
+'phone', 'phone_suffix', 'fio' (found by matching), 'created' (the order
+was created from the client's page) or 'merged' (moved to the client when
+its duplicates were merged, see people_dedup). The last two are never
+re-matched.
+
+None of the functions here commit; callers own the transaction.
+"""
+from typing import Any, Optional, Sequence
+
+from flask import current_app
+from sqlalchemy import bindparam
+
+from .order_schema import get_order_schema
+from .people_search import _digits_only
+
+# information_schema.columns.data_type values that can be used as a CAST
+# target to compare order_key with the order2 primary key via its index
+_CASTABLE_TYPES = {
+    'smallint', 'integer', 'bigint', 'numeric', 'text', 'character varying', 'uuid',
+}
+
+# A match needs at least this many digits; shorter "phones" are noise.
+_MIN_PHONE_DIGITS = 5
+
+
+def sync_links(db: Any, action, *args, **kwargs) -> None:
+    """Run one of the functions below inside a savepoint.
+
+    Link upkeep must not break the main write: if order_client_link is not
+    there yet (migration not applied), the write still goes through and the
+    links are filled later by `flask orders build-links`.
+    """
+    try:
+        with db.session.begin_nested():
+            action(db, *args, **kwargs)
+    except Exception:
+        current_app.logger.warning('order links: %s failed', action.__name__, exc_info=True)
+
+
+def _join_condition(pk_col: str, pk_type: Optional[str]) -> str:
+    """order2 o ⋈ order_client_link l, keeping the order2 PK index usable."""
+    if pk_type in _CASTABLE_TYPES:
+        return f'o."{pk_col}" = CAST(l.order_key AS {pk_type})'
+    return f'o."{pk_col}"::text = l.order_key'
+
+
+def client_orders(db: Any, client_id: int, pk_col: str, pk_type: Optional[str]):
+    """Rows of order2 linked to client_id, as a list of dicts."""
+    sql = f'''
+        SELECT o.* FROM order_client_link l
+        JOIN order2 o ON {_join_condition(pk_col, pk_type)}
+        WHERE l.client_id = :client_id
+        ORDER BY 1
+    '''
+    return [dict(r) for r in db.session.execute(db.text(sql), {'client_id': client_id}).mappings().fetchall()]
+
+
+def _match_sql(pk_col: str, client_col: Optional[str], client_scoped: bool) -> str:
+    """Candidate (order_key, client_id, matched_by, prio) rows.
+
+    The same rules as the old per-request lookup: equal phone digits, equal
+    last 10 digits, or the client column equal to the FIO. With
+    client_scoped only matches for the :client_ids clients are produced,
+    shaped as index lookups on order2 (phone_digits, reverse(phone_digits),
+    client column).
+    """
+    scope = 'AND p.id IN :client_ids' if client_scoped else ''
+    key = f'o."{pk_col}"::text'
+    if client_scoped:
+        suffix_join = "reverse(o.phone_digits) LIKE reverse(right(p.phone_digits, 10)) || '%'"
+    else:
+        suffix_join = 'right(o.phone_digits, 10) = right(p.phone_digits, 10)'
+    parts = [
+        f'''SELECT {key} AS order_key, p.id AS client_id, 'phone' AS matched_by, 1 AS prio
+            FROM practic2 p JOIN order2 o ON o.phone_digits = p.phone_digits
+            WHERE length(p.phone_digits) >= {_MIN_PHONE_DIGITS} {scope}''',
+        f'''SELECT {key}, p.id, 'phone_suffix', 2
+            FROM practic2 p JOIN order2 o ON {suffix_join}
+            WHERE length(p.phone_digits) >= 10 AND length(o.phone_digits) >= 10 {scope}''',
+    ]
+    if client_col:
+        parts.append(f'''SELECT {key}, p.id, 'fio', 3
+            FROM practic2 p JOIN order2 o ON o."{client_col}" = p."ФИО"
+            WHERE p."ФИО" <> '' {scope}''')
+    return '\n UNION ALL \n'.join(parts)
+
+
+def link_orders(db: Any, client_id: Optional[int] = None, rebuild: bool = False,
+                client_ids: Optional[Sequence[int]] = None) -> int:
+    """Create links for orders that have none yet; return the number added.
+
+    client_id limits matching to one client (used after it is created or
+    edited), client_ids to several (the clients of an import). rebuild
+    drops the matched links first (only those of the given clients, if
+    any) and recomputes them; 'created' and 'merged' links are always kept. When an order matches several clients
+    the best rule wins, then the lowest client id.
+    """
+    if client_id is not None:
+        client_ids = [client_id]
+    if client_ids is not None and not client_ids:
+        return 0
+    schema = get_order_schema(db)
+    if not schema.pk_col:
+        return 0
+    if rebuild:
+        drop = "DELETE FROM order_client_link WHERE matched_by NOT IN ('created', 'merged')"
+        if client_ids is None:
+            db.session.execute(db.text(drop))
+        else:
+            db.session.execute(db.text(drop + ' AND client_id IN :client_ids')
+                               .bindparams(bindparam('client_ids', expanding=True)),
+                               {'client_ids': list(client_ids)})
+    sql = f'''
+        INSERT INTO order_client_link (order_key, client_id, matched_by)
+        SELECT DISTINCT ON (m.order_key) m.order_key, m.client_id, m.matched_by
+        FROM ({_match_sql(schema.pk_col, schema.client_col, client_ids is not None)}) m
+        WHERE NOT EXISTS (SELECT 1 FROM order_client_link l WHERE l.order_key = m.order_key)
+        ORDER BY m.order_key, m.prio, m.client_id
+        ON CONFLICT (order_key) DO NOTHING
+    '''
+    if client_ids is None:
+        return db.session.execute(db.text(sql)).rowcount
+    stmt = db.text(sql).bindparams(bindparam('client_ids', expanding=True))
+    return db.session.execute(stmt, {'client_ids': list(client_ids)}).rowcount
+
+
+def link_created_order(db: Any, order_key: Any, client_id: int) -> None:
+    """Pin an order created from a client's page to that client."""
+    db.session.execute(db.text('''
+        INSERT INTO order_client_link (order_key, client_id, matched_by)
+        VALUES (:order_key, :client_id, 'created')
+        ON CONFLICT (order_key) DO UPDATE
+        SET client_id = EXCLUDED.client_id, matched_by = 'created', linked_at = now()
+    '''), {'order_key': str(order_key), 'client_id': client_id})
+
+
+def set_order_client(db: Any, client_ids: Sequence[int], value: str) -> int:
+    """Write value into the order2 client column of the orders linked to client_ids.
+
+    Used before their links are moved by a merge, so the orders stop naming
+    the deleted duplicates; phone_digits follows the new value.
+    """
+    schema = get_order_schema(db)
+    if not schema.pk_col or not schema.client_col:
+        return 0
+    digits = ", phone_digits = :digits" if 'phone_digits' in schema and schema.client_col != 'phone_digits' else ''
+    return db.session.execute(db.text(f'''
+        UPDATE order2 o SET "{schema.client_col}" = :value{digits}
+        FROM order_client_link l
+        WHERE l.client_id IN :client_ids AND {_join_condition(schema.pk_col, schema.pk_type)}
+    ''').bindparams(bindparam('client_ids', expanding=True)),
+        {'value': value, 'digits': _digits_only(value), 'client_ids': list(client_ids)}).rowcount
+
+
+def move_links(db: Any, from_ids: Sequence[int], to_id: int) -> int:
+    """Point the orders of the merged duplicates from_ids at to_id."""
+    return db.session.execute(db.text('''
+        UPDATE order_client_link
+        SET client_id = :to_id, linked_at = now(),
+            matched_by = CASE WHEN matched_by = 'created' THEN 'created' ELSE 'merged' END
+        WHERE client_id IN :from_ids
+    ''').bindparams(bindparam('from_ids', expanding=True)), {'to_id': to_id, 'from_ids': list(from_ids)}).rowcount
+
+
+def unlink_order(db: Any, order_key: Any) -> None:
+    db.session.execute(db.text('DELETE FROM order_client_link WHERE order_key = :order_key'),
+                       {'order_key': str(order_key)})
+
+
+def unlink_orders(db: Any, order_keys: Sequence[Any]) -> None:
+    db.session.execute(db.text('DELETE FROM order_client_link WHERE order_key IN :order_keys')
+                       .bindparams(bindparam('order_keys', expanding=True)),
+                       {'order_keys': [str(k) for k in order_keys]})
@@ -0,0 +1,80 @@
+"""Order numbers for new order2 rows from the order2_number_seq sequence.
+
+The sequence is created and moved past the existing numbers by the
+c41d0e7a9b15 migration, and re-synced with `flask orders sync-seq` (needed
+after rows with explicit numbers were loaded past the app, e.g. a bulk
+import into order2).
+
+With ORDER_ID_BLOCK_SIZE > 1 each process reserves numbers in blocks
+(one round trip per block) and hands them out from memory. Reserved but
+unused numbers are skipped on restart, so numbers may have gaps, as with
+any sequence.
+
+If the sequence does not exist yet, the old MAX()+1 scan is used with a
+warning.
+"""
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Optional
+
+from flask import current_app
+
+SEQUENCE = 'order2_number_seq'
+DEFAULT_BLOCK_SIZE = 1
+
+_lock = threading.Lock()
+_block: Deque[int] = deque()
+_block_pid: Optional[int] = None
+_missing_logged = False
+
+
+def _reserve(db: Any, size: int) -> Deque[int]:
+    rows = db.session.execute(
+        db.text(f"SELECT nextval('{SEQUENCE}') FROM generate_series(1, :n)"), {'n': size}).scalars()
+    return deque(rows)
+
+
+def _max_plus_one(db: Any, id_column: str) -> int:
+    return int(db.session.execute(db.text(
+        f'''SELECT COALESCE(MAX(NULLIF(regexp_replace(COALESCE("{id_column}"::text, ''), '\\D', '', 'g'), '')::bigint), 0) + 1
+            FROM order2''')).scalar() or 1)
+
+
+def next_order_number(db: Any, id_column: str) -> int:
+    """Return an unused order number for id_column of order2."""
+    global _block, _block_pid, _missing_logged
+    with _lock:
+        # a block reserved before a prefork server forked must not be shared
+        if _block_pid != os.getpid():
+            _block, _block_pid = deque(), os.getpid()
+        if not _block:
+            size = max(1, int(current_app.config.get('ORDER_ID_BLOCK_SIZE', DEFAULT_BLOCK_SIZE) or 1))
+            try:
+                with db.session.begin_nested():
+                    _block = _reserve(db, size)
+            except Exception:
+                if not _missing_logged:
+                    current_app.logger.warning(
+                        'order numbers: sequence %s is not available, falling back to MAX()+1; '
+                        'run the migrations or `flask orders sync-seq`', SEQUENCE, exc_info=True)
+                    _missing_logged = True
+                return _max_plus_one(db, id_column)
+        return _block.popleft()
+
+
+def sync_sequence(db: Any, id_column: str) -> int:
+    """Create the sequence if needed and move it past the numbers in order2.
+
+    Never moves it backwards, so numbers already handed out stay unique.
+    Returns the next value the sequence will produce. Does not commit.
+    """
+    global _missing_logged
+    db.session.execute(db.text(f'CREATE SEQUENCE IF NOT EXISTS {SEQUENCE}'))
+    next_free = _max_plus_one(db, id_column)
+    value = db.session.execute(db.text(f'''
+        SELECT setval('{SEQUENCE}', GREATEST(:next_free, CASE WHEN is_called THEN last_value + 1 ELSE last_value END), false)
+        FROM {SEQUENCE}
+    '''), {'next_free': next_free}).scalar()
+    _missing_logged = False
+    return int(value)
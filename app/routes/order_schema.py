@@ -0,0 +1,105 @@
+"""Cached introspection of the legacy order2 table.
+
+order2 is not mapped by any model, so the order routes discover its columns
+from information_schema: which column holds the client key, the primary
+key, the NOT NULL columns that need a value on insert, and the data types.
+The schema only changes with a migration, so it is loaded once per process
+and reused until ORDER_SCHEMA_TTL seconds pass (default 300, 0 = never
+expire) or refresh_order_schema() is called.
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+
+DEFAULT_TTL = 300
+
+
+class OrderSchema:
+    """Snapshot of the order2 columns the order routes rely on."""
+
+    def __init__(self, columns: List[Dict[str, Any]], pk_col: Optional[str]):
+        # columns: dicts with name, is_nullable, column_default, data_type in ordinal order
+        self.columns = [c['name'] for c in columns]
+        self.data_types = {c['name']: (c['data_type'] or '').lower() for c in columns}
+        self.nullable = {c['name']: c['is_nullable'] != 'NO' for c in columns}
+        self.defaults = {c['name']: c['column_default'] for c in columns}
+        self.pk_col = pk_col
+        self.pk_type = self.data_types.get(pk_col) if pk_col else None
+        self.loaded_at = time.monotonic()
+
+        # first column that looks like a client key ('клиент' / 'client')
+        self.client_col = next(
+            (c for c in self.columns if 'клиент' in c.lower() or 'client' in c.lower()), None)
+        # NOT NULL columns without a default: an INSERT has to supply them
+        self.required = [c for c in self.columns if not self.nullable[c] and self.defaults[c] is None]
+        # the order number column among them (e.g. номер_заказа), else the first one
+        self.id_column = next(
+            (c for c in self.required if 'номер' in c.lower() and 'заказ' in c.lower()),
+            self.required[0] if self.required else None)
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.data_types
+
+    def __repr__(self):
+        return f'<OrderSchema pk={self.pk_col!r} client={self.client_col!r} columns={len(self.columns)}>'
+
+
+_lock = threading.Lock()
+_cached: Optional[OrderSchema] = None
+
+
+def _load(db: Any) -> OrderSchema:
+    cols = db.session.execute(db.text("""
+        SELECT column_name AS name, is_nullable, column_default, data_type
+        FROM information_schema.columns
+        WHERE table_name = 'order2'
+        ORDER BY ordinal_position
+    """)).mappings().fetchall()
+    pk_col = db.session.execute(db.text("""
+        SELECT kcu.column_name
+        FROM information_schema.table_constraints tc
+        JOIN information_schema.key_column_usage kcu
+          ON tc.constraint_name = kcu.constraint_name
+         AND tc.table_name = kcu.table_name
+        WHERE tc.table_name = 'order2' AND tc.constraint_type = 'PRIMARY KEY'
+        ORDER BY kcu.ordinal_position LIMIT 1
+    """)).scalar()
+    return OrderSchema([dict(c) for c in cols], pk_col)
+
+
+def get_order_schema(db: Any) -> OrderSchema:
+    """Return the cached order2 schema, loading it on first use or after the TTL.
+
+    If introspection fails, an empty schema is returned and nothing is
+    cached, so the next request tries again. The queries run in a
+    savepoint: a failure rolls back only them, never the caller's pending
+    writes (sync_links calls this inside its own savepoint).
+    """
+    global _cached
+    ttl = current_app.config.get('ORDER_SCHEMA_TTL', DEFAULT_TTL)
+    schema = _cached
+    if schema is not None and (not ttl or time.monotonic() - schema.loaded_at < ttl):
+        return schema
+    with _lock:
+        schema = _cached
+        if schema is not None and (not ttl or time.monotonic() - schema.loaded_at < ttl):
+            return schema
+        try:
+            with db.session.begin_nested():
+                schema = _load(db)
+        except Exception:
+            current_app.logger.exception('order2 schema introspection failed')
+            return OrderSchema([], None)
+        if schema.columns:
+            _cached = schema
+        current_app.logger.info('order2 schema loaded: %r', schema)
+        return schema
+
+
+def refresh_order_schema() -> None:
+    """Drop the cached schema; the next get_order_schema() reloads it."""
+    global _cached
+    with _lock:
+        _cached = None
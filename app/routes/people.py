@@ -1,19 +1,47 @@
 # app/routes/people.py
-from flask import Blueprint, render_template, request, current_app, redirect, url_for, flash
-import csv
-import io
+from flask import Blueprint, render_template, request, current_app, redirect, url_for, flash, jsonify, \
+    Response, stream_with_context, stream_template, get_flashed_messages, abort
+from flask_login import login_required
+from sqlalchemy import bindparam
+from werkzeug.routing import PathConverter
 from werkzeug.utils import secure_filename
-from .people_search import search_people
+from .people_search import search_people, stream_people, export_query, _digits_only, phone_suffix_pattern
+from . import import_jobs, order_links, people_export, search_cache
+from .conditional import conditional
+from .order_numbers import next_order_number
+from .order_schema import get_order_schema
+from .people_import import (
+    DEFAULT_CHUNK_SIZE, IMPORT_EXTENSIONS, ImportFileError, limit_rows, read_rows, run_import, validate_file,
+)
 
 # Используем префикс `/clients`, чтобы не конфликтовать с `/documents`
 people_bp = Blueprint('people', __name__, url_prefix='/clients', template_folder='../templates')
 
 
+class FioConverter(PathConverter):
+    """Like path, but never a bare number: /clients/<id>/... must win over the
+    old FIO addresses (the path converter would otherwise take them too)."""
+    regex = r'(?!\d+(?:/|$))[^/].*?'
+
+
+# registered before any rule of the blueprint is added to the app
+people_bp.record_once(lambda state: state.app.url_map.converters.setdefault('fio', FioConverter))
+
+# characters per write of the streamed clients list
+STREAM_BUFFER_SIZE = 16 * 1024
+
+
 @people_bp.route('/import', methods=['POST'])
 def import_clients():
     """Import clients from uploaded CSV or XLSX file.
 
-    Supported formats: CSV (utf-8 or utf-8-sig) and XLSX (requires openpyxl).
+    With async=1 the file is imported in the background and the job id is
+    returned (202 JSON for API clients, a flash message otherwise); progress
+    is at /clients/import/<job_id>. With dry_run=1 the rows are only
+    validated and the per-row errors are returned as JSON; nothing is written.
+
+    Supported formats: CSV (utf-8 or utf-8-sig, optionally gzipped as .csv.gz)
+    and XLSX (requires openpyxl). The file is read as a stream, see people_import.
     Expected columns (either Russian or English keys):
       ФИО / fio
       Пол / gender
@@ -31,103 +59,51 @@ def import_clients():
         return redirect(url_for('people.get_people'))
 
     filename = secure_filename(uploaded.filename or '')
-    if filename.lower().endswith('.csv'):
-        stream = io.TextIOWrapper(uploaded.stream, encoding='utf-8-sig')
-        reader = csv.DictReader(stream)
-        rows = list(reader)
-    elif filename.lower().endswith('.xlsx'):
-        try:
-            import openpyxl
-        except Exception:
-            flash('Для импорта XLSX требуется пакет openpyxl. Установите его и перезапустите.', 'danger')
-            return redirect(url_for('people.get_people'))
-        wb = openpyxl.load_workbook(uploaded, read_only=True)
-        ws = wb.active
-        it = ws.values
-        try:
-            headers = [str(h).strip() for h in next(it)]
-        except StopIteration:
-            flash('Файл пустой', 'warning')
-            return redirect(url_for('people.get_people'))
-        rows = []
-        for r in it:
-            row = {headers[i]: (r[i] if i < len(r) else '') for i in range(len(headers))}
-            rows.append(row)
-    else:
-        flash('Поддерживаются только файлы .csv и .xlsx', 'warning')
+    if not filename.lower().endswith(IMPORT_EXTENSIONS):
+        flash('Поддерживаются только файлы .csv, .csv.gz и .xlsx', 'warning')
         return redirect(url_for('people.get_people'))
 
-    # map possible headers to target columns
-    def map_row(r):
-        # lowercase keys without spaces/underscores for flexible matching
-        normalized = {}
-        for k, v in r.items():
-            if k is None:
-                continue
-            key = str(k).strip().lower().replace(' ', '_')
-            normalized[key] = v
-
-        def pick(*cands):
-            for c in cands:
-                kc = c.lower()
-                if kc in normalized:
-                    return normalized[kc]
-            return None
-
-        return {
-            'fio': pick('ФИО', 'fio'),
-            'gender': pick('Пол', 'gender'),
-            'address': pick('Адрес', 'address'),
-            'age': pick('Возраст', 'age'),
-            'birth_date': pick('Дата_рождения', 'birth_date', 'birthdate'),
-            'phone': pick('Номер_телефона', 'phone', 'phone_number', 'tel'),
-            'email': pick('Почта', 'email', 'e-mail'),
-            'notes': pick('Примечания', 'notes', 'comments')
-        }
-
-    success = 0
-    failed = 0
-    errors = []
-    max_rows = current_app.config.get('IMPORT_MAX_ROWS', 2000)
-    if len(rows) > max_rows:
-        flash(f'Файл слишком большой ({len(rows)} строк). Ограничение {max_rows}.', 'danger')
+    max_rows = current_app.config.get('IMPORT_MAX_ROWS', 100000)
+    chunk_size = current_app.config.get('IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    strict = current_app.config.get('IMPORT_STRICT_VALIDATION', False)
+    if request.values.get('dry_run') == '1':
+        try:
+            report = validate_file(limit_rows(read_rows(uploaded.stream, filename), max_rows), chunk_size, strict=strict)
+        except ImportFileError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(report.to_dict())
+
+    if request.values.get('async') == '1':
+        # large files: spool and import in the background, see import_jobs
+        job = import_jobs.submit(uploaded, filename)
+        status_url = url_for('people.import_status', job_id=job.id)
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(job.to_dict()), 202, {'Location': status_url}
+        flash(f'Импорт запущен в фоне, задача {job.id}. Статус: {status_url}', 'info')
         return redirect(url_for('people.get_people'))
 
-    insert_sql = db.text('''
-        INSERT INTO practic2 (
-            "ФИО", "Пол", "Адрес", "Возраст",
-            "Дата_рождения", "Номер_телефона", "Почта", "Примечания"
-        ) VALUES (
-            :fio, :gender, :address, :age,
-            :birth_date, :phone, :email, :notes
-        )
-    ''')
-
-    for idx, raw in enumerate(rows, start=1):
-        mapped = map_row(raw)
-        params = {
-            'fio': mapped.get('fio') or '',
-            'gender': mapped.get('gender') or None,
-            'address': mapped.get('address') or None,
-            'age': mapped.get('age') or None,
-            'birth_date': mapped.get('birth_date') or None,
-            'phone': mapped.get('phone') or None,
-            'email': mapped.get('email') or None,
-            'notes': mapped.get('notes') or None
-        }
-        try:
-            db.session.execute(insert_sql, params)
-            db.session.commit()
-            success += 1
-        except Exception as e:
-            try:
-                db.session.rollback()
-            except Exception:
-                pass
-            failed += 1
-            errors.append(f'Line {idx}: {e}')
+    # one transaction for the whole file, see people_import; a file over
+    # IMPORT_MAX_ROWS is noticed while it is read and rolled back as a whole
+    try:
+        result = run_import(db, limit_rows(read_rows(uploaded.stream, filename), max_rows), chunk_size,
+                            strict=strict)
+        db.session.commit()
+        search_cache.invalidate()
+    except ImportFileError as e:
+        db.session.rollback()
+        flash(str(e), e.category)
+        return redirect(url_for('people.get_people'))
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('Import clients failed')
+        flash(f'Ошибка импорта: {e}', 'danger')
+        return redirect(url_for('people.get_people'))
+    success, failed, errors = result.success, result.failed, result.errors
 
     msg = f'Импорт завершён: {success} добавлено.'
+    if result.warnings:
+        current_app.logger.info('Import clients warnings: %s', result.warnings[:5])
+        msg += ' Предупреждения: ' + '; '.join(result.warnings[:3]) + '.'
     if failed:
         msg += f' {failed} ошибок.'
         current_app.logger.warning('Import clients: %s', errors[:5])
@@ -138,11 +114,80 @@ def import_clients():
     return redirect(url_for('people.get_people'))
 
 
+@people_bp.route('/import/<job_id>')
+def import_status(job_id):
+    """Progress of a background import as JSON."""
+    job = import_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@people_bp.route('/export')
+@login_required
+def export_clients():
+    """Download the client list with the same filters as the list page.
+
+    ?format=csv (default) or xlsx.
+    """
+    db = current_app.extensions['sqlalchemy']
+    fmt = (request.args.get('format') or 'csv').lower()
+    if fmt not in ('csv', 'xlsx'):
+        flash('Поддерживается экспорт только в .csv и .xlsx', 'warning')
+        return redirect(url_for('people.get_people'))
+    if fmt == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except Exception:
+            flash('Для экспорта XLSX требуется пакет openpyxl. Установите его и перезапустите.', 'danger')
+            return redirect(url_for('people.get_people'))
+
+    sql, params = export_query(request.args)
+    chunks = people_export.iter_row_chunks(
+        db.engine, sql, params, current_app.config.get('EXPORT_CHUNK_SIZE', people_export.DEFAULT_CHUNK_SIZE))
+    if fmt == 'xlsx':
+        body = people_export.xlsx_stream(chunks)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        body = people_export.csv_stream(chunks)
+        mimetype = 'text/csv; charset=utf-8'
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=clients.{fmt}',
+    })
+
+
 @people_bp.route('/')
+@conditional('practic2')
 def get_people():
+    """Clients list. With PEOPLE_LIST_STREAMING (default on) the page is sent
+    while the rows are read from a server-side cursor, see stream_people."""
     db = current_app.extensions['sqlalchemy']
-    people, filters = search_people(db, request.args)
-    return render_template("clients.html", people=people, filters=filters)
+    streaming = current_app.config.get('PEOPLE_LIST_STREAMING', True)
+    people, filters, page = (stream_people if streaming else search_people)(db, request.args)
+    # filters (and an explicit page size) are carried over into next/prev links
+    nav_args = dict(filters)
+    if request.args.get('per_page'):
+        nav_args['per_page'] = page['per_page']
+    context = dict(people=people, filters=filters, page=page, nav_args=nav_args)
+    if not streaming:
+        return render_template("clients.html", **context)
+    # the layout shows flashed messages mid-stream, after the session cookie
+    # has gone out with the headers: take them out of the session now
+    get_flashed_messages()
+    return Response(_buffered(stream_template("clients.html", **context)), mimetype='text/html')
+
+
+def _buffered(chunks, size=STREAM_BUFFER_SIZE):
+    """Join the small pieces a streamed template yields into ~size chunks."""
+    buf, length = [], 0
+    for chunk in chunks:
+        buf.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buf)
+            buf, length = [], 0
+    if buf:
+        yield ''.join(buf)
 
 
 # ——— ДОБАВЛЕНИЕ КЛИЕНТА ———
@@ -153,24 +198,30 @@ def add_person():
         sql = db.text("""
             INSERT INTO practic2 (
                 "ФИО", "Пол", "Адрес", "Возраст",
-                "Дата_рождения", "Номер_телефона", "Почта", "Примечания"
+                "Дата_рождения", "Номер_телефона", "Почта", "Примечания",
+                phone_digits
             ) VALUES (
                 :fio, :gender, :address, :age,
-                :birth_date, :phone, :email, :notes
+                :birth_date, :phone, :email, :notes,
+                :phone_digits
             )
+            RETURNING id
         """)
         try:
-            db.session.execute(sql, {
+            new_id = db.session.execute(sql, {
                 "fio": request.form['fio'],
                 "gender": request.form.get('gender'),
                 "address": request.form.get('address'),
                 "age": request.form.get('age') or None,
                 "birth_date": request.form.get('birth_date') or None,
                 "phone": request.form.get('phone'),
+                "phone_digits": _digits_only(request.form.get('phone')),
                 "email": request.form.get('email'),
                 "notes": request.form.get('notes')
-            })
+            }).scalar()
+            order_links.sync_links(db, order_links.link_orders, client_id=new_id)
             db.session.commit()
+            search_cache.invalidate()
             flash('Клиент успешно добавлен!', 'success')
         except Exception as e:
             db.session.rollback()
@@ -180,9 +231,119 @@ def add_person():
     return render_template("person_form.html", person=None)
 
 
+def _load_client_orders(db, person):
+    """Load orders from order2 that belong to person.
+
+    Reads the precomputed order_client_link table (an indexed equality
+    join). Until it exists, falls back to matching on the fly.
+    """
+    orders = None
+    if person.get('id') is not None:
+        schema = get_order_schema(db)
+        try:
+            if schema.pk_col:
+                orders = order_links.client_orders(db, person['id'], schema.pk_col, schema.pk_type)
+        except Exception:
+            try:
+                db.session.rollback()
+            except Exception:
+                pass
+            current_app.logger.warning('order links unavailable, matching orders on the fly', exc_info=True)
+    if orders is None:
+        orders = _match_client_orders(db, person)
+    # keep original primary key value, add a per-client ordinal for display
+    for idx, o in enumerate(orders, start=1):
+        o['_ordinal'] = idx
+    return orders
+
+
+def _match_client_orders(db, person):
+    """Match orders to person without the link table.
+
+    The legacy schema may use a long Russian column name for the client key
+    (a phone number or an FIO); see OrderSchema.client_col. Phones
+    are matched on the indexed phone_digits column: the same digits, or the
+    same last digits when the country/trunk prefix differs.
+    """
+    orders = []
+    client_col = get_order_schema(db).client_col
+    if not client_col:
+        return orders
+    try:
+        # a bare column comparison, so that ix_order2_client serves it
+        conditions = [f'"{client_col}" = :fio_exact']
+        params = {'fio_exact': person.get('ФИО') or person.get('fio')}
+        digits = _digits_only(person.get('Номер_телефона') or person.get('phone'))
+        if digits:
+            conditions.append('phone_digits = :digits')
+            conditions.append('reverse(phone_digits) LIKE :phone_rsuffix')
+            params['digits'] = digits
+            params['phone_rsuffix'] = phone_suffix_pattern(digits)
+        orders_sql = 'SELECT * FROM order2 WHERE ' + ' OR '.join(conditions) + ' ORDER BY 1'
+        ord_res = db.session.execute(db.text(orders_sql), params).mappings().fetchall()
+        orders = [dict(r) for r in ord_res]
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+    return orders
+
+
+# Клиенты адресуются по первичному ключу practic2.id (Person.id): поиск по
+# индексу и ровно одна строка. Старые адреса по ФИО перенаправляют сюда.
+_PERSON_SQL = '''
+    SELECT
+        id,
+        "ФИО" AS fio,
+        "Пол" AS gender,
+        "Адрес" AS address,
+        "Возраст" AS age,
+        "Дата_рождения"::text AS birth_date,
+        COALESCE("Номер_телефона", '') AS phone,
+        "Почта" AS email,
+        "Примечания" AS notes
+    FROM practic2
+    WHERE id = :id
+'''
+
+
+def _get_person(db, person_id):
+    """Load one client by id as a dict, or None if there is none."""
+    try:
+        row = db.session.execute(db.text(_PERSON_SQL), {"id": person_id}).mappings().one_or_none()
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        current_app.logger.exception('person lookup failed')
+        return None
+    return dict(row) if row else None
+
+
+def _person_ids_by_fio(db, fio):
+    """ids of the clients with this FIO, at most two: enough to tell namesakes apart."""
+    try:
+        return db.session.execute(
+            db.text('SELECT id FROM practic2 WHERE "ФИО" = :fio ORDER BY id LIMIT 2'), {"fio": fio}).scalars().all()
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        current_app.logger.exception('person lookup by FIO failed')
+        return []
+
+
+def _person_not_found():
+    flash('Клиент не найден', 'warning')
+    return redirect(url_for('people.get_people'))
+
+
 #РЕДАКТИРОВАНИЕ КЛИЕНТА 
-@people_bp.route('/<path:fio>/edit', methods=['GET', 'POST'])
-def edit_person(fio):
+@people_bp.route('/<int:person_id>/edit', methods=['GET', 'POST'])
+def edit_person(person_id):
     db = current_app.extensions['sqlalchemy']
 
     if request.method == 'POST':
@@ -193,22 +354,30 @@ def edit_person(fio):
                 "Возраст" = :age,
                 "Дата_рождения" = :birth_date,
                 "Номер_телефона" = :phone,
+                phone_digits = :phone_digits,
                 "Почта" = :email,
                 "Примечания" = :notes
-            WHERE "ФИО" = :fio
+            WHERE id = :id
+            RETURNING id
         """)
         try:
-            db.session.execute(sql, {
-                "fio": fio,
+            updated_ids = db.session.execute(sql, {
+                "id": person_id,
                 "gender": request.form.get('gender'),
                 "address": request.form.get('address'),
                 "age": request.form.get('age') or None,
                 "birth_date": request.form.get('birth_date') or None,
                 "phone": request.form.get('phone'),
+                "phone_digits": _digits_only(request.form.get('phone')),
                 "email": request.form.get('email'),
                 "notes": request.form.get('notes')
-            })
+            }).scalars().all()
+            # the phone may have changed: drop the client's matched links and
+            # match again, in the same transaction as the update
+            if updated_ids:
+                order_links.sync_links(db, order_links.link_orders, client_id=person_id, rebuild=True)
             db.session.commit()
+            search_cache.invalidate()
             flash('Клиент обновлён!', 'success')
         except Exception as e:
             db.session.rollback()
@@ -216,255 +385,54 @@ def edit_person(fio):
         return redirect(url_for('people.get_people'))
 
     # GET — показываем форму
-    query = db.text('''
-        SELECT
-            "ФИО" AS fio,
-            "Пол" AS gender,
-            "Адрес" AS address,
-            "Возраст" AS age,
-            "Дата_рождения"::text AS birth_date,
-            COALESCE("Номер_телефона", '') AS phone,
-            "Почта" AS email,
-            "Примечания" AS notes
-        FROM practic2
-        WHERE "ФИО" = :fio
-    ''')
-    try:
-        person = db.session.execute(query, {"fio": fio}).mappings().one_or_none()
-    except Exception as e:
-        current_app.logger.exception('view_orders: primary person select failed')
-        # Fallback: try a simple SELECT * in case schema differs
-        try:
-            fallback = db.text('SELECT * FROM practic2 WHERE "ФИО" = :fio')
-            prow = db.session.execute(fallback, {"fio": fio}).mappings().one_or_none()
-            person = dict(prow) if prow else None
-        except Exception:
-            try:
-                db.session.rollback()
-            except Exception:
-                pass
-            person = None
-
+    person = _get_person(db, person_id)
     if not person:
-        flash('Клиент не найден', 'warning')
-        return redirect(url_for('people.get_people'))
+        return _person_not_found()
 
-    # Load related orders from order2 table. The legacy schema may use a long Russian column
-    # name for the client key; detect a candidate column name dynamically.
-    orders = []
-    try:
-        # find a column name in order2 that likely stores client key (contains 'клиент' or 'client')
-        col_q = db.text("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_name = 'order2' AND (column_name ILIKE '%клиент%' OR column_name ILIKE '%client%')
-            LIMIT 1
-        """)
-        col_res = db.session.execute(col_q).fetchone()
-        client_col = col_res[0] if col_res else None
-        if client_col:
-            # build safe SQL referencing the discovered column
-            orders_sql = f"""
-                SELECT * FROM order2
-                WHERE COALESCE(\"{client_col}\", '') = :phone_exact
-                   OR regexp_replace(COALESCE(\"{client_col}\", ''), '\\D', '', 'g') LIKE :phone_digits
-                   OR COALESCE(\"{client_col}\", '') = :fio_exact
-                   OR COALESCE(\"{client_col}\", '') = :id_text
-                ORDER BY 1
-            """
-            params = {
-                'phone_exact': person['Номер_телефона'] if person.get('Номер_телефона') else person.get('phone'),
-                'phone_digits': '%' + (person.get('Номер_телефона') or person.get('phone') or '').replace('+', '').replace(' ', '').replace('(', '').replace(')', '').replace('-', '') + '%',
-                'fio_exact': person.get('ФИО') or person.get('fio'),
-                    'id_text': ''
-            }
-            ord_res = db.session.execute(db.text(orders_sql), params).mappings().fetchall()
-            orders = [dict(r) for r in ord_res]
-            # map displayed order number to per-client ordinal (1..N)
-            if orders:
-                # keep original primary key value, add a per-client ordinal for display
-                id_key = None
-                for k in orders[0].keys():
-                    if 'номер' in k.lower() and 'заказ' in k.lower():
-                        id_key = k
-                        break
-                if not id_key:
-                    id_key = list(orders[0].keys())[0]
-                for idx, o in enumerate(orders, start=1):
-                    o['_ordinal'] = idx
-    except Exception:
-        try:
-            db.session.rollback()
-        except Exception:
-            pass
+    orders = _load_client_orders(db, person)
 
-    return render_template("person_form.html", person=dict(person), orders=orders)
+    return render_template("person_form.html", person=person, orders=orders)
 
 
-@people_bp.route('/<path:fio>', methods=['GET'])
-def view_person(fio):
+@people_bp.route('/<int:person_id>', methods=['GET'])
+@conditional('practic2')
+def view_person(person_id):
     db = current_app.extensions['sqlalchemy']
-    query = db.text('''
-        SELECT
-            "ФИО" AS fio,
-            "Пол" AS gender,
-            "Адрес" AS address,
-            "Возраст" AS age,
-            "Дата_рождения"::text AS birth_date,
-            COALESCE("Номер_телефона", '') AS phone,
-            "Почта" AS email,
-            "Примечания" AS notes
-        FROM practic2
-        WHERE "ФИО" = :fio
-    ''')
-    person = db.session.execute(query, {"fio": fio}).mappings().one_or_none()
+    person = _get_person(db, person_id)
     if not person:
-        flash('Клиент не найден', 'warning')
-        return redirect(url_for('people.get_people'))
-    return render_template('person_view.html', person=dict(person))
+        return _person_not_found()
+    return render_template('person_view.html', person=person)
 
 
-@people_bp.route('/<path:fio>/orders', methods=['GET'])
-def view_orders(fio):
+@people_bp.route('/<int:person_id>/orders', methods=['GET'])
+@conditional('practic2', 'order2', 'order_client_link')
+def view_orders(person_id):
     db = current_app.extensions['sqlalchemy']
-    # Load the person first
-    query = db.text('''
-        SELECT
-            "ФИО" AS fio,
-            "Пол" AS gender,
-            "Адрес" AS address,
-            "Возраст" AS age,
-            "Дата_рождения"::text AS birth_date,
-            COALESCE("Номер_телефона", '') AS phone,
-            "Почта" AS email,
-            "Примечания" AS notes
-        FROM practic2
-        WHERE "ФИО" = :fio
-    ''')
-    person = db.session.execute(query, {"fio": fio}).mappings().one_or_none()
+    person = _get_person(db, person_id)
     if not person:
-        flash('Клиент не найден', 'warning')
-        return redirect(url_for('people.get_people'))
+        return _person_not_found()
 
-    orders = []
-    try:
-        # detect possible client key column in order2
-        col_q = db.text("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_name = 'order2' AND (column_name ILIKE '%клиент%' OR column_name ILIKE '%client%')
-            ORDER BY ordinal_position LIMIT 1
-        """)
-        col_res = db.session.execute(col_q).fetchone()
-        client_col = col_res[0] if col_res else None
-        if client_col:
-            # prepare params for matching
-            phone_val = person['Номер_телефона'] if person.get('Номер_телефона') else person.get('phone')
-            digits = ''.join(ch for ch in (phone_val or '') if ch.isdigit())
-            orders_sql = f"""
-                SELECT * FROM order2
-                WHERE COALESCE(\"{client_col}\", '') = :phone_exact
-                   OR regexp_replace(COALESCE(\"{client_col}\", ''), '\\D', '', 'g') LIKE :phone_digits
-                   OR COALESCE(\"{client_col}\", '') = :fio_exact
-                   OR COALESCE(\"{client_col}\", '') = :id_text
-                ORDER BY 1
-            """
-            params = {
-                'phone_exact': phone_val,
-                'phone_digits': f'%{digits}%',
-                'fio_exact': person.get('ФИО') or person.get('fio'),
-                'id_text': ''
-            }
-            ord_res = db.session.execute(db.text(orders_sql), params).mappings().fetchall()
-            orders = [dict(r) for r in ord_res]
-            # map displayed order number to per-client ordinal (1..N)
-            if orders:
-                # keep original primary key value, add a per-client ordinal for display
-                id_key = None
-                for k in orders[0].keys():
-                    if 'номер' in k.lower() and 'заказ' in k.lower():
-                        id_key = k
-                        break
-                if not id_key:
-                    id_key = list(orders[0].keys())[0]
-                for idx, o in enumerate(orders, start=1):
-                    o['_ordinal'] = idx
-    except Exception:
-        try:
-            db.session.rollback()
-        except Exception:
-            pass
+    orders = _load_client_orders(db, person)
 
-    return render_template('person_orders.html', person=dict(person), orders=orders)
+    return render_template('person_orders.html', person=person, orders=orders,
+                           pk_col=get_order_schema(db).pk_col)
 
 
-@people_bp.route('/<path:fio>/orders/create', methods=['GET', 'POST'])
-def create_order(fio):
+@people_bp.route('/<int:person_id>/orders/create', methods=['GET', 'POST'])
+def create_order(person_id):
     db = current_app.extensions['sqlalchemy']
-    # load person
-    query = db.text('''
-        SELECT
-            "ФИО" AS fio,
-            COALESCE("Номер_телефона", '') AS phone
-        FROM practic2
-        WHERE "ФИО" = :fio
-    ''')
-    person = db.session.execute(query, {"fio": fio}).mappings().one_or_none()
+    person = _get_person(db, person_id)
     if not person:
-        flash('Клиент не найден', 'warning')
-        return redirect(url_for('people.get_people'))
+        return _person_not_found()
 
-    # detect order2 columns and metadata
-    cols_meta = db.session.execute(db.text("""
-        SELECT column_name, is_nullable, column_default
-        FROM information_schema.columns
-        WHERE table_name = 'order2'
-        ORDER BY ordinal_position
-    """)).fetchall()
-    cols = [r[0] for r in cols_meta]
-
-    # choose client column (contains 'клиент' or 'client') or fallback to first column
-    client_col = None
-    for c in cols:
-        if 'клиент' in c.lower() or 'client' in c.lower():
-            client_col = c
-            break
-    if not client_col and cols:
-        client_col = cols[0]
-
-    # prefer phone as client identifier
-    client_val = person.get('Номер_телефона') or person.get('phone') or person.get('ФИО') or person.get('fio') or fio
-
-    # check for NOT NULL id-like column (e.g. номер_заказа) which needs a value
-    id_column = None
-    for col, is_nullable, col_default in cols_meta:
-        if (is_nullable == 'NO') and (col_default is None):
-            if 'номер' in col.lower() and 'заказ' in col.lower():
-                id_column = col
-                break
-            if id_column is None:
-                id_column = col
-
-    # compute next id per-client if possible (MAX(id) WHERE client_col = client_val) else None
-    next_id = None
-    if id_column:
-        try:
-            # use a global next id (MAX + 1) to satisfy unique primary key constraints
-            seq_q = db.text(f"SELECT COALESCE(MAX(CAST(\"{id_column}\" AS bigint)), 0) + 1 AS next_id FROM order2")
-            seq_res = db.session.execute(seq_q).fetchone()
-            next_id = seq_res[0]
-        except Exception:
-            try:
-                db.session.rollback()
-            except Exception:
-                pass
-            next_id = None
-    # choose client column (contains 'клиент' or 'client') or fallback to first column
-    client_col = None
-    for c in cols:
-        if 'клиент' in c.lower() or 'client' in c.lower():
-            client_col = c
-            break
-    if not client_col and cols:
-        client_col = cols[0]
+    schema = get_order_schema(db)
+    cols = schema.columns
+
+    # client column (contains 'клиент' or 'client') or fallback to first column
+    client_col = schema.client_col or (cols[0] if cols else None)
+
+    # NOT NULL id-like column (e.g. номер_заказа) which needs a value
+    id_column = schema.id_column
 
     if request.method == 'POST':
         # prepare insert columns and params based on available columns
@@ -473,12 +441,10 @@ def create_order(fio):
         if client_col:
             insert_cols.append(f'"{client_col}"')
             # prefer phone, fallback to fio
-            params['client_val'] = person.get('Номер_телефона') or person.get('phone') or person.get('fio') or fio
-
-        # include computed id if needed
-        if id_column and next_id is not None and id_column not in [c.replace('"', '') for c in insert_cols]:
-            insert_cols.insert(0, f'"{id_column}"')
-            params[id_column] = next_id
+            params['client_val'] = person.get('phone') or person.get('fio') or ''
+            if 'phone_digits' in cols and client_col != 'phone_digits':
+                insert_cols.append('"phone_digits"')
+                params['phone_digits'] = _digits_only(params['client_val'])
 
         # common candidate columns to fill from the form if present
         candidates = ['название', 'цена', 'примечания', 'статус_заказа']
@@ -487,9 +453,34 @@ def create_order(fio):
                 insert_cols.append(f'"{cand}"')
                 params[cand] = request.form.get(cand) or request.form.get(cand.replace('_', ' ')) or request.form.get(cand.replace(' ', '_')) or ''
 
+        # NOT NULL columns without a default still missing: number-like ones
+        # (the order number column first) get a number from the sequence, see
+        # order_numbers; text-like ones an empty string
+        filled = {c.replace('"', '') for c in insert_cols}
+        missing = [c for c in schema.required if c not in filled]
+        if id_column in missing:
+            missing.remove(id_column)
+            missing.insert(0, id_column)
+        order_number = None
+        for cname in missing:
+            if 'номер' in cname.lower() or 'id' in cname.lower() or 'num' in cname.lower() \
+                    or schema.data_types[cname] in ('integer', 'bigint'):
+                if order_number is None:
+                    try:
+                        order_number = next_order_number(db, cname)
+                    except Exception:
+                        db.session.rollback()
+                        current_app.logger.exception('create_order: cannot allocate an order number')
+                        flash('Не удалось получить номер заказа', 'danger')
+                        return redirect(url_for('people.view_orders', person_id=person_id))
+                params[cname] = order_number
+            else:
+                params[cname] = ''
+            insert_cols.append(f'"{cname}"')
+
         if not insert_cols:
             flash('Не удалось определить столбцы для вставки в order2', 'danger')
-            return redirect(url_for('people.view_orders', fio=fio))
+            return redirect(url_for('people.view_orders', person_id=person_id))
 
         cols_sql = ', '.join(insert_cols)
         # build parameter names aligned with insert_cols
@@ -503,100 +494,34 @@ def create_order(fio):
 
         vals_sql = ', '.join(':' + name for name in param_names)
         insert_sql = f'INSERT INTO order2 ({cols_sql}) VALUES ({vals_sql})'
-
-        # Ensure required NOT NULL columns without defaults are provided.
-        try:
-            col_meta_q = db.text("""
-                SELECT column_name, is_nullable, column_default, data_type
-                FROM information_schema.columns
-                WHERE table_name = 'order2'
-            """
-            )
-            meta = {r[0]: {'is_nullable': r[1], 'column_default': r[2], 'data_type': r[3]} for r in db.session.execute(col_meta_q).fetchall()}
-        except Exception:
-            meta = {}
-
-        # For any param_name not present in params, and column is NOT NULL and has no default, try to generate a sensible value.
-        for pname in param_names:
-            if pname in params:
-                continue
-            colinfo = meta.get(pname)
-            if not colinfo:
-                # unknown column meta: default to empty string
-                params[pname] = ''
-                continue
-
-            if colinfo['is_nullable'] == 'NO' and not colinfo['column_default']:
-                cname = pname
-                dtype = (colinfo.get('data_type') or '').lower()
-                # if column name suggests a number/id, generate next integer
-                if 'номер' in cname.lower() or 'id' in cname.lower() or 'num' in cname.lower() or dtype in ('integer', 'bigint'):
-                    try:
-                        max_q = db.text(f"SELECT COALESCE(MAX( (regexp_replace(COALESCE(\"{cname}\", ''),'\\D','', 'g'))::bigint ), 0) + 1 AS nextval FROM order2")
-                        nv = db.session.execute(max_q).scalar()
-                        params[pname] = int(nv or 1)
-                    except Exception:
-                        params[pname] = 1
-                else:
-                    # text-like required column: default to empty string
-                    params[pname] = ''
-            else:
-                # nullable or has default: leave absent so DB default applies
-                pass
+        pk_col = schema.pk_col
+        if pk_col:
+            insert_sql += f' RETURNING "{pk_col}"'
 
         try:
-            db.session.execute(db.text(insert_sql), params)
+            res = db.session.execute(db.text(insert_sql), params)
+            if pk_col:
+                order_links.sync_links(db, order_links.link_created_order, res.scalar(), person['id'])
             db.session.commit()
             flash('Заказ добавлен', 'success')
         except Exception as e:
             db.session.rollback()
             current_app.logger.exception('create_order failed')
             flash(f'Ошибка при добавлении заказа: {e}', 'danger')
-        return redirect(url_for('people.view_orders', fio=fio))
+        return redirect(url_for('people.view_orders', person_id=person_id))
 
     # GET: render form
-    return render_template('order_form.html', person=dict(person), order=None)
-
-
-def _detect_order_pk_column(db):
-    """Return primary key column name for table order2 or None."""
-    try:
-        pk_q = db.text("""
-            SELECT kcu.column_name
-            FROM information_schema.table_constraints tc
-            JOIN information_schema.key_column_usage kcu
-              ON tc.constraint_name = kcu.constraint_name
-             AND tc.table_name = kcu.table_name
-            WHERE tc.table_name = 'order2' AND tc.constraint_type = 'PRIMARY KEY'
-            ORDER BY kcu.ordinal_position LIMIT 1
-        """)
-        r = db.session.execute(pk_q).fetchone()
-        return r[0] if r else None
-    except Exception:
-        try:
-            db.session.rollback()
-        except Exception:
-            pass
-        return None
+    return render_template('order_form.html', person=person, order=None)
 
 
-@people_bp.route('/<path:fio>/orders/<path:pk>/edit', methods=['GET', 'POST'])
-def edit_order(fio, pk):
+@people_bp.route('/<int:person_id>/orders/<path:pk>/edit', methods=['GET', 'POST'])
+def edit_order(person_id, pk):
     db = current_app.extensions['sqlalchemy']
-    # load person
-    p_q = db.text('''
-        SELECT
-            "ФИО" AS fio,
-            COALESCE("Номер_телефона", '') AS phone
-        FROM practic2
-        WHERE "ФИО" = :fio
-    ''')
-    person = db.session.execute(p_q, {"fio": fio}).mappings().one_or_none()
+    person = _get_person(db, person_id)
     if not person:
-        flash('Клиент не найден', 'warning')
-        return redirect(url_for('people.get_people'))
+        return _person_not_found()
 
-    pk_col = _detect_order_pk_column(db) or 'номер_заказа'
+    pk_col = get_order_schema(db).pk_col or 'номер_заказа'
 
     if request.method == 'POST':
         # update allowed columns from form
@@ -611,7 +536,7 @@ def edit_order(fio, pk):
                     params[cand] = val
         if not set_clauses:
             flash('Нет полей для обновления', 'warning')
-            return redirect(url_for('people.view_orders', fio=fio))
+            return redirect(url_for('people.view_orders', person_id=person_id))
         params['pk'] = pk
         sql = db.text(f'UPDATE order2 SET {", ".join(set_clauses)} WHERE "{pk_col}" = :pk')
         try:
@@ -622,42 +547,189 @@ def edit_order(fio, pk):
             db.session.rollback()
             current_app.logger.exception('edit_order failed')
             flash(f'Ошибка при обновлении заказа: {e}', 'danger')
-        return redirect(url_for('people.view_orders', fio=fio))
+        return redirect(url_for('people.view_orders', person_id=person_id))
 
     # GET: load order by pk
     sel = db.text(f'SELECT * FROM order2 WHERE "{pk_col}" = :pk')
     order = db.session.execute(sel, {"pk": pk}).mappings().one_or_none()
     if not order:
         flash('Заказ не найден', 'warning')
-        return redirect(url_for('people.view_orders', fio=fio))
-    return render_template('order_form.html', person=dict(person), order=dict(order))
+        return redirect(url_for('people.view_orders', person_id=person_id))
+    return render_template('order_form.html', person=person, order=dict(order))
 
 
-@people_bp.route('/<path:fio>/orders/<path:pk>/delete', methods=['POST'])
-def delete_order(fio, pk):
+@people_bp.route('/<int:person_id>/orders/<path:pk>/delete', methods=['POST'])
+def delete_order(person_id, pk):
     db = current_app.extensions['sqlalchemy']
-    pk_col = _detect_order_pk_column(db) or 'номер_заказа'
+    pk_col = get_order_schema(db).pk_col or 'номер_заказа'
     try:
         sql = db.text(f'DELETE FROM order2 WHERE "{pk_col}" = :pk')
         db.session.execute(sql, {"pk": pk})
+        order_links.sync_links(db, order_links.unlink_order, pk)
         db.session.commit()
         flash('Заказ удалён', 'success')
     except Exception as e:
         db.session.rollback()
         current_app.logger.exception('delete_order failed')
         flash(f'Ошибка при удалении заказа: {e}', 'danger')
-    return redirect(url_for('people.view_orders', fio=fio))
+    return redirect(url_for('people.view_orders', person_id=person_id))
 
 
-@people_bp.route('/<path:fio>/delete', methods=['POST'])
-def delete_person(fio):
+@people_bp.route('/<int:person_id>/delete', methods=['POST'])
+def delete_person(person_id):
     db = current_app.extensions['sqlalchemy']
-    sql = db.text('DELETE FROM practic2 WHERE "ФИО" = :fio')
+    sql = db.text('DELETE FROM practic2 WHERE id = :id')
     try:
-        db.session.execute(sql, {"fio": fio})
+        db.session.execute(sql, {"id": person_id})
         db.session.commit()
+        search_cache.invalidate()
         flash('Клиент удалён', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Ошибка при удалении: {e}', 'danger')
-    return redirect(url_for('people.get_people'))
\ No newline at end of file
+    return redirect(url_for('people.get_people'))
+
+
+# Массовые операции: отмеченные галочками строки удаляются или обновляются
+# одним запросом (WHERE ... IN) в одной транзакции.
+BULK_ACTIONS = ('delete', 'update')
+# clients only: erasing the notes is its own action, never an empty "update"
+PEOPLE_BULK_ACTIONS = BULK_ACTIONS + ('clear_notes',)
+
+
+def _bulk_ids(values):
+    """Distinct integer ids from the form, in the submitted order."""
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return list(dict.fromkeys(ids))
+
+
+@people_bp.route('/bulk', methods=['POST'])
+@login_required
+def bulk_people():
+    db = current_app.extensions['sqlalchemy']
+    action = request.form.get('action')
+    ids = _bulk_ids(request.form.getlist('ids'))
+    if action not in PEOPLE_BULK_ACTIONS or not ids:
+        flash('Отметьте клиентов и выберите действие', 'warning')
+        return redirect(url_for('people.get_people'))
+    notes = (request.form.get('notes') or '').strip()
+    if action == 'update' and not notes:
+        flash('Введите примечание (очистить примечания — отдельное действие)', 'warning')
+        return redirect(url_for('people.get_people'))
+
+    if action == 'delete':
+        # связи с заказами удаляются каскадом (order_client_link)
+        sql = db.text('DELETE FROM practic2 WHERE id IN :ids')
+        params = {'ids': ids}
+        done = 'Удалено клиентов: {}'
+    else:
+        sql = db.text('UPDATE practic2 SET "Примечания" = :notes WHERE id IN :ids')
+        params = {'ids': ids, 'notes': notes if action == 'update' else None}
+        done = 'Обновлено клиентов: {}'
+    try:
+        n = db.session.execute(sql.bindparams(bindparam('ids', expanding=True)), params).rowcount
+        db.session.commit()
+        search_cache.invalidate()
+        flash(done.format(n), 'success')
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('bulk_people failed')
+        flash(f'Ошибка: {e}', 'danger')
+    return redirect(url_for('people.get_people'))
+
+
+# form field -> order2 column that a bulk update may set
+ORDER_BULK_FIELDS = {'status': 'статус_заказа', 'notes': 'примечания'}
+
+
+@people_bp.route('/<int:person_id>/orders/bulk', methods=['POST'])
+@login_required
+def bulk_orders(person_id):
+    db = current_app.extensions['sqlalchemy']
+    action = request.form.get('action')
+    pks = list(dict.fromkeys(pk for pk in request.form.getlist('pks') if pk))
+    back = redirect(url_for('people.view_orders', person_id=person_id))
+    if action not in BULK_ACTIONS or not pks:
+        flash('Отметьте заказы и выберите действие', 'warning')
+        return back
+
+    person = _get_person(db, person_id)
+    if not person:
+        return _person_not_found()
+    schema = get_order_schema(db)
+    pk_col = schema.pk_col or 'номер_заказа'
+    # only this client's orders: the form may carry any order number
+    own = {str(o.get(pk_col)) for o in _load_client_orders(db, person)}
+    pks = [pk for pk in pks if pk in own]
+    if not pks:
+        flash('Отмеченные заказы не принадлежат клиенту', 'warning')
+        return back
+    params = {'pks': pks}
+    if action == 'delete':
+        sql = db.text(f'DELETE FROM order2 WHERE "{pk_col}" IN :pks')
+        done = 'Удалено заказов: {}'
+    else:
+        # only the fields that were filled in; empty inputs leave the column as is
+        set_clauses = []
+        for field, column in ORDER_BULK_FIELDS.items():
+            value = request.form.get(field)
+            if value and column in schema:
+                set_clauses.append(f'"{column}" = :{field}')
+                params[field] = value
+        if not set_clauses:
+            flash('Нет полей для обновления', 'warning')
+            return back
+        sql = db.text(f'UPDATE order2 SET {", ".join(set_clauses)} WHERE "{pk_col}" IN :pks')
+        done = 'Обновлено заказов: {}'
+    try:
+        n = db.session.execute(sql.bindparams(bindparam('pks', expanding=True)), params).rowcount
+        if action == 'delete':
+            order_links.sync_links(db, order_links.unlink_orders, pks)
+        db.session.commit()
+        flash(done.format(n), 'success')
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('bulk_orders failed')
+        flash(f'Ошибка: {e}', 'danger')
+    return back
+
+
+# Старые адреса по ФИО (/clients/<ФИО>/...): находят id. GET и HEAD
+# перенаправляются на адрес по id (при однофамильцах — на первого). POST не
+# перенаправляется: он выполняется сразу, если клиент с таким ФИО один, иначе
+# 404 (нет такого) или 409 (однофамильцы) — изменение не должно уйти не тому
+# клиенту. Клиент, чьё ФИО состоит из цифр, по старому адресу не открывается —
+# это адрес по id (см. FioConverter).
+def _fio_redirect(endpoint):
+    def view(fio, **kwargs):
+        db = current_app.extensions['sqlalchemy']
+        person_ids = _person_ids_by_fio(db, fio)
+        if request.method in ('GET', 'HEAD'):
+            if not person_ids:
+                return _person_not_found()
+            return redirect(url_for(f'people.{endpoint}', person_id=person_ids[0], **kwargs))
+        if not person_ids:
+            abort(404)
+        if len(person_ids) > 1:
+            abort(409)
+        return current_app.view_functions[f'people.{endpoint}'](person_id=person_ids[0], **kwargs)
+    view.__name__ = f'{endpoint}_by_fio'
+    return view
+
+
+for _rule, _endpoint, _methods in [
+    ('', 'view_person', ['GET']),
+    ('/edit', 'edit_person', ['GET', 'POST']),
+    ('/orders', 'view_orders', ['GET']),
+    ('/orders/create', 'create_order', ['GET', 'POST']),
+    ('/orders/<path:pk>/edit', 'edit_order', ['GET', 'POST']),
+    ('/orders/<path:pk>/delete', 'delete_order', ['POST']),
+    ('/delete', 'delete_person', ['POST']),
+    ('/orders/bulk', 'bulk_orders', ['POST']),
+]:
+    people_bp.add_url_rule('/<fio:fio>' + _rule, f'{_endpoint}_by_fio', _fio_redirect(_endpoint), methods=_methods)
@@ -0,0 +1,206 @@
+"""Duplicate detection and merge for practic2 (`flask clients dedup`).
+
+Comparing every pair of clients is quadratic, so candidates are found by
+blocking: rows are grouped in SQL by three keys and only rows sharing a
+key are compared:
+
+    fio    lower-case FIO, ё → е, single spaces
+    phone  last 10 digits of phone_digits (8… / +7… / no code are equal)
+    email  lower-case trimmed email
+
+Within a block two rows are duplicates when at least two of FIO, phone,
+email and birth date agree, and their birth dates (when both are set) do
+not differ; a shared common FIO alone is not enough. Matches are joined
+into clusters with union-find, never across different birth dates.
+Blocks larger than max_block rows (e.g. a placeholder phone used by
+hundreds of rows) are skipped and reported.
+
+merge_cluster locks the rows and checks them again (they may have been
+edited since find_duplicates), keeps the lowest id, fills its empty fields
+from the other rows, moves their orders to it and deletes them, in one
+transaction per cluster.
+"""
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, text
+
+DEFAULT_MAX_BLOCK = 200
+# ids per query when loading the rows of the candidate blocks
+_FETCH_CHUNK = 1000
+
+# practic2 columns copied to the kept row when it has no value
+MERGE_COLUMNS = (
+    'ФИО', 'Пол', 'Адрес', 'Возраст', 'Дата_рождения', 'Номер_телефона', 'Почта', 'Примечания', 'phone_digits',
+)
+
+_KEYS_SQL = '''
+    SELECT id,
+           regexp_replace(translate(lower(btrim(COALESCE("ФИО", ''))), 'ё', 'е'), '\\s+', ' ', 'g') AS fio,
+           CASE WHEN length(phone_digits) >= 10 THEN right(phone_digits, 10) ELSE '' END AS phone,
+           lower(btrim(COALESCE("Почта", ''))) AS email,
+           "Дата_рождения" AS birth_date
+    FROM practic2
+'''
+
+_BLOCKS_SQL = f'''
+    WITH k AS ({_KEYS_SQL})
+    SELECT 'fio' AS block, fio AS key, array_agg(id ORDER BY id) AS ids FROM k WHERE fio <> '' GROUP BY fio HAVING count(*) > 1
+    UNION ALL
+    SELECT 'phone', phone, array_agg(id ORDER BY id) FROM k WHERE phone <> '' GROUP BY phone HAVING count(*) > 1
+    UNION ALL
+    SELECT 'email', email, array_agg(id ORDER BY id) FROM k WHERE email <> '' GROUP BY email HAVING count(*) > 1
+'''
+
+
+class ClientKeys(NamedTuple):
+    id: int
+    fio: str
+    phone: str
+    email: str
+    birth_date: Any
+
+
+class DedupReport(NamedTuple):
+    clusters: List[List[int]]        # sorted ids, the first one is kept
+    skipped_blocks: List[Tuple[str, str, int]]  # (block, key, size) over max_block
+
+
+def is_duplicate(a: ClientKeys, b: ClientKeys) -> bool:
+    """At least two of fio / phone / email / birth date agree, birth dates do not conflict."""
+    if a.birth_date and b.birth_date and a.birth_date != b.birth_date:
+        return False
+    agree = sum(1 for x, y in ((a.fio, b.fio), (a.phone, b.phone), (a.email, b.email),
+                                (a.birth_date, b.birth_date)) if x and x == y)
+    return agree >= 2
+
+
+class UnionFind:
+    """Disjoint sets over client ids (path halving, union by size)."""
+
+    def __init__(self):
+        self.parent: Dict[int, int] = {}
+        self.size: Dict[int, int] = {}
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        if x not in parent:
+            parent[x] = x
+            self.size[x] = 1
+            return x
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+
+    def groups(self) -> List[List[int]]:
+        out: Dict[int, List[int]] = {}
+        for x in self.parent:
+            out.setdefault(self.find(x), []).append(x)
+        return [sorted(g) for g in out.values() if len(g) > 1]
+
+
+def cluster(blocks: Iterable[Sequence[int]], rows: Dict[int, ClientKeys]) -> List[List[int]]:
+    """Clusters of duplicates from candidate blocks (lists of ids).
+
+    Two clusters are not joined when their known birth dates differ, so a
+    row without a birth date cannot chain two different people together.
+    """
+    uf = UnionFind()
+    birth: Dict[int, Any] = {}  # root -> birth date known in its cluster
+    for ids in blocks:
+        for a, b in combinations(ids, 2):
+            ra, rb = uf.find(a), uf.find(b)
+            if ra == rb or not is_duplicate(rows[a], rows[b]):
+                continue
+            date_a = birth.get(ra, rows[a].birth_date)
+            date_b = birth.get(rb, rows[b].birth_date)
+            if date_a and date_b and date_a != date_b:
+                continue
+            uf.union(a, b)
+            birth[uf.find(a)] = date_a or date_b
+    return sorted(uf.groups())
+
+
+def find_duplicates(db: Any, max_block: int = DEFAULT_MAX_BLOCK) -> DedupReport:
+    """Blocks from SQL, pairwise checks inside them, clusters (PostgreSQL)."""
+    blocks: List[List[int]] = []
+    skipped: List[Tuple[str, str, int]] = []
+    for block, key, ids in db.session.execute(text(_BLOCKS_SQL)):
+        if len(ids) > max_block:
+            skipped.append((block, key, len(ids)))
+        else:
+            blocks.append(ids)
+
+    wanted = sorted({i for ids in blocks for i in ids})
+    rows: Dict[int, ClientKeys] = {}
+    fetch = text(f'SELECT * FROM ({_KEYS_SQL}) k WHERE id IN :ids').bindparams(bindparam('ids', expanding=True))
+    for start in range(0, len(wanted), _FETCH_CHUNK):
+        for r in db.session.execute(fetch, {'ids': wanted[start:start + _FETCH_CHUNK]}):
+            rows[r.id] = ClientKeys(*r)
+    # rows deleted meanwhile drop out of their blocks
+    blocks = [[i for i in ids if i in rows] for ids in blocks]
+    return DedupReport(cluster(blocks, rows), skipped)
+
+
+def merge_cluster(db: Any, ids: Sequence[int]) -> Optional[int]:
+    """Merge the cluster into its lowest id; returns the number of deleted rows.
+
+    The rows are locked and the duplicate check is repeated on their
+    current values; only the rows that still form a cluster (the one with
+    the lowest id) are merged, the others are left alone. The orders of
+    the deleted rows get the kept client in their client column and their
+    links. Runs in its own transaction and commits. Returns None when fewer
+    than two of the rows still exist or match.
+    """
+    from . import order_links
+
+    try:
+        members = db.session.execute(text(
+            'SELECT * FROM practic2 WHERE id IN :ids ORDER BY id FOR UPDATE'
+        ).bindparams(bindparam('ids', expanding=True)), {'ids': list(ids)}).mappings().fetchall()
+        # edited since find_duplicates? check the locked values again
+        keys = {r.id: ClientKeys(*r) for r in db.session.execute(text(
+            f'SELECT * FROM ({_KEYS_SQL}) k WHERE id IN :ids'
+        ).bindparams(bindparam('ids', expanding=True)), {'ids': [m['id'] for m in members]})}
+        groups = cluster([sorted(keys)], keys)
+        members = [m for m in members if groups and m['id'] in groups[0]]
+        if len(members) < 2:
+            db.session.rollback()
+            return None
+        keep, extra = members[0], members[1:]
+        extra_ids = [m['id'] for m in extra]
+
+        fill = {}
+        for col in MERGE_COLUMNS:
+            if col in keep and keep[col] in (None, ''):
+                value = next((m[col] for m in extra if m.get(col) not in (None, '')), None)
+                if value is not None:
+                    fill[col] = value
+        if fill:
+            assignments = ', '.join(f'"{col}" = :v{i}' for i, col in enumerate(fill))
+            params = {f'v{i}': value for i, value in enumerate(fill.values())}
+            params['id'] = keep['id']
+            db.session.execute(text(f'UPDATE practic2 SET {assignments} WHERE id = :id'), params)
+
+        # not via sync_links: a merge that cannot move the orders must not delete their client
+        merged = {**keep, **fill}
+        order_links.set_order_client(db, extra_ids, merged.get('Номер_телефона') or merged.get('ФИО') or '')
+        order_links.move_links(db, extra_ids, keep['id'])
+        deleted = db.session.execute(text(
+            'DELETE FROM practic2 WHERE id IN :ids'
+        ).bindparams(bindparam('ids', expanding=True)), {'ids': extra_ids}).rowcount
+        db.session.commit()
+        return deleted
+    except Exception:
+        db.session.rollback()
+        raise
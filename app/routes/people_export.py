@@ -0,0 +1,86 @@
+"""Export of the (filtered) client list as CSV or XLSX.
+
+Rows are read through a server-side cursor (stream_results) in chunks of
+EXPORT_CHUNK_SIZE rows, so memory does not grow with the result size. CSV
+is sent chunk by chunk as it is read. XLSX is written with openpyxl's
+write-only workbook (rows go to a temp file, not into memory) and sent
+when the workbook is complete, since the zip format needs its directory
+at the end.
+
+Column headers are the practic2 names, so an exported file can be
+imported back as is.
+"""
+import csv
+import io
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Sequence
+
+from sqlalchemy import text
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# (header, key in the search row)
+COLUMNS = [
+    ('ФИО', 'fio'),
+    ('Пол', 'gender'),
+    ('Адрес', 'address'),
+    ('Возраст', 'age'),
+    ('Дата_рождения', 'birth_date'),
+    ('Номер_телефона', 'phone'),
+    ('Почта', 'email'),
+    ('Примечания', 'notes'),
+]
+
+
+def iter_row_chunks(engine: Any, sql: str, params: Dict[str, Any],
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Sequence[Any]]]:
+    """Yield lists of row values (in COLUMNS order) from a server-side cursor.
+
+    Uses its own connection so the request session is not held open with a
+    half-read cursor; the connection is closed when the generator ends or is
+    closed (client disconnect).
+    """
+    keys = [key for _header, key in COLUMNS]
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(
+            text(sql), params)
+        for part in result.mappings().partitions(chunk_size):
+            yield [[row[k] for k in keys] for row in part]
+
+
+def csv_stream(chunks: Iterator[List[Sequence[Any]]]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # BOM so that Excel opens the file as UTF-8; the import reads utf-8-sig
+    buf.write('\ufeff')
+    writer.writerow([header for header, _key in COLUMNS])
+    yield buf.getvalue()
+    for rows in chunks:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(rows)
+        yield buf.getvalue()
+
+
+def xlsx_stream(chunks: Iterator[List[Sequence[Any]]], read_size: int = 64 * 1024) -> Iterator[bytes]:
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Клиенты')
+    ws.append([header for header, _key in COLUMNS])
+    for rows in chunks:
+        for row in rows:
+            ws.append(row)
+    fd, path = tempfile.mkstemp(prefix='export-', suffix='.xlsx')
+    os.close(fd)
+    try:
+        wb.save(path)
+        with open(path, 'rb') as fh:
+            while True:
+                data = fh.read(read_size)
+                if not data:
+                    break
+                yield data
+    finally:
+        os.unlink(path)
@@ -0,0 +1,286 @@
+"""Read and write path for client imports into practic2.
+
+Files are parsed as a stream: the header row is matched to the import
+fields once (header_mapping), then read_rows yields one mapped row at a
+time, so memory does not grow with the file. CSV may be gzip-compressed
+(.csv.gz); XLSX is read with openpyxl in read-only mode. Uploads over
+500 KB are already spooled to a temporary file by Werkzeug, background
+imports to IMPORT_SPOOL_DIR (see import_jobs). limit_rows enforces
+IMPORT_MAX_ROWS while the rows are read.
+
+Rows are taken in chunks of IMPORT_CHUNK_SIZE and checked first (see
+people_validation): rows with a bad value are reported and skipped without
+a query; doubtful values (a short phone, an odd e-mail) are stored as
+before and only reported as warnings, unless IMPORT_STRICT_VALIDATION
+turns them into errors. The valid rows of a chunk go in with one
+multi-row INSERT, all in the caller's transaction. Each chunk runs in a
+savepoint; when a chunk still fails, only that chunk is retried row by row
+(one savepoint per row) to find and report the bad lines, and the rest of
+the file is not affected. The caller commits once at the end. validate_file() runs only
+the checks, for a dry run.
+
+The same code runs in the request (import_clients) and in background jobs
+(import_jobs).
+"""
+import csv
+import gzip
+import io
+from itertools import islice
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import column, insert, table
+
+from . import order_links
+from .people_search import _digits_only
+from .people_validation import MAX_REPORTED_ERRORS, RowError, ValidationReport, validate_batch
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Lightweight table construct: a Core insert() lets SQLAlchemy batch the
+# rows into multi-row VALUES statements (insertmanyvalues).
+_practic2 = table(
+    'practic2',
+    column('id'), column('ФИО'), column('Пол'), column('Адрес'), column('Возраст'),
+    column('Дата_рождения'), column('Номер_телефона'), column('Почта'), column('Примечания'),
+    column('phone_digits'),
+)
+
+
+class ImportFileError(ValueError):
+    """The uploaded file cannot be read; the message is shown to the user."""
+
+    def __init__(self, message: str, category: str = 'warning'):
+        super().__init__(message)
+        self.category = category  # flash() category
+
+
+# import field -> accepted header names, compared lower-case with spaces as underscores
+FIELD_HEADERS = {
+    'fio': ('ФИО', 'fio'),
+    'gender': ('Пол', 'gender'),
+    'address': ('Адрес', 'address'),
+    'age': ('Возраст', 'age'),
+    'birth_date': ('Дата_рождения', 'birth_date', 'birthdate'),
+    'phone': ('Номер_телефона', 'phone', 'phone_number', 'tel'),
+    'email': ('Почта', 'email', 'e-mail'),
+    'notes': ('Примечания', 'notes', 'comments'),
+}
+IMPORT_EXTENSIONS = ('.csv', '.csv.gz', '.xlsx')
+
+
+def _header_key(name: Any) -> str:
+    return str(name).strip().lower().replace(' ', '_')
+
+
+def header_mapping(headers: Sequence[Any]) -> Dict[str, int]:
+    """Column index of every import field found in the header row."""
+    # a repeated header: the last column wins, as with csv.DictReader
+    positions = {_header_key(h): i for i, h in enumerate(headers) if h is not None}
+    mapping = {}
+    for field, names in FIELD_HEADERS.items():
+        for name in names:
+            if name.lower() in positions:
+                mapping[field] = positions[name.lower()]
+                break
+    return mapping
+
+
+def _mapped(header: Sequence[Any], rows: Iterable[Sequence[Any]]) -> Iterator[Dict[str, Any]]:
+    columns = list(header_mapping(header).items())
+    for row in rows:
+        if not any(v not in (None, '') for v in row):
+            continue  # blank line / empty XLSX row
+        n = len(row)
+        yield {field: (row[i] if i < n else None) for field, i in columns}
+
+
+def _csv_rows(fileobj: BinaryIO, compressed: bool) -> Iterator[Dict[str, Any]]:
+    binary = gzip.GzipFile(fileobj=fileobj, mode='rb') if compressed else fileobj
+    reader = csv.reader(io.TextIOWrapper(binary, encoding='utf-8-sig', newline=''))
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise ImportFileError('Файл пустой')
+    except (OSError, EOFError):  # not gzip data / truncated archive
+        raise ImportFileError('Не удалось распаковать файл .csv.gz')
+    return _mapped(header, reader)
+
+
+def _xlsx_rows(fileobj: BinaryIO) -> Iterator[Dict[str, Any]]:
+    try:
+        import openpyxl
+    except Exception:
+        raise ImportFileError('Для импорта XLSX требуется пакет openpyxl. Установите его и перезапустите.', 'danger')
+    wb = openpyxl.load_workbook(fileobj, read_only=True)
+    it = wb.active.values
+    try:
+        header = next(it)
+    except StopIteration:
+        wb.close()
+        raise ImportFileError('Файл пустой')
+
+    def rows():
+        try:
+            yield from _mapped(header, it)
+        finally:
+            wb.close()
+    return rows()
+
+
+def read_rows(fileobj: BinaryIO, filename: str) -> Iterator[Dict[str, Any]]:
+    """Mapped rows (import field -> value) of an uploaded CSV, CSV.GZ or XLSX file.
+
+    The header is read at once, so an empty or unreadable file fails here;
+    the rows are read lazily from fileobj, which must stay open meanwhile.
+    """
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return _csv_rows(fileobj, compressed=False)
+    if name.endswith('.csv.gz'):
+        return _csv_rows(fileobj, compressed=True)
+    if name.endswith('.xlsx'):
+        return _xlsx_rows(fileobj)
+    raise ImportFileError('Поддерживаются только файлы .csv, .csv.gz и .xlsx')
+
+
+def limit_rows(rows: Iterable[Any], max_rows: Optional[int]) -> Iterator[Any]:
+    """Pass rows through, failing once there are more than max_rows (IMPORT_MAX_ROWS; 0 / None = no limit)."""
+    if not max_rows:
+        yield from rows
+        return
+    for n, row in enumerate(rows, start=1):
+        if n > max_rows:
+            raise ImportFileError(f'Файл слишком большой (больше {max_rows} строк).', 'danger')
+        yield row
+
+
+def map_row(r: Dict[Any, Any]) -> Dict[str, Any]:
+    """Map one raw row (header -> value) to the import field names.
+
+    For a single dict row; files resolve their header once, see read_rows.
+    """
+    headers = [k for k in r if k is not None]
+    mapping = header_mapping(headers)
+    return {field: (r[headers[mapping[field]]] if field in mapping else None) for field in FIELD_HEADERS}
+
+
+def row_values(mapped: Dict[str, Any]) -> Dict[str, Any]:
+    """Column values for one mapped row."""
+    phone = mapped.get('phone') or None
+    age = mapped.get('age')
+    return {
+        'ФИО': mapped.get('fio') or '',
+        'Пол': mapped.get('gender') or None,
+        'Адрес': mapped.get('address') or None,
+        'Возраст': age if age not in ('', None) else None,
+        'Дата_рождения': mapped.get('birth_date') or None,
+        'Номер_телефона': phone,
+        'Почта': mapped.get('email') or None,
+        'Примечания': mapped.get('notes') or None,
+        'phone_digits': _digits_only(str(phone or '')),
+    }
+
+
+class ImportResult:
+    """Counters and the first errors and warnings of one import."""
+
+    def __init__(self):
+        self.success = 0
+        self.failed = 0
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+        self.client_ids: List[int] = []  # practic2 ids of the inserted rows
+
+    @property
+    def processed(self) -> int:
+        return self.success + self.failed
+
+    def add_error(self, line: int, exc: Exception) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            # first line of the DBAPI message, without the statement dump
+            msg = str(getattr(exc, 'orig', None) or exc).strip().splitlines()
+            self.errors.append(f'Line {line}: {msg[0] if msg else exc.__class__.__name__}')
+
+    def add_invalid(self, errors: List[RowError]) -> None:
+        """Rows rejected by validation (a row may have several errors)."""
+        self.failed += len({e.line for e in errors})
+        self.errors.extend(str(e) for e in errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+
+    def add_warnings(self, warnings: List[RowError]) -> None:
+        """Doubtful values of rows that are still imported."""
+        self.warnings.extend(str(w) for w in warnings[:MAX_REPORTED_ERRORS - len(self.warnings)])
+
+
+def _chunks(rows: Iterable[Dict[str, Any]], chunk_size: int) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+    """(line, mapped row) pairs in lists of chunk_size."""
+    numbered = enumerate(rows, start=1)
+    while True:
+        chunk = list(islice(numbered, max(1, chunk_size)))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_file(rows: Iterable[Dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  strict: bool = False) -> ValidationReport:
+    """Dry run: check every row, write nothing."""
+    report = ValidationReport()
+    for chunk in _chunks(rows, chunk_size):
+        report.add(len(chunk), validate_batch(chunk, strict))
+    return report
+
+
+def import_rows(db: Any, rows: Iterable[Dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                on_chunk: Optional[Callable[[ImportResult], None]] = None,
+                strict: bool = False) -> ImportResult:
+    """Insert mapped rows (see read_rows) into practic2 without committing.
+
+    on_chunk, if given, is called with the running result after every chunk.
+    strict makes the validation warnings errors (IMPORT_STRICT_VALIDATION).
+    """
+    result = ImportResult()
+    stmt = insert(_practic2).returning(_practic2.c.id)
+    for mapped in _chunks(rows, chunk_size):
+        chunk, errors, warnings = validate_batch(mapped, strict)
+        if errors:
+            result.add_invalid(errors)
+        if warnings:
+            result.add_warnings(warnings)
+        if not chunk:
+            if on_chunk:
+                on_chunk(result)
+            continue
+        values = [row_values(clean) for _line, clean in chunk]
+        try:
+            with db.session.begin_nested():
+                ids = db.session.execute(stmt, values).scalars().all()
+            result.success += len(values)
+            result.client_ids.extend(ids)
+        except Exception:
+            # find the bad rows of this chunk; the good ones still go in
+            for (line, _clean), row in zip(chunk, values):
+                try:
+                    with db.session.begin_nested():
+                        new_id = db.session.execute(stmt, row).scalar()
+                    result.success += 1
+                    result.client_ids.append(new_id)
+                except Exception as e:
+                    result.add_error(line, e)
+        if on_chunk:
+            on_chunk(result)
+    return result
+
+
+def run_import(db: Any, rows: Iterable[Dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE,
+               on_chunk: Optional[Callable[[ImportResult], None]] = None,
+               strict: bool = False) -> ImportResult:
+    """import_rows() plus linking orders to the new clients; still no commit.
+
+    Only the imported clients are matched, chunk_size of them per query.
+    """
+    result = import_rows(db, rows, chunk_size, on_chunk, strict)
+    ids = result.client_ids
+    for start in range(0, len(ids), max(1, chunk_size)):
+        order_links.sync_links(db, order_links.link_orders, client_ids=ids[start:start + chunk_size])
+    return result
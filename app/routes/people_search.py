@@ -1,8 +1,36 @@
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 from flask import current_app
 from sqlalchemy import text
+import base64
+import json
 import re
 
+from . import search_cache
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# rows fetched per round trip by the streaming list
+STREAM_BATCH = 100
+
+# Sort key for keyset pagination. Must match the expression in the
+# ix_practic2_fio_id index, otherwise Postgres falls back to a full sort.
+_SORT_KEY = 'COALESCE("ФИО", \'\')'
+
+_SELECT_SQL = '''
+	SELECT
+		id,
+		"ФИО" AS fio,
+		"Пол" AS gender,
+		"Адрес" AS address,
+		"Возраст" AS age,
+		"Дата_рождения"::text AS birth_date,
+		COALESCE("Номер_телефона", '') AS phone,
+		"Почта" AS email,
+		"Примечания" AS notes
+	FROM practic2
+'''
+
 
 def _normalize_gender_input(raw: str) -> Dict[str, str]:
 	if not raw:
@@ -21,12 +49,64 @@ def _digits_only(s: str) -> str:
 	return re.sub(r"\D", "", s or "")
 
 
-def search_people(db: Any, args: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
-	"""Search people by filters.
+# Number of trailing digits that identify a phone regardless of the
+# country/trunk prefix (+7 / 8 / none).
+PHONE_SUFFIX_LEN = 10
 
-	Supported filters: fio, gender, phone, email, age
-	Returns (people_list, filters_dict)
+
+def phone_suffix_pattern(digits: str) -> str:
+	"""LIKE pattern for reverse(phone_digits): numbers ending with digits.
+
+	Served by the ix_*_phone_digits_rev indexes.
 	"""
+	return digits[-PHONE_SUFFIX_LEN:][::-1] + '%'
+
+
+def _like_escape(s: str) -> str:
+	"""Escape LIKE wildcards so user input is matched literally."""
+	return s.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _text_clause(column: str, name: str, term: str, params: Dict[str, Any]) -> str:
+	"""Substring match on column.
+
+	The pg_trgm indexes from the 7a6a14ae9b93 migration serve terms of
+	three or more characters; shorter ones give no trigram to look up and
+	are scanned, but still match anywhere in the value.
+	"""
+	params[name] = f"%{_like_escape(term)}%"
+	return f'{column} ILIKE :{name}'
+
+
+def encode_cursor(fio: Optional[str], person_id: int) -> str:
+	"""Pack a (fio, id) sort position into an opaque URL-safe token."""
+	raw = json.dumps([fio or '', int(person_id)], ensure_ascii=False).encode('utf-8')
+	return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[str, int]]:
+	"""Inverse of encode_cursor. Returns None for a missing or malformed token."""
+	if not token:
+		return None
+	try:
+		padded = token + '=' * (-len(token) % 4)
+		fio, person_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+		return str(fio), int(person_id)
+	except (ValueError, TypeError, UnicodeError):
+		return None
+
+
+def _page_size(args: Dict[str, Any]) -> int:
+	default = current_app.config.get('PEOPLE_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+	try:
+		size = int(args.get('per_page') or default)
+	except (TypeError, ValueError):
+		size = default
+	return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _build_filters(args: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str], Dict[str, Any]]:
+	"""Translate request args into (filters, where_clauses, params)."""
 	filters: Dict[str, Any] = {}
 	where_clauses: List[str] = []
 	params: Dict[str, Any] = {}
@@ -34,23 +114,23 @@ def search_people(db: Any, args: Dict[str, Any]) -> Tuple[List[Dict[str, Any]],
 	fio = (args.get('fio') or '').strip()
 	if fio:
 		filters['fio'] = fio
-		where_clauses.append('"ФИО" ILIKE :fio')
-		params['fio'] = f"%{fio}%"
+		where_clauses.append(_text_clause('"ФИО"', 'fio', fio, params))
 
 	phone = (args.get('phone') or '').strip()
 	if phone:
 		filters['phone'] = phone
 		digits = _digits_only(phone)
-		# compare only digits for phone, using Postgres regexp_replace
-		# Use a safe empty-string fallback for the legacy phone column (avoid referencing a non-existent variant)
-		where_clauses.append("regexp_replace(COALESCE(\"Номер_телефона\", ''), '\\D', '', 'g') LIKE :phone_digits")
-		params['phone_digits'] = f"%{digits}%"
+		if digits:
+			# phone_digits is kept in sync on write; both branches are index
+			# range scans: the start of the number, or its last digits
+			where_clauses.append('(phone_digits LIKE :phone_prefix OR reverse(phone_digits) LIKE :phone_rsuffix)')
+			params['phone_prefix'] = f"{digits}%"
+			params['phone_rsuffix'] = phone_suffix_pattern(digits)
 
 	email = (args.get('email') or '').strip()
 	if email:
 		filters['email'] = email
-		where_clauses.append('"Почта" ILIKE :email')
-		params['email'] = f"%{email}%"
+		where_clauses.append(_text_clause('"Почта"', 'email', email, params))
 
 	age = (args.get('age') or '').strip()
 	if age:
@@ -70,59 +150,214 @@ def search_people(db: Any, args: Dict[str, Any]) -> Tuple[List[Dict[str, Any]],
 		params['gender_pattern'] = gender_norm['pattern']
 		params['gender_initial'] = gender_norm['initial']
 
-	# If no filters, return full select (previous behavior)
-	if not where_clauses:
-		full_sql = '''
-			SELECT
-				"ФИО" AS fio,
-				"Пол" AS gender,
-				"Адрес" AS address,
-				"Возраст" AS age,
-				"Дата_рождения"::text AS birth_date,
-				COALESCE("Номер_телефона", '') AS phone,
-				"Почта" AS email,
-				"Примечания" AS notes
-			FROM practic2
-			ORDER BY "ФИО"
-		'''
+	return filters, where_clauses, params
+
+
+def _estimate_count(db: Any, where_clauses: List[str], params: Dict[str, Any]) -> Optional[int]:
+	"""Cheap row count estimate taken from planner statistics instead of COUNT(*).
+
+	Without filters this is pg_class.reltuples; with filters it is the row
+	estimate of the top plan node. Returns None when no estimate is available.
+	"""
+	try:
+		if not where_clauses:
+			value = db.session.execute(text(
+				"SELECT reltuples::bigint FROM pg_class WHERE oid = 'practic2'::regclass"
+			)).scalar()
+		else:
+			explain_sql = 'EXPLAIN (FORMAT JSON) SELECT 1 FROM practic2 WHERE ' + ' AND '.join(where_clauses)
+			plan = db.session.execute(text(explain_sql), params).scalar()
+			if isinstance(plan, str):
+				plan = json.loads(plan)
+			value = plan[0]['Plan']['Plan Rows']
+	except Exception:
 		try:
-			current_app.logger.debug('search_people: running full select (no filters)')
-			result = db.session.execute(text(full_sql)).mappings().fetchall()
-			people = [dict(r) for r in result]
-			current_app.logger.info('search_people: full select returned %d rows', len(people))
-			return people, filters
+			db.session.rollback()
 		except Exception:
-			try:
-				db.session.rollback()
-			except Exception:
-				pass
-			current_app.logger.exception('search_people: database error on full select')
-			return [], filters
-
-	base_sql = '''
-		SELECT
-			"ФИО" AS fio,
-			"Пол" AS gender,
-			"Возраст" AS age,
-			COALESCE("Номер_телефона", '') AS phone,
-			"Почта" AS email
-		FROM practic2
-	'''
-	base_sql += '\n WHERE ' + '\n AND '.join(where_clauses)
-	base_sql += '\n ORDER BY "ФИО"'
-	base_sql += '\n LIMIT 1000'
+			pass
+		current_app.logger.debug('search_people: count estimate unavailable', exc_info=True)
+		return None
+	# reltuples is -1 for a table that has never been analyzed
+	if value is None or value < 0:
+		return None
+	return int(value)
 
+
+class PersonRow(NamedTuple):
+	"""One row of the clients list; a tuple, so much smaller than a dict per row."""
+	id: int
+	fio: Optional[str]
+	gender: Optional[str]
+	address: Optional[str]
+	age: Optional[int]
+	birth_date: Optional[str]
+	phone: str
+	email: Optional[str]
+	notes: Optional[str]
+
+
+class _PageQuery(NamedTuple):
+	filters: Dict[str, Any]
+	where_clauses: List[str]
+	params: Dict[str, Any]
+	sql: str
+	query_params: Dict[str, Any]
+	page: Dict[str, Any]
+	after: bool
+	backward: bool
+
+
+def _page_query(args: Dict[str, Any]) -> _PageQuery:
+	"""SQL of one keyset page: in list order for after / no cursor, in
+	reverse order for before, with one row more than per_page."""
+	filters, where_clauses, params = _build_filters(args)
+	per_page = _page_size(args)
+	page: Dict[str, Any] = {'per_page': per_page, 'next': None, 'prev': None, 'total_estimate': None}
+
+	after = decode_cursor(args.get('after'))
+	before = decode_cursor(args.get('before')) if not after else None
+	backward = before is not None
+	cursor = before or after
+
+	clauses = list(where_clauses)
+	query_params = dict(params)
+	if cursor:
+		clauses.append(f'({_SORT_KEY}, id) {"<" if backward else ">"} (:cursor_fio, :cursor_id)')
+		query_params['cursor_fio'], query_params['cursor_id'] = cursor
+	direction = 'DESC' if backward else 'ASC'
+
+	sql = _SELECT_SQL
+	if clauses:
+		sql += '\n WHERE ' + '\n AND '.join(clauses)
+	sql += f'\n ORDER BY {_SORT_KEY} {direction}, id {direction}'
+	# one extra row tells us whether there is another page in this direction
+	sql += '\n LIMIT :limit'
+	query_params['limit'] = per_page + 1
+	return _PageQuery(filters, where_clauses, params, sql, query_params, page, after is not None, backward)
+
+
+def _set_cursors(q: _PageQuery, people: List[PersonRow], has_more: bool) -> None:
+	"""Fill q.page['next'] / ['prev'] from the rows shown, in list order."""
+	if not people:
+		return
+	first, last = people[0], people[-1]
+	if has_more or q.backward:
+		q.page['next'] = encode_cursor(last.fio, last.id)
+	if (has_more and q.backward) or q.after:
+		q.page['prev'] = encode_cursor(first.fio, first.id)
+
+
+def search_people(db: Any, args: Dict[str, Any]) -> Tuple[List[PersonRow], Dict[str, Any], Dict[str, Any]]:
+	"""Search people by filters, one keyset page at a time.
+
+	Supported filters: fio, gender, phone, email, age
+	Paging args: per_page, after / before (cursors from a previous page)
+	Returns (people_list, filters_dict, page_dict); page_dict holds
+	per_page, next, prev (cursors or None) and total_estimate.
+
+	Results are cached per normalized args, see search_cache; a hit does
+	not touch the database.
+	"""
+	cache_key = search_cache.make_key(args)
+	cached = search_cache.lookup(cache_key)
+	if cached is not None:
+		people, filters, page = cached
+		return list(people), dict(filters), dict(page)
+
+	q = _page_query(args)
+	per_page = q.page['per_page']
 	try:
-		current_app.logger.debug('search_people: SQL -> %s', base_sql)
-		current_app.logger.debug('search_people: params -> %s', params)
-		result = db.session.execute(text(base_sql), params).mappings().fetchall()
-		people = [dict(r) for r in result]
-		current_app.logger.info('search_people: filtered select returned %d rows', len(people))
-		return people, filters
+		current_app.logger.debug('search_people: SQL -> %s', q.sql)
+		current_app.logger.debug('search_people: params -> %s', q.query_params)
+		result = db.session.execute(text(q.sql), q.query_params).fetchall()
 	except Exception:
 		try:
 			db.session.rollback()
 		except Exception:
 			pass
 		current_app.logger.exception('search_people: database error')
-		return [], filters
\ No newline at end of file
+		return [], q.filters, q.page
+
+	people = [PersonRow(*r) for r in result[:per_page]]
+	has_more = len(result) > per_page
+	if q.backward:
+		people.reverse()
+	current_app.logger.info('search_people: page returned %d rows', len(people))
+
+	_set_cursors(q, people, has_more)
+	q.page['total_estimate'] = _estimate_count(db, q.where_clauses, q.params)
+	search_cache.store(cache_key, (people, q.filters, q.page))
+	return list(people), dict(q.filters), dict(q.page)
+
+
+def stream_people(db: Any, args: Dict[str, Any]) -> Tuple[Iterable[PersonRow], Dict[str, Any], Dict[str, Any]]:
+	"""Like search_people, but rows come from a server-side cursor as they are read.
+
+	The rows iterator runs the query on its own connection (the request's
+	session is closed before a streamed body is sent) when it is first
+	read, so it must be consumed inside the request, as the streamed
+	template does. page['next'] and page['prev'] are only filled in once
+	the iterator is exhausted: the template may use them after the rows
+	only. A cache hit returns the cached list; a page read to the end is
+	stored in the cache.
+	"""
+	cache_key = search_cache.make_key(args)
+	cached = search_cache.lookup(cache_key)
+	if cached is not None:
+		people, filters, page = cached
+		return list(people), dict(filters), dict(page)
+
+	q = _page_query(args)
+	q.page['total_estimate'] = _estimate_count(db, q.where_clauses, q.params)
+	return _iter_page(db.engine, cache_key, q), q.filters, q.page
+
+
+def _iter_page(engine: Any, cache_key: Any, q: _PageQuery) -> Iterator[PersonRow]:
+	per_page = q.page['per_page']
+	sql = q.sql
+	if q.backward:
+		# the index gives the rows of a "before" page in reverse; flip them
+		# back in SQL (at most per_page + 1 rows). The extra row, if any, is
+		# then the first one, and n tells whether it is there.
+		sql = f'SELECT p.*, count(*) OVER () AS n FROM ({sql}) AS p ORDER BY COALESCE(p.fio, \'\'), p.id'
+	people: List[PersonRow] = []
+	has_more = False
+	try:
+		with engine.connect() as conn:
+			current_app.logger.debug('stream_people: SQL -> %s', sql)
+			current_app.logger.debug('stream_people: params -> %s', q.query_params)
+			result = conn.execution_options(
+				stream_results=True,
+				yield_per=current_app.config.get('PEOPLE_STREAM_BATCH', STREAM_BATCH),
+			).execute(text(sql), q.query_params)
+			for i, r in enumerate(result):
+				if q.backward:
+					if i == 0 and r[-1] > per_page:
+						has_more = True
+						continue
+					r = r[:-1]
+				elif i == per_page:
+					has_more = True
+					break
+				row = PersonRow(*r)
+				people.append(row)
+				yield row
+	except Exception:
+		current_app.logger.exception('stream_people: database error')
+		return
+	current_app.logger.info('stream_people: page returned %d rows', len(people))
+	_set_cursors(q, people, has_more)
+	search_cache.store(cache_key, (people, q.filters, dict(q.page)))
+
+
+def export_query(args: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+	"""SQL and params for every row matching the search filters, in list order.
+
+	Used by the export, which reads the whole result instead of one page.
+	"""
+	_filters, where_clauses, params = _build_filters(args)
+	sql = _SELECT_SQL
+	if where_clauses:
+		sql += '\n WHERE ' + '\n AND '.join(where_clauses)
+	sql += f'\n ORDER BY {_SORT_KEY}, id'
+	return sql, params
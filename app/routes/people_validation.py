@@ -0,0 +1,213 @@
+"""Validation of client import rows before they are written.
+
+Every mapped row (see people_import.read_rows) goes through RULES, one
+coercer per field: the value is cleaned up and converted to the type of
+its practic2 column. A value the database would reject anyway (or an
+empty FIO) is an error: the row is reported and skipped without a query,
+so it no longer costs a failed statement and a savepoint rollback.
+
+Values that the import used to store as they are only get a warning by
+default and the row is still imported; with IMPORT_STRICT_VALIDATION on
+they are errors too:
+
+    field       error                        warning (error when strict)
+    fio         empty                        -
+    age         not an integer               outside 0..150
+    birth_date  not a date: a format other   outside 1900..today
+                than YYYY-MM-DD, YYYY/MM/DD,
+                YYYYMMDD, DD.MM.YYYY,
+                DD/MM/YYYY, or no such date
+                (31.02.2020)
+    phone       -                            not 10..15 digits
+    email       -                            not name@domain.tld
+
+Only values the database stores are warnings, so a chunk of rows that
+passed the check is not rejected by the INSERT.
+
+The same check runs for a dry run (`/clients/import?dry_run=1`), which
+only reports the errors and warnings.
+"""
+import re
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+MAX_AGE = 150
+MIN_BIRTH_YEAR = 1900
+PHONE_DIGITS = (10, 15)
+# Only the first errors are kept for the report; the rest are just counted.
+MAX_REPORTED_ERRORS = 100
+
+_ISO_DATE = re.compile(r'(\d{4})[-/](\d{1,2})[-/](\d{1,2})(?:[ T][\d:.]*)?|(\d{4})(\d{2})(\d{2})')
+_DMY_DATE = re.compile(r'(\d{1,2})[./](\d{1,2})[./](\d{4})')
+_INTEGER = re.compile(r'[+-]?\d+(?:[.,]0*)?')
+_NON_DIGITS = re.compile(r'\D')
+_EMAIL = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s.]+')
+
+
+class Suspicious(ValueError):
+    """A value the import accepts unless validation is strict; value is what gets stored."""
+
+    def __init__(self, message: str, value: Any):
+        super().__init__(message)
+        self.value = value
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # XLSX keeps numbers as floats: 79001234567.0
+    return str(value).strip()
+
+
+def _fio(value: Any) -> str:
+    text = ' '.join(_text(value).split())
+    if not text:
+        raise ValueError('required')
+    return text
+
+
+def _age(value: Any) -> Optional[int]:
+    text = _text(value)
+    if not text:
+        return None
+    if not _INTEGER.fullmatch(text):
+        raise ValueError(f'not a whole number: {text!r}')
+    age = int(re.split(r'[.,]', text)[0])
+    if not 0 <= age <= MAX_AGE:
+        raise Suspicious(f'out of range 0..{MAX_AGE}: {age}', age)
+    return age
+
+
+def _birth_date(value: Any) -> Optional[date]:
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        parsed = value
+    else:
+        text = _text(value)
+        if not text:
+            return None
+        m = _ISO_DATE.fullmatch(text)
+        if m:
+            year, month, day = m.groups()[:3] if m.group(1) else m.groups()[3:]
+        else:
+            m = _DMY_DATE.fullmatch(text)
+            if not m:
+                raise ValueError(f'unknown date format: {text!r}')
+            day, month, year = m.groups()
+        try:
+            parsed = date(int(year), int(month), int(day))
+        except ValueError:
+            raise ValueError(f'no such date: {text!r}')
+    if parsed.year < MIN_BIRTH_YEAR or parsed > date.today():
+        raise Suspicious(f'out of range: {parsed.isoformat()}', parsed)
+    return parsed
+
+
+def _phone(value: Any) -> Optional[str]:
+    text = _text(value)
+    if not text:
+        return None
+    digits = len(_NON_DIGITS.sub('', text))
+    if not PHONE_DIGITS[0] <= digits <= PHONE_DIGITS[1]:
+        raise Suspicious(f'{digits} digits, expected {PHONE_DIGITS[0]}..{PHONE_DIGITS[1]}: {text!r}', text)
+    return text
+
+
+def _email(value: Any) -> Optional[str]:
+    text = _text(value)
+    if not text:
+        return None
+    if not _EMAIL.fullmatch(text):
+        raise Suspicious(f'invalid address: {text!r}', text)
+    return text
+
+
+# field -> coercer; raises ValueError (or Suspicious) with the message for the report
+RULES: Dict[str, Callable[[Any], Any]] = {
+    'fio': _fio,
+    'age': _age,
+    'birth_date': _birth_date,
+    'phone': _phone,
+    'email': _email,
+}
+
+
+class RowError(NamedTuple):
+    line: int
+    field: str
+    message: str
+
+    def __str__(self):
+        return f'Line {self.line}: {self.field}: {self.message}'
+
+
+class Checked(NamedTuple):
+    valid: List[Tuple[int, Dict[str, Any]]]  # (line, clean row)
+    errors: List[RowError]
+    warnings: List[RowError]
+
+
+def validate_row(line: int, mapped: Dict[str, Any],
+                 strict: bool = False) -> Tuple[Dict[str, Any], List[RowError], List[RowError]]:
+    """The row with coerced values, its errors (empty if it is valid) and warnings."""
+    clean = dict(mapped)
+    errors, warnings = [], []
+    for field, rule in RULES.items():
+        try:
+            clean[field] = rule(mapped.get(field))
+        except Suspicious as e:
+            clean[field] = e.value
+            (errors if strict else warnings).append(RowError(line, field, str(e)))
+        except ValueError as e:
+            errors.append(RowError(line, field, str(e)))
+    return clean, errors, warnings
+
+
+def validate_batch(rows: Iterable[Tuple[int, Dict[str, Any]]], strict: bool = False) -> Checked:
+    """Split (line, mapped row) pairs into valid (line, clean row) pairs, errors and warnings."""
+    checked = Checked([], [], [])
+    for line, mapped in rows:
+        clean, row_errors, row_warnings = validate_row(line, mapped, strict)
+        if row_errors:
+            checked.errors.extend(row_errors)
+        else:
+            checked.valid.append((line, clean))
+            checked.warnings.extend(row_warnings)
+    return checked
+
+
+class ValidationReport:
+    """Result of a dry run: counts and the first errors and warnings."""
+
+    def __init__(self):
+        self.rows = 0
+        self.valid = 0
+        self.errors: List[RowError] = []
+        self.error_count = 0
+        self.warnings: List[RowError] = []
+        self.warning_count = 0
+
+    @property
+    def invalid(self) -> int:
+        return self.rows - self.valid
+
+    def add(self, rows: int, checked: Checked) -> None:
+        self.rows += rows
+        self.valid += len(checked.valid)
+        self.error_count += len(checked.errors)
+        self.errors.extend(checked.errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+        self.warning_count += len(checked.warnings)
+        self.warnings.extend(checked.warnings[:MAX_REPORTED_ERRORS - len(self.warnings)])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'rows': self.rows,
+            'valid': self.valid,
+            'invalid': self.invalid,
+            'errors': [e._asdict() for e in self.errors],
+            'errors_truncated': self.error_count > len(self.errors),
+            'warnings': [w._asdict() for w in self.warnings],
+            'warnings_truncated': self.warning_count > len(self.warnings),
+        }
@@ -0,0 +1,109 @@
+"""In-process LRU cache of search_people results.
+
+Operators repeat the same few searches, so a page of results is kept for
+PEOPLE_SEARCH_CACHE_TTL seconds (default 30) in an LRU of
+PEOPLE_SEARCH_CACHE_SIZE entries (default 256, 0 disables the cache).
+Keys are the normalized search args, so "+7 900" and "7900" or "Иван" and
+" иван " share an entry.
+
+Writes to practic2 from this process call invalidate(), which bumps a
+version counter that is part of every key: older entries can no longer be
+hit and age out of the LRU. Other worker processes do not see the bump,
+so there the TTL is the upper bound on staleness, except for pages under
+@conditional: it reads the practic2 counter from table_versions first
+(g.table_versions) and that counter is part of the key, so a page is never
+built from rows older than the version in its ETag.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from flask import current_app, g, has_app_context
+
+DEFAULT_SIZE = 256
+DEFAULT_TTL = 30
+
+# search args that change the result, see people_search.search_people
+_KEY_ARGS = ('fio', 'phone', 'email', 'age', 'gender', 'per_page', 'after', 'before')
+
+
+class SearchCache:
+    """Thread-safe LRU with per-entry TTL and hit/miss counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, ttl: float) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (not ttl or time.monotonic() - entry[0] < ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any, max_size: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'version': self.version}
+
+
+_cache = SearchCache()
+
+
+def _normalize(name: str, value: Any) -> str:
+    value = str(value or '').strip()
+    if name == 'phone':
+        return ''.join(ch for ch in value if ch.isdigit())
+    if name in ('after', 'before'):
+        return value  # opaque cursors are case sensitive
+    return value.lower()
+
+
+def make_key(args: Dict[str, Any]) -> Tuple:
+    """Cache key for the search args at the current cache version."""
+    # the practic2 counter read by @conditional for this request, if any
+    versions = g.get('table_versions') if has_app_context() else None
+    return (_cache.version, (versions or {}).get('practic2')) + tuple(_normalize(name, args.get(name)) for name in _KEY_ARGS)
+
+
+def lookup(key: Tuple) -> Optional[Any]:
+    size = current_app.config.get('PEOPLE_SEARCH_CACHE_SIZE', DEFAULT_SIZE)
+    if not size:
+        return None
+    return _cache.get(key, current_app.config.get('PEOPLE_SEARCH_CACHE_TTL', DEFAULT_TTL))
+
+
+def store(key: Tuple, value: Any) -> None:
+    size = current_app.config.get('PEOPLE_SEARCH_CACHE_SIZE', DEFAULT_SIZE)
+    # a write that happened during the query already bumped the version
+    if size and key[0] == _cache.version:
+        _cache.put(key, value, size)
+
+
+def invalidate() -> None:
+    """Drop cached results; call after any write to practic2."""
+    _cache.invalidate()
+
+
+def stats() -> Dict[str, int]:
+    return _cache.stats()
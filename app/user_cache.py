@@ -0,0 +1,93 @@
+"""Per-process cache for the Flask-Login user_loader.
+
+Every authenticated request used to load the full User row. Pages only
+need id, username and role, so those are cached as a SessionUser for
+USER_CACHE_TTL seconds (default 60) in an LRU of USER_CACHE_SIZE entries
+(default 1024; 0 disables the cache). Code that needs the real row (e.g.
+the password hash in change_password) loads User itself.
+
+ORM updates and deletes of a User drop its entry (mapper events below),
+which covers password and role changes made through the app. Other worker
+processes keep their entry until the TTL runs out.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event
+
+DEFAULT_TTL = 60
+DEFAULT_SIZE = 1024
+
+
+class SessionUser(UserMixin):
+    """The fields of User that requests use, detached from any session."""
+
+    def __init__(self, id: int, username: str, role: Optional[str]):
+        self.id = id
+        self.username = username
+        self.role = role
+
+    def __repr__(self):
+        return f'<SessionUser {self.username}>'
+
+
+_lock = threading.Lock()
+_entries: 'OrderedDict[int, tuple]' = OrderedDict()
+
+
+def load_user(user_id) -> Optional[SessionUser]:
+    """user_loader for Flask-Login: cached SessionUser or None."""
+    from .models.user import User
+
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    ttl = current_app.config.get('USER_CACHE_TTL', DEFAULT_TTL)
+    size = current_app.config.get('USER_CACHE_SIZE', DEFAULT_SIZE)
+    if size:
+        with _lock:
+            entry = _entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[0] < ttl:
+                _entries.move_to_end(user_id)
+                return entry[1]
+
+    db = current_app.extensions['sqlalchemy']
+    row = db.session.execute(
+        db.select(User.id, User.username, User.role).where(User.id == user_id)).one_or_none()
+    if row is None:
+        return None
+    user = SessionUser(row.id, row.username, row.role)
+    if size:
+        with _lock:
+            _entries[user_id] = (time.monotonic(), user)
+            _entries.move_to_end(user_id)
+            while len(_entries) > size:
+                _entries.popitem(last=False)
+    return user
+
+
+def invalidate(user_id) -> None:
+    with _lock:
+        _entries.pop(int(user_id), None)
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def _on_user_change(mapper, connection, target):
+    if target.id is not None:
+        invalidate(target.id)
+
+
+def register_events(user_model) -> None:
+    """Drop the cached entry whenever a User row is updated or deleted."""
+    for name in ('after_update', 'after_delete'):
+        if not event.contains(user_model, name, _on_user_change):
+            event.listen(user_model, name, _on_user_change)
@@ -0,0 +1,372 @@
+"""Timings of the people, orders, import and documents hot paths.
+
+Seeds practic2 / order2 / document in a local Postgres database at a given
+scale and times each hot path through the app (test client, so routing,
+queries and templates are all included). Results go to a JSON file; two
+files can be compared and slower cases are flagged as regressions.
+
+The database is given explicitly and is NOT the app's DATABASE_URL:
+--seed empties practic2, order2, order_client_link and document there.
+
+    python benchmarks/bench_hotpaths.py --database-url postgresql+psycopg2://localhost/yp_bench --scale 100k --seed
+    python benchmarks/bench_hotpaths.py --database-url ... --scale 100k --out after.json
+    python benchmarks/bench_hotpaths.py --compare before.json after.json --threshold 0.15
+
+Seeding creates practic2 and order2 (legacy layout) if they do not exist and
+applies the migrations, so an empty database is enough.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import text  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+ORDERS_PER_CLIENT = 3
+BENCH_USER = 'bench'
+BENCH_PASSWORD = 'bench'
+# marks rows written by the timed cases, removed again afterwards
+IMPORT_MARK = 'bench-import'
+ORDER_MARK = 'bench order'
+
+_CREATE_LEGACY_TABLES = '''
+CREATE TABLE IF NOT EXISTS practic2 (
+    id serial PRIMARY KEY, "ФИО" text, "Пол" text, "Адрес" text, "Возраст" integer,
+    "Дата_рождения" date, "Номер_телефона" text, "Почта" text, "Примечания" text
+);
+CREATE TABLE IF NOT EXISTS order2 (
+    "номер_заказа" bigint PRIMARY KEY, "клиент" text, "название" text, "цена" numeric,
+    "примечания" text, "статус_заказа" text
+);
+'''
+
+_SEED_CLIENTS = '''
+INSERT INTO practic2 ("ФИО", "Пол", "Адрес", "Возраст", "Дата_рождения", "Номер_телефона", "Почта", "Примечания", phone_digits)
+SELECT (ARRAY['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов',
+              'Михайлов', 'Новиков', 'Фёдоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов'])[1 + g % 16]
+       || ' ' || (ARRAY['Иван', 'Пётр', 'Сергей', 'Андрей', 'Алексей', 'Дмитрий', 'Олег', 'Павел',
+                        'Анна', 'Мария', 'Елена', 'Ольга', 'Наталья', 'Ирина', 'Татьяна', 'Юлия'])[1 + (g / 16) % 16]
+       || ' ' || g,
+       CASE WHEN (g / 16) % 16 < 8 THEN 'мужской' ELSE 'женский' END,
+       'г. Москва, ул. Тестовая, д. ' || (1 + g % 200),
+       18 + g % 60,
+       date '2005-01-01' - (g % 20000),
+       '+7 (9' || lpad((g % 100)::text, 2, '0') || ') ' || lpad(g::text, 7, '0'),
+       'client' || g || '@example.com',
+       '',
+       '79' || lpad((g % 100)::text, 2, '0') || lpad(g::text, 7, '0')
+FROM generate_series(1, :clients) AS g
+'''
+
+# the client key of an order is the phone in another format (8...), the
+# bare ten digits, or the FIO, like in the legacy data
+_SEED_ORDERS = '''
+INSERT INTO order2 ("номер_заказа", "клиент", "название", "цена", "примечания", "статус_заказа", phone_digits)
+SELECT g, k, 'Заказ ' || g, (100 + g % 9900)::numeric, '',
+       (ARRAY['Новый', 'В работе', 'Выполнен', 'Отменён'])[1 + g % 4],
+       regexp_replace(k, '\\D', '', 'g')
+FROM (
+    SELECT g, c, CASE g % 3
+        WHEN 0 THEN '89' || lpad((c % 100)::text, 2, '0') || lpad(c::text, 7, '0')
+        WHEN 1 THEN '9' || lpad((c % 100)::text, 2, '0') || lpad(c::text, 7, '0')
+        ELSE (ARRAY['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов',
+                    'Михайлов', 'Новиков', 'Фёдоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов'])[1 + c % 16]
+             || ' ' || (ARRAY['Иван', 'Пётр', 'Сергей', 'Андрей', 'Алексей', 'Дмитрий', 'Олег', 'Павел',
+                              'Анна', 'Мария', 'Елена', 'Ольга', 'Наталья', 'Ирина', 'Татьяна', 'Юлия'])[1 + (c / 16) % 16]
+             || ' ' || c
+        END AS k
+    FROM (SELECT g, (1 + (g::bigint * 7919) % :clients)::int AS c FROM generate_series(1, :orders) AS g) AS o
+) AS s
+'''
+
+_SEED_DOCUMENTS = '''
+INSERT INTO document (full_name, birth_date, phone, email, address, notes, created_at, owner_id)
+SELECT 'Документ ' || g, date '1990-01-01' + g % 10000, '+7900' || lpad(g::text, 7, '0'),
+       'doc' || g || '@example.com', '', '', now() - g * interval '1 minute',
+       CASE WHEN g % 4 = 0 THEN :owner ELSE :other END
+FROM generate_series(1, :documents) AS g
+'''
+
+
+def make_app(database_url):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        # time the queries, not the in-process caches
+        'PEOPLE_SEARCH_CACHE_SIZE': 0,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    })
+
+
+def _ensure_user(username, role):
+    from app.passwords import hash_password
+
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        user = User(username=username, role=role, password=hash_password(BENCH_PASSWORD))
+        db.session.add(user)
+        db.session.commit()
+    return user.id
+
+
+def seed(app, clients):
+    """Refill the tables with clients clients and matching orders and documents."""
+    from flask_migrate import upgrade
+
+    from app.routes import order_links
+    from app.routes.order_numbers import sync_sequence
+
+    orders = clients * ORDERS_PER_CLIENT
+    with app.app_context():
+        started = time.perf_counter()
+        db.create_all()
+        db.session.execute(text(_CREATE_LEGACY_TABLES))
+        db.session.commit()
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+
+        owner = _ensure_user(BENCH_USER, 'admin')
+        other = _ensure_user(BENCH_USER + '-other', 'user')
+        db.session.execute(text('TRUNCATE practic2, order2, order_client_link, document RESTART IDENTITY'))
+        db.session.execute(text(_SEED_CLIENTS), {'clients': clients})
+        db.session.execute(text(_SEED_ORDERS), {'clients': clients, 'orders': orders})
+        db.session.execute(text(_SEED_DOCUMENTS), {'documents': max(clients // 10, 1), 'owner': owner, 'other': other})
+        db.session.commit()
+        linked = order_links.link_orders(db, rebuild=True)
+        sync_sequence(db, 'номер_заказа')
+        db.session.commit()
+        with db.engine.connect() as conn:
+            conn.execution_options(isolation_level='AUTOCOMMIT').execute(
+                text('ANALYZE practic2; ANALYZE order2; ANALYZE order_client_link; ANALYZE document'))
+        print(f'seeded {clients} clients, {orders} orders ({linked} linked), '
+              f'{max(clients // 10, 1)} documents in {time.perf_counter() - started:.1f}s')
+
+
+def _summary(times):
+    ms = sorted(t * 1000 for t in times)
+    return {
+        'n': len(ms),
+        'min_ms': round(ms[0], 3),
+        'median_ms': round(statistics.median(ms), 3),
+        'p95_ms': round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        'mean_ms': round(statistics.fmean(ms), 3),
+    }
+
+
+def timed(fn, repeat, cleanup=None):
+    """Run fn(i) repeat times after one warm-up run; cleanup (untimed) after each run."""
+    times = []
+    for i in range(repeat + 1):
+        started = time.perf_counter()
+        fn(i)
+        elapsed = time.perf_counter() - started
+        if cleanup:
+            cleanup()
+        if i:
+            times.append(elapsed)
+    return _summary(times)
+
+
+def _import_file(fmt, rows, start):
+    headers = ['ФИО', 'Пол', 'Адрес', 'Возраст', 'Дата_рождения', 'Номер_телефона', 'Почта', 'Примечания']
+    data = [[f'Импорт Тест {start + i}', 'женский', 'г. Тверь', 30, '1995-05-05',
+             f'+7 (901) {start + i:07d}', f'{IMPORT_MARK}-{start + i}@example.com', '']
+            for i in range(rows)]
+    if fmt == 'csv':
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(headers)
+        writer.writerows(data)
+        return io.BytesIO(out.getvalue().encode('utf-8-sig'))
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(headers)
+    for row in data:
+        ws.append(row)
+    out = io.BytesIO()
+    wb.save(out)
+    out.seek(0)
+    return out
+
+
+def run_cases(app, repeat, import_rows, import_repeat):
+    client = app.test_client()
+    response = client.post('/login', data={'username': BENCH_USER, 'password': BENCH_PASSWORD})
+    assert response.status_code == 302, 'login failed, run with --seed first'
+
+    with app.app_context():
+        client_ids = db.session.execute(text(
+            'SELECT client_id FROM order_client_link TABLESAMPLE SYSTEM (10) LIMIT 200')).scalars().all() \
+            or db.session.execute(text('SELECT client_id FROM order_client_link LIMIT 200')).scalars().all()
+    rng = random.Random(42)
+
+    def get(url):
+        def fn(_i):
+            r = client.get(url() if callable(url) else url)
+            assert r.status_code == 200, (r.status_code, r.location)
+            r.get_data()  # drain streamed responses
+        return fn
+
+    def search(args):
+        from app.routes.people_search import search_people
+
+        def fn(_i):
+            with app.test_request_context():
+                search_people(db, args)
+        return fn
+
+    results = {}
+    searches = {
+        'none': {},
+        'fio': {'fio': 'Петров Анна'},
+        'fio_short': {'fio': 'Ив'},
+        'phone_prefix': {'phone': '+7 (950)'},
+        'phone_suffix': {'phone': '9500001234'},
+        'email': {'email': 'client1234'},
+        'gender': {'gender': 'ж'},
+        'age': {'age': '42'},
+        'combined': {'gender': 'м', 'age': '30', 'fio': 'Смирнов'},
+    }
+    for name, args in searches.items():
+        results[f'search_people[{name}]'] = timed(search(args), repeat)
+    results['GET /clients/'] = timed(get('/clients/'), repeat)
+    results['GET /clients/?fio'] = timed(get('/clients/?fio=Петров'), repeat)
+    results['view_orders'] = timed(get(lambda: f'/clients/{rng.choice(client_ids)}/orders'), repeat)
+
+    def create_order(_i):
+        r = client.post(f'/clients/{rng.choice(client_ids)}/orders/create',
+                        data={'название': ORDER_MARK, 'цена': '100', 'статус_заказа': 'Новый'})
+        assert r.status_code == 302, r.status_code
+    results['create_order'] = timed(create_order, repeat)
+
+    def drop_imported():
+        with app.app_context():
+            db.session.execute(text('DELETE FROM practic2 WHERE "Почта" LIKE :mark'), {'mark': IMPORT_MARK + '-%'})
+            db.session.commit()
+
+    for fmt in ('csv', 'xlsx'):
+        def import_file(i, fmt=fmt):
+            payload = _import_file(fmt, import_rows, i * import_rows)
+            r = client.post('/clients/import', data={'file': (payload, f'bench.{fmt}')},
+                            content_type='multipart/form-data')
+            assert r.status_code == 302, r.status_code
+        results[f'import_clients[{fmt}, {import_rows} rows]'] = timed(import_file, import_repeat, cleanup=drop_imported)
+
+    results['GET /documents/'] = timed(get('/documents/'), repeat)
+    results['GET /documents/?mine=1'] = timed(get('/documents/?mine=1'), repeat)
+
+    with app.app_context():
+        db.session.execute(text(
+            'DELETE FROM order_client_link WHERE order_key IN '
+            '(SELECT "номер_заказа"::text FROM order2 WHERE "название" = :mark)'), {'mark': ORDER_MARK})
+        db.session.execute(text('DELETE FROM order2 WHERE "название" = :mark'), {'mark': ORDER_MARK})
+        db.session.commit()
+    return results
+
+
+def _meta(app, scale):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    with app.app_context():
+        server = db.session.execute(text('SHOW server_version')).scalar()
+        counts = {t: db.session.execute(text(f'SELECT count(*) FROM {t}')).scalar()
+                  for t in ('practic2', 'order2', 'document')}
+    return {
+        'scale': scale,
+        'rows': counts,
+        'commit': commit,
+        'python': platform.python_version(),
+        'postgres': server,
+        'machine': platform.node(),
+        'cpus': os.cpu_count(),
+        'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+def compare(old_path, new_path, threshold, min_ms):
+    """Print median changes; returns the number of regressions."""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    if old['meta'].get('scale') != new['meta'].get('scale'):
+        print(f"warning: different scales ({old['meta'].get('scale')} vs {new['meta'].get('scale')})")
+    print(f'{"case":<42} {"old ms":>10} {"new ms":>10} {"change":>8}')
+    regressions = 0
+    for case, result in new['results'].items():
+        before = old['results'].get(case)
+        if before is None:
+            print(f'{case:<42} {"-":>10} {result["median_ms"]:>10.2f}')
+            continue
+        a, b = before['median_ms'], result['median_ms']
+        change = (b - a) / a if a else 0.0
+        flag = ''
+        if change > threshold and b - a > min_ms:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif change < -threshold and a - b > min_ms:
+            flag = '  faster'
+        print(f'{case:<42} {a:>10.2f} {b:>10.2f} {change:>+8.1%}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.environ.get('BENCH_DATABASE_URL'),
+                        help='benchmark database (default: BENCH_DATABASE_URL)')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='10k', help='number of clients')
+    parser.add_argument('--seed', action='store_true', help='(re)fill the tables before timing')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per case')
+    parser.add_argument('--import-rows', type=int, default=1000, help='rows per imported file')
+    parser.add_argument('--import-repeat', type=int, default=5, help='timed runs per import case')
+    parser.add_argument('--out', help='results file (default: benchmarks/results/<scale>-<time>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two results files')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative slowdown flagged by --compare')
+    parser.add_argument('--min-ms', type=float, default=0.5, help='ignore changes smaller than this')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold, args.min_ms) else 0)
+    if not args.database_url:
+        parser.error('--database-url or BENCH_DATABASE_URL is required')
+
+    app = make_app(args.database_url)
+    if args.seed:
+        seed(app, SCALES[args.scale])
+    results = run_cases(app, args.repeat, args.import_rows, args.import_repeat)
+    report = {'meta': _meta(app, args.scale), 'results': results}
+
+    out = args.out or os.path.join(
+        ROOT, 'benchmarks', 'results', f'{args.scale}-{datetime.now():%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f'{"case":<42} {"median ms":>10} {"p95 ms":>10}')
+    for case, r in results.items():
+        print(f'{case:<42} {r["median_ms"]:>10.2f} {r["p95_ms"]:>10.2f}')
+    print(f'results written to {out}')
+
+
+if __name__ == '__main__':
+    main()
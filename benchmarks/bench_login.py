@@ -0,0 +1,76 @@
+"""Login throughput for password hash settings.
+
+Runs POST /login against an in-memory SQLite app (no Postgres needed) with
+several concurrent clients and reports logins per second, overall and per
+CPU core, for each hash method. Use it to pick PASSWORD_HASH_METHOD for
+the hardware the app runs on.
+
+    python benchmarks/bench_login.py
+    python benchmarks/bench_login.py --methods scrypt pbkdf2:sha256:600000 --clients 8 --seconds 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+DEFAULT_METHODS = ['scrypt', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:200000']
+
+
+def bench(method, clients, seconds):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'TESTING': True,
+        'PASSWORD_HASH_METHOD': method,
+    })
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='bench', role='user', password=generate_password_hash('secret', method=method)))
+        db.session.commit()
+
+    done = []
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        client = app.test_client()
+        count = 0
+        while time.perf_counter() < deadline:
+            response = client.post('/login', data={'username': 'bench', 'password': 'secret'})
+            assert response.status_code == 302, response.status_code
+            count += 1
+        done.append(count)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return sum(done) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS)
+    parser.add_argument('--clients', type=int, default=4, help='concurrent login clients')
+    parser.add_argument('--seconds', type=float, default=3.0, help='duration per method')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    print(f'{cores} CPU core(s), {args.clients} clients, {args.seconds:.0f}s per method')
+    print(f'{"method":<26} {"logins/s":>10} {"per core":>10}')
+    for method in args.methods:
+        rate = bench(method, args.clients, args.seconds)
+        print(f'{method:<26} {rate:>10.1f} {rate / cores:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
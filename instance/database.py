@@ -1,18 +1,21 @@
 # instance/database.py
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+# Своего engine здесь нет: create_app() привязывает SessionLocal к engine
+# Flask-SQLAlchemy (bind_engine), чтобы в процессе был один пул соединений.
+engine = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+Base = declarative_base()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+def bind_engine(app_engine):
+    global engine
+    engine = app_engine
+    SessionLocal.configure(bind=app_engine)
+
 
 # Это нужно, чтобы Alembic видел все модели
 def get_db_url():
-    return DATABASE_URL
\ No newline at end of file
+    return os.getenv("DATABASE_URL")
@@ -0,0 +1,38 @@
+"""practic2 keyset pagination index
+
+Revision ID: 2febaa585642
+Revises:
+Create Date: 2026-10-18 17:22:13.735071
+
+Индекс под keyset-пагинацию списка клиентов: search_people сортирует по
+(COALESCE("ФИО", ''), id) и продолжает выборку с курсора, поэтому выражение
+в индексе должно совпадать с выражением в ORDER BY.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2febaa585642'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # CONCURRENTLY нельзя выполнять внутри транзакции, а блокировать запись
+    # в practic2 на время построения индекса не хочется.
+    with op.get_context().autocommit_block():
+        op.execute('''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_practic2_fio_id
+            ON practic2 ((COALESCE("ФИО", '')), id)
+        ''')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_practic2_fio_id')
@@ -0,0 +1,35 @@
+"""document list indexes
+
+Revision ID: 3b8e6f0d2a71
+Revises: c41d0e7a9b15
+Create Date: 2026-10-18 17:42:07.282397
+
+Индексы для списка документов (/documents/): сортировка по created_at и
+фильтр «только мои» (owner_id, created_at) — страница читается по индексу
+с LIMIT, без сортировки всей таблицы.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8e6f0d2a71'
+down_revision = 'c41d0e7a9b15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_created_at ON document (created_at)')
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_owner_created ON document (owner_id, created_at)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_document_owner_created')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_document_created_at')
@@ -0,0 +1,52 @@
+"""phone digits columns
+
+Revision ID: 5507b5960bdf
+Revises: 7a6a14ae9b93
+Create Date: 2026-10-18 17:24:27.011107
+
+Колонка phone_digits (только цифры номера) в practic2 и order2. Приложение
+заполняет её при записи, старые строки заполняет `flask clients
+backfill-phones`. Индексы text_pattern_ops обслуживают точное совпадение и
+поиск по началу номера, индекс по reverse(phone_digits) — поиск по концу
+номера (когда у клиента и в заказе разные коды страны: 8… / 7… / без кода).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5507b5960bdf'
+down_revision = '7a6a14ae9b93'
+branch_labels = None
+depends_on = None
+
+TABLES = ('practic2', 'order2')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        # nullable, без DEFAULT: добавление колонки не переписывает таблицу
+        op.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS phone_digits text')
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.execute(f'''
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_phone_digits
+                ON {table} (phone_digits text_pattern_ops)
+            ''')
+            op.execute(f'''
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_phone_digits_rev
+                ON {table} (reverse(phone_digits) text_pattern_ops)
+            ''')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_phone_digits_rev')
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_phone_digits')
+    for table in TABLES:
+        op.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS phone_digits')
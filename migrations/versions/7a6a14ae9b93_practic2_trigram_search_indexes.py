@@ -0,0 +1,51 @@
+"""practic2 trigram search indexes
+
+Revision ID: 7a6a14ae9b93
+Revises: 2febaa585642
+Create Date: 2026-10-18 17:23:26.661981
+
+GIN-индексы pg_trgm для подстрочного поиска по "ФИО" и "Почта": с ними
+ILIKE '%...%' в search_people идёт по индексу, а не сканирует practic2.
+Если расширение pg_trgm поставить нельзя (нет прав), миграция индексы не
+создаёт, а search_people продолжает работать в режиме обычного ILIKE.
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a6a14ae9b93'
+down_revision = '2febaa585642'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.env')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        try:
+            op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except sa.exc.DBAPIError:
+            logger.warning('pg_trgm is not available; trigram indexes on practic2 are skipped')
+            return
+        op.execute('''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_practic2_fio_trgm
+            ON practic2 USING gin ("ФИО" gin_trgm_ops)
+        ''')
+        op.execute('''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_practic2_email_trgm
+            ON practic2 USING gin ("Почта" gin_trgm_ops)
+        ''')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_practic2_email_trgm')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_practic2_fio_trgm')
@@ -0,0 +1,57 @@
+"""order client link table
+
+Revision ID: 879376a79278
+Revises: 5507b5960bdf
+Create Date: 2026-10-18 17:26:13.309389
+
+Таблица order_client_link: заказ из order2 (значение его первичного ключа
+как текст) → клиент practic2.id и способ сопоставления. Заполняется
+`flask orders build-links` и поддерживается маршрутами при записи; страницы
+заказов и sql/v_orders.sql читают её обычным равенством по индексу вместо
+OR-сопоставления по телефону/ФИО.
+
+Дополнительно индексируется колонка клиента в order2 (определяется по имени,
+как в приложении) — по ней идёт сопоставление по ФИО.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '879376a79278'
+down_revision = '5507b5960bdf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('''
+        CREATE TABLE IF NOT EXISTS order_client_link (
+            order_key text PRIMARY KEY,
+            client_id integer NOT NULL REFERENCES practic2 (id) ON DELETE CASCADE,
+            matched_by text NOT NULL,
+            linked_at timestamptz NOT NULL DEFAULT now()
+        )
+    ''')
+    op.execute('CREATE INDEX IF NOT EXISTS ix_order_client_link_client ON order_client_link (client_id)')
+
+    client_col = op.get_bind().execute(sa.text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = 'order2' AND (column_name ILIKE '%клиент%' OR column_name ILIKE '%client%')
+        ORDER BY ordinal_position LIMIT 1
+    """)).scalar()
+    with op.get_context().autocommit_block():
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_practic2_fio ON practic2 ("ФИО")')
+        if client_col:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_order2_client ON order2 ("{client_col}")')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_order2_client')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_practic2_fio')
+    op.execute('DROP TABLE IF EXISTS order_client_link')
@@ -0,0 +1,65 @@
+"""table version counters
+
+Revision ID: 9d2c5a1e7f40
+Revises: 3b8e6f0d2a71
+Create Date: 2026-10-18 17:46:26.153982
+
+Счётчики изменений таблиц для ETag/Last-Modified (app/routes/conditional.py):
+table_versions(table_name, version, changed_at) и statement-level триггеры
+на practic2, order2 и order_client_link, которые увеличивают version.
+
+Счётчик — строка таблицы, а не sequence: новое значение становится видно
+только вместе с закоммиченными данными, поэтому страница с новым ETag
+никогда не содержит старых данных. Цена — пишущие транзакции одной таблицы
+коротко ждут друг друга на этой строке до коммита.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2c5a1e7f40'
+down_revision = '3b8e6f0d2a71'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('practic2', 'order2', 'order_client_link')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name text PRIMARY KEY,
+            version bigint NOT NULL DEFAULT 1,
+            changed_at timestamptz NOT NULL DEFAULT now()
+        )
+    ''')
+    op.execute('''
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE table_versions SET version = version + 1, changed_at = now()
+            WHERE table_name = TG_TABLE_NAME;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    for table in TABLES:
+        op.execute(f"INSERT INTO table_versions (table_name) VALUES ('{table}') ON CONFLICT DO NOTHING")
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_bump_version ON {table}')
+        op.execute(f'''
+            CREATE TRIGGER {table}_bump_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+        ''')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_bump_version ON {table}')
+    op.execute('DROP FUNCTION IF EXISTS bump_table_version()')
+    op.execute('DROP TABLE IF EXISTS table_versions')
@@ -0,0 +1,41 @@
+"""document created_at not null
+
+Revision ID: a8f3d6e1c2b7
+Revises: e5a7c2b9d4f1
+Create Date: 2026-10-18 20:05:13.640218
+
+Список документов (/documents/) листается по ключу (created_at, id), а
+курсор страницы хранит created_at. Строки с NULL в created_at из такой
+выборки выпадали (сравнение с NULL не истинно), а курсор на них не
+строился. Пустые значения заполняются самой ранней датой таблицы (такие
+документы оказываются в конце списка, между собой — по id), дальше
+колонка NOT NULL с DEFAULT now().
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8f3d6e1c2b7'
+down_revision = 'e5a7c2b9d4f1'
+branch_labels = None
+depends_on = None
+
+
+document = sa.table('document', sa.column('created_at', sa.DateTime))
+
+
+def upgrade():
+    earliest = sa.select(sa.func.min(document.c.created_at)).scalar_subquery()
+    op.execute(document.update()
+               .where(document.c.created_at.is_(None))
+               .values(created_at=sa.func.coalesce(earliest, sa.func.now())))
+    with op.batch_alter_table('document') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False,
+                              server_default=sa.func.now())
+
+
+def downgrade():
+    with op.batch_alter_table('document') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True,
+                              server_default=None)
@@ -0,0 +1,46 @@
+"""table versions monotonic changed_at
+
+Revision ID: b2d7e4f9a613
+Revises: a8f3d6e1c2b7
+Create Date: 2026-10-18 21:02:48.117530
+
+bump_table_version() ставил changed_at = now(), то есть время начала
+транзакции. С e5a7c2b9d4f1 счётчик увеличивается при коммите, и длинная
+транзакция (импорт), закоммиченная после короткой, сдвигала changed_at —
+а с ним Last-Modified — назад, и If-Modified-Since отвечал 304 на
+изменённые данные. Теперь берётся время вызова триггера (clock_timestamp()),
+и changed_at никогда не уменьшается.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d7e4f9a613'
+down_revision = 'a8f3d6e1c2b7'
+branch_labels = None
+depends_on = None
+
+
+def _bump_function(changed_at):
+    op.execute(f'''
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE table_versions SET version = version + 1, changed_at = {changed_at}
+            WHERE table_name = TG_TABLE_NAME;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    _bump_function('GREATEST(changed_at, clock_timestamp())')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    _bump_function('now()')
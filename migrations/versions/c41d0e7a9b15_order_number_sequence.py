@@ -0,0 +1,56 @@
+"""order number sequence
+
+Revision ID: c41d0e7a9b15
+Revises: 879376a79278
+Create Date: 2026-10-18 17:37:33.587280
+
+Последовательность order2_number_seq для номеров новых заказов вместо
+MAX()+1 по всей order2 (см. app/routes/order_numbers.py). Колонка номера
+определяется так же, как в приложении: NOT NULL без default с «номер» и
+«заказ» в имени, иначе первичный ключ. Последовательность сразу ставится
+после максимального номера; повторно — `flask orders sync-seq`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d0e7a9b15'
+down_revision = '879376a79278'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    bind = op.get_bind()
+    op.execute('CREATE SEQUENCE IF NOT EXISTS order2_number_seq')
+    id_column = bind.execute(sa.text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = 'order2' AND is_nullable = 'NO' AND column_default IS NULL
+          AND column_name ILIKE '%номер%' AND column_name ILIKE '%заказ%'
+        ORDER BY ordinal_position LIMIT 1
+    """)).scalar()
+    if not id_column:
+        id_column = bind.execute(sa.text("""
+            SELECT kcu.column_name
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage kcu
+              ON tc.constraint_name = kcu.constraint_name AND tc.table_name = kcu.table_name
+            WHERE tc.table_name = 'order2' AND tc.constraint_type = 'PRIMARY KEY'
+            ORDER BY kcu.ordinal_position LIMIT 1
+        """)).scalar()
+    if id_column:
+        op.execute(f'''
+            SELECT setval('order2_number_seq',
+                COALESCE(MAX(NULLIF(regexp_replace(COALESCE("{id_column}"::text, ''), '\\D', '', 'g'), '')::bigint), 0) + 1,
+                false)
+            FROM order2
+        ''')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP SEQUENCE IF EXISTS order2_number_seq')
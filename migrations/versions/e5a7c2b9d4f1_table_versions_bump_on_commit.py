@@ -0,0 +1,72 @@
+"""table versions bumped on commit
+
+Revision ID: e5a7c2b9d4f1
+Revises: 9d2c5a1e7f40
+Create Date: 2026-10-18 19:20:41.508317
+
+Statement-level триггеры из 9d2c5a1e7f40 обновляли строку table_versions
+сразу, и блокировка этой строки держалась до коммита: все пишущие
+транзакции таблицы (включая импорт целого файла в одной транзакции) шли
+по очереди.
+
+Теперь счётчик увеличивается при коммите: отложенный (DEFERRABLE
+INITIALLY DEFERRED) constraint-триггер, который ставится в очередь один
+раз на таблицу за транзакцию — WHEN table_version_mark() отмечает таблицу
+в локальной для транзакции настройке yp.table_changed.<таблица>.
+Блокировка строки держится только на время самого коммита, а новое
+значение по-прежнему становится видно вместе с данными. TRUNCATE
+(только statement-level) обновляет счётчик сразу, как раньше.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c2b9d4f1'
+down_revision = '9d2c5a1e7f40'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('practic2', 'order2', 'order_client_link')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # true once per table and transaction; undone with a rolled back savepoint
+    op.execute('''
+        CREATE OR REPLACE FUNCTION table_version_mark(name text) RETURNS boolean AS $$
+            SELECT CASE WHEN current_setting('yp.table_changed.' || name, true) = '1' THEN false
+                        ELSE set_config('yp.table_changed.' || name, '1', true) = '1' END
+        $$ LANGUAGE sql VOLATILE
+    ''')
+    for table in TABLES:
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_bump_version ON {table}')
+        op.execute(f'''
+            CREATE CONSTRAINT TRIGGER {table}_bump_version
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW WHEN (table_version_mark('{table}'))
+            EXECUTE FUNCTION bump_table_version()
+        ''')
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_bump_version_truncate ON {table}')
+        op.execute(f'''
+            CREATE TRIGGER {table}_bump_version_truncate
+            AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+        ''')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_bump_version_truncate ON {table}')
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_bump_version ON {table}')
+        op.execute(f'''
+            CREATE TRIGGER {table}_bump_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+        ''')
+    op.execute('DROP FUNCTION IF EXISTS table_version_mark(text)')
@@ -0,0 +1,156 @@
+"""Aggregate .prof files: top-N functions and a DOT call graph.
+
+Reads pstats files (from the profiling middleware, see app/profiling.py, or
+any cProfile dump), adds them up and prints the hottest functions. With
+--dot it also writes a Graphviz call graph; --svg renders it if Graphviz
+`dot` is on PATH. Pure Python, works the same on Linux, macOS and Windows.
+
+    python scripts/prof_report.py instance/profiles
+    python scripts/prof_report.py instance/profiles --endpoint people.get_people --top 40 --sort tottime
+    python scripts/prof_report.py instance/profiles/people.view_orders --dot orders.dot --svg orders.svg
+"""
+import argparse
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SORT_KEYS = {'cumulative': 3, 'tottime': 2, 'ncalls': 1}
+
+Func = Tuple[str, int, str]  # (file, line, function name), as in pstats
+
+
+def find_profiles(paths: Iterable[str], endpoint: Optional[str] = None) -> List[str]:
+    """All .prof files under paths; with endpoint, only those in a directory of that name."""
+    found = []
+    for path in paths:
+        if os.path.isfile(path):
+            found.append(path)
+            continue
+        for root, _dirs, files in os.walk(path):
+            if endpoint and os.path.basename(root) != endpoint:
+                continue
+            found.extend(os.path.join(root, f) for f in files if f.endswith('.prof'))
+    return sorted(found)
+
+
+def load_stats(files: List[str]) -> pstats.Stats:
+    stats = pstats.Stats(files[0])
+    for f in files[1:]:
+        stats.add(f)
+    return stats
+
+
+def short_name(func: Func) -> str:
+    filename, line, name = func
+    if filename == '~':
+        return name  # built-in, e.g. <method 'execute' of 'psycopg2...'>
+    parts = filename.replace('\\', '/').split('/')
+    for marker in ('site-packages', 'app', 'instance'):
+        if marker in parts:
+            parts = parts[parts.index(marker) + (marker == 'site-packages'):]
+            break
+    else:
+        parts = parts[-2:]
+    return f'{"/".join(parts)}:{line}({name})'
+
+
+def top_functions(stats: pstats.Stats, n: int, sort: str = 'cumulative') -> List[Tuple[Func, tuple]]:
+    key = SORT_KEYS[sort]
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][key], reverse=True)
+    return rows[:n]
+
+
+def print_top(stats: pstats.Stats, n: int, sort: str, out=sys.stdout) -> None:
+    total = stats.total_tt or 1e-9
+    print(f'{"ncalls":>10} {"tottime":>9} {"cumtime":>9} {"cum%":>6}  function', file=out)
+    for func, (cc, nc, tt, ct, _callers) in top_functions(stats, n, sort):
+        calls = f'{nc}/{cc}' if nc != cc else str(nc)
+        print(f'{calls:>10} {tt:>9.4f} {ct:>9.4f} {ct / total:>6.1%}  {short_name(func)}', file=out)
+
+
+def _color(fraction: float) -> str:
+    """Blue (cold) to red (hot), like gprof2dot."""
+    fraction = max(0.0, min(1.0, fraction)) ** 0.5
+    red = int(255 * fraction)
+    blue = int(255 * (1 - fraction))
+    return f'#{red:02x}40{blue:02x}'
+
+
+def to_dot(stats: pstats.Stats, node_threshold: float = 0.5, edge_threshold: float = 0.1) -> str:
+    """Call graph of functions with at least node_threshold % of the total time.
+
+    Edges carry the time spent in the callee when called from the caller.
+    """
+    total = stats.total_tt or 1e-9
+    nodes: Dict[Func, int] = {}
+    for func, (_cc, _nc, _tt, ct, _callers) in stats.stats.items():
+        if ct / total * 100 >= node_threshold:
+            nodes[func] = len(nodes)
+
+    lines = [
+        'digraph profile {',
+        '  graph [ranksep=0.25, fontname="Arial"];',
+        '  node [shape=box, style=filled, fontcolor=white, fontname="Arial", fontsize=10];',
+        '  edge [fontname="Arial", fontsize=9];',
+    ]
+    for func, idx in nodes.items():
+        cc, nc, tt, ct, _callers = stats.stats[func]
+        label = f'{short_name(func)}\\n{ct / total:.1%} ({tt / total:.1%} self)\\n{nc}×'
+        label = label.replace('"', '\\"')
+        lines.append(f'  n{idx} [label="{label}", fillcolor="{_color(ct / total)}"];')
+    for callee, idx in nodes.items():
+        callers = stats.stats[callee][4]
+        for caller, value in callers.items():
+            if caller not in nodes:
+                continue
+            # (cc, nc, tt, ct) per caller; older dumps store only a call count
+            ct = value[3] if isinstance(value, tuple) else 0.0
+            calls = value[1] if isinstance(value, tuple) else value
+            if ct / total * 100 < edge_threshold:
+                continue
+            width = 1 + 4 * ct / total
+            lines.append(f'  n{nodes[caller]} -> n{idx} [label="{ct / total:.1%}\\n{calls}×", '
+                         f'penwidth={width:.2f}, color="{_color(ct / total)}"];')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help='.prof files or directories with them')
+    parser.add_argument('--endpoint', help='only profiles of this endpoint (directory name)')
+    parser.add_argument('--top', type=int, default=25, help='number of functions to print')
+    parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='cumulative')
+    parser.add_argument('--dot', help='write the call graph to this DOT file')
+    parser.add_argument('--svg', help='render the call graph with Graphviz (implies --dot)')
+    parser.add_argument('--node-threshold', type=float, default=0.5, help='hide functions under this %% of time')
+    parser.add_argument('--edge-threshold', type=float, default=0.1, help='hide calls under this %% of time')
+    args = parser.parse_args(argv)
+
+    files = find_profiles(args.paths, args.endpoint)
+    if not files:
+        parser.error('no .prof files found')
+    stats = load_stats(files)
+    print(f'{len(files)} profile(s), {stats.total_tt:.3f}s total')
+    print_top(stats, args.top, args.sort)
+
+    dot_path = args.dot or (os.path.splitext(args.svg)[0] + '.dot' if args.svg else None)
+    if dot_path:
+        with open(dot_path, 'w', encoding='utf-8') as f:
+            f.write(to_dot(stats, args.node_threshold, args.edge_threshold))
+        print(f'call graph written to {dot_path}')
+    if args.svg:
+        dot = shutil.which('dot')
+        if not dot:
+            print(f'Graphviz "dot" not found; render with: dot -Tsvg {dot_path} -o {args.svg}', file=sys.stderr)
+            return 1
+        subprocess.run([dot, '-Tsvg', dot_path, '-o', args.svg], check=True)
+        print(f'SVG written to {args.svg}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
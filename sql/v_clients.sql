@@ -5,8 +5,8 @@
 SELECT
   COALESCE(NULLIF("ID",''), NULL) AS id,
   COALESCE(NULLIF("ФИО",''), '')::text AS fio,
-  -- digits-only phone
-  regexp_replace(COALESCE(NULLIF("Номер_телефона",''),''), '\\D', '', 'g') AS phone_digits,
+  -- digits-only phone (maintained by the app, see `flask clients backfill-phones`)
+  COALESCE(phone_digits, '')::text AS phone_digits,
   COALESCE(NULLIF("Почта",''), '')::text AS email,
   COALESCE(NULLIF("Пол",''), '')::text AS gender,
   -- keep raw dob as text to avoid parse errors; compute age only when value looks like YYYY-MM-DD
@@ -1,22 +1,96 @@
 import pytest
 import os
-from app import create_app, db
+from app import create_app, db, user_cache
 from app.models.user import User
 from werkzeug.security import generate_password_hash
 
 
 @pytest.fixture(scope='session')
 def app():
-    app = create_app()
     # Use in-memory SQLite for tests
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-    app.config['TESTING'] = True
-    app.config['WTF_CSRF_ENABLED'] = False
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+    })
+    return app
+
+
+# legacy tables that are not in db.metadata, as in benchmarks/bench_hotpaths.py
+_CREATE_LEGACY_TABLES = '''
+CREATE TABLE practic2 (
+    id serial PRIMARY KEY, "ФИО" text, "Пол" text, "Адрес" text, "Возраст" integer,
+    "Дата_рождения" date, "Номер_телефона" text, "Почта" text, "Примечания" text
+);
+CREATE TABLE order2 (
+    "номер_заказа" bigint PRIMARY KEY, "клиент" text, "название" text, "цена" numeric,
+    "примечания" text, "статус_заказа" text
+);
+'''
+
+
+@pytest.fixture(scope='session')
+def pg_app():
+    """App on the Postgres database TEST_DATABASE_URL, migrated to head.
+
+    Postgres-only paths (order links, the order number sequence, phone
+    suffix search, migrations) are tested there; without the variable
+    those tests are skipped. The database is wiped: use a throwaway one.
+    """
+    url = os.getenv('TEST_DATABASE_URL', '')
+    if not url.startswith('postgresql'):
+        pytest.skip('TEST_DATABASE_URL (Postgres) is not set')
+    from flask_migrate import upgrade
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': url,
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+    })
+    with app.app_context():
+        db.session.execute(db.text('DROP SCHEMA public CASCADE; CREATE SCHEMA public'))
+        db.session.execute(db.text(_CREATE_LEGACY_TABLES))
+        db.session.commit()
+        db.create_all()
+        upgrade(directory=os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+    # alembic's fileConfig() disables the loggers that already exist
+    app.logger.disabled = False
     return app
 
 
+@pytest.fixture
+def pg(pg_app):
+    """db inside an app context on the migrated Postgres database, emptied after the test."""
+    from app.routes import search_cache
+    from app.routes.order_schema import refresh_order_schema
+    with pg_app.app_context():
+        refresh_order_schema()
+        yield db
+        db.session.rollback()
+        db.session.execute(db.text(
+            'TRUNCATE practic2, order2, order_client_link, document, "user" RESTART IDENTITY CASCADE'))
+        db.session.commit()
+        db.session.remove()
+        refresh_order_schema()
+        search_cache.invalidate()
+
+
+@pytest.fixture
+def pg_client(pg, pg_app):
+    """Test client of pg_app, logged in as testuser."""
+    user_cache.clear()
+    user = User(username='testuser', role='user')
+    user.password = generate_password_hash('testpass123')
+    db.session.add(user)
+    db.session.commit()
+    client = pg_app.test_client()
+    client.post('/login', data={'username': 'testuser', 'password': 'testpass123'})
+    return client
+
+
 @pytest.fixture(scope='function')
 def client(app):
+    # ids are reused by the fresh database of every test
+    user_cache.clear()
     with app.app_context():
         db.create_all()
         yield app.test_client()
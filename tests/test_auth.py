@@ -86,3 +86,71 @@ class TestAuthRoutes:
         assert response.status_code == 200
         data_str = response.data.decode('utf-8', errors='ignore').lower()
         assert 'form' in data_str or 'password' in data_str
+
+
+class TestUserCache:
+
+    def _count_user_queries(self, engine, fn):
+        from sqlalchemy import event
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            result = fn()
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+        return result, len([s for s in statements if 'FROM user' in s or 'FROM "user"' in s])
+
+    def test_loader_caches_and_invalidates(self, client, auth_user):
+        from app import db, user_cache
+        from app.models.user import User
+        with client.application.app_context():
+            user_id = User.query.filter_by(username='testuser').one().id
+            user_cache.clear()
+            user, queries = self._count_user_queries(db.engine, lambda: user_cache.load_user(user_id))
+            assert (user.username, user.role, queries) == ('testuser', 'user', 1)
+            _, queries = self._count_user_queries(db.engine, lambda: user_cache.load_user(str(user_id)))
+            assert queries == 0
+
+            db.session.get(User, user_id).role = 'admin'
+            db.session.commit()
+            user, queries = self._count_user_queries(db.engine, lambda: user_cache.load_user(user_id))
+            assert (user.role, queries) == ('admin', 1)
+
+    def test_change_password_updates_hash(self, client, auth_user):
+        from werkzeug.security import check_password_hash
+        from app.models.user import User
+        client.post('/change-password', data={
+            'current_password': 'testpass123',
+            'new_password': 'newpass456',
+            'new_password2': 'newpass456',
+        })
+        with client.application.app_context():
+            assert check_password_hash(User.query.filter_by(username='testuser').one().password, 'newpass456')
+
+
+class TestPasswordRehash:
+
+    def test_login_rehashes_old_parameters(self, app, client, monkeypatch):
+        from werkzeug.security import check_password_hash, generate_password_hash
+        from app import db
+        from app.models.user import User
+        monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:2000')
+        with app.app_context():
+            db.session.add(User(username='old', role='user',
+                                password=generate_password_hash('pw', method='pbkdf2:sha256:1000')))
+            db.session.commit()
+
+        client.post('/login', data={'username': 'old', 'password': 'pw'})
+        with app.app_context():
+            stored = User.query.filter_by(username='old').one().password
+        assert stored.startswith('pbkdf2:sha256:2000$')
+        assert check_password_hash(stored, 'pw')
+
+    def test_needs_rehash(self, app, monkeypatch):
+        from werkzeug.security import generate_password_hash
+        from app.passwords import needs_rehash
+        monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'scrypt')
+        with app.app_context():
+            assert not needs_rehash(generate_password_hash('x'))
+            assert needs_rehash(generate_password_hash('x', method='pbkdf2:sha256:1000'))
@@ -0,0 +1,125 @@
+from werkzeug.security import check_password_hash
+
+from app.models.user import User
+
+
+class TestInitDb:
+
+    def test_creates_admin_once(self, client, runner):
+        result = runner.invoke(args=['init-db', '--admin-password', 'secret'])
+        assert result.exit_code == 0
+        assert 'admin' in result.output
+        with client.application.app_context():
+            admin = User.query.filter_by(username='admin').one()
+            assert admin.role == 'admin'
+            assert check_password_hash(admin.password, 'secret')
+
+        result = runner.invoke(args=['init-db'])
+        assert result.exit_code == 0
+        with client.application.app_context():
+            assert User.query.filter_by(username='admin').count() == 1
+
+
+class TestDedup:
+
+    def _keys(self, id, fio='', phone='', email='', birth=None):
+        from app.routes.people_dedup import ClientKeys
+        return ClientKeys(id, fio, phone, email, birth)
+
+    def test_is_duplicate(self):
+        from datetime import date
+        from app.routes.people_dedup import is_duplicate
+        a = self._keys(1, 'иванов иван', '9001234567', 'ivan@mail.ru', date(1990, 1, 2))
+        assert is_duplicate(a, self._keys(2, 'иванов иван', '9001234567'))
+        assert is_duplicate(a, self._keys(3, 'петров петр', '9001234567', 'ivan@mail.ru'))
+        # a common name alone, or a conflicting birth date, is not enough
+        assert not is_duplicate(a, self._keys(4, 'иванов иван'))
+        assert not is_duplicate(a, self._keys(5, 'иванов иван', '9001234567', birth=date(1991, 1, 2)))
+
+    def test_cluster_is_transitive(self):
+        from app.routes.people_dedup import cluster
+        rows = {
+            1: self._keys(1, 'a', '1111111111'),
+            2: self._keys(2, 'a', '1111111111', 'x@y'),
+            3: self._keys(3, 'b', '', 'x@y', None)._replace(fio='a'),
+            4: self._keys(4, 'a'),
+        }
+        blocks = [[1, 2, 3, 4], [1, 2], [2, 3]]
+        assert cluster(blocks, rows) == [[1, 2, 3]]
+
+    def test_union_find(self):
+        from app.routes.people_dedup import UnionFind
+        uf = UnionFind()
+        uf.union(5, 3)
+        uf.union(7, 9)
+        uf.union(9, 3)
+        uf.find(11)
+        assert uf.groups() == [[3, 5, 7, 9]]
+
+    def test_command_registered(self, runner):
+        result = runner.invoke(args=['clients', 'dedup', '--help'])
+        assert result.exit_code == 0
+        assert '--merge' in result.output
+
+    def test_cluster_keeps_birth_dates_apart(self):
+        from datetime import date
+        from app.routes.people_dedup import cluster
+        rows = {
+            1: self._keys(1, 'a', '1111111111', birth=date(1980, 5, 5)),
+            2: self._keys(2, 'a', '1111111111'),
+            3: self._keys(3, 'a', '1111111111', birth=date(1999, 1, 1)),
+        }
+        assert cluster([[1, 2, 3]], rows) == [[1, 2]]
+
+
+class TestMergeCluster:
+    """merge_cluster on Postgres (TEST_DATABASE_URL)."""
+
+    def _add_client(self, db, fio, phone=None, email=None):
+        return db.session.execute(db.text(
+            'INSERT INTO practic2 ("ФИО", "Номер_телефона", "Почта", phone_digits) '
+            'VALUES (:fio, :phone, :email, :digits) RETURNING id'),
+            {'fio': fio, 'phone': phone, 'email': email,
+             'digits': ''.join(c for c in phone or '' if c.isdigit())}).scalar()
+
+    def _orders(self, db):
+        return db.session.execute(db.text(
+            'SELECT o."номер_заказа", o."клиент", o.phone_digits, l.client_id, l.matched_by FROM order2 o '
+            'LEFT JOIN order_client_link l ON l.order_key = o."номер_заказа"::text ORDER BY 1')).fetchall()
+
+    def _ids(self, db):
+        return [r[0] for r in db.session.execute(db.text('SELECT id FROM practic2 ORDER BY id')).fetchall()]
+
+    def test_moves_orders_and_their_client_column(self, pg):
+        from app.routes.order_links import link_orders
+        from app.routes.people_dedup import merge_cluster
+        keep = self._add_client(pg, 'Иванов Иван', email='ivan@mail.ru')
+        dup = self._add_client(pg, 'Иванов Иван', '+7 900 111-22-33', 'ivan@mail.ru')
+        pg.session.execute(pg.text(
+            'INSERT INTO order2 ("номер_заказа", "клиент", phone_digits) VALUES (1, \'8 900 111 22 33\', \'89001112233\')'))
+        link_orders(pg)
+        pg.session.commit()
+
+        assert merge_cluster(pg, [keep, dup]) == 1
+        assert self._ids(pg) == [keep]
+        # the kept row took the phone of the duplicate, the order names it now
+        assert self._orders(pg) == [(1, '+7 900 111-22-33', '79001112233', keep, 'merged')]
+
+    def test_rows_changed_since_the_search_are_left_alone(self, pg):
+        from app.routes.people_dedup import merge_cluster
+        keep = self._add_client(pg, 'Иванов Иван', '79001112233')
+        dup = self._add_client(pg, 'Иванов Иван', '79001112233')
+        other = self._add_client(pg, 'Иванов Иван', '79001112233')
+        # edited after find_duplicates: only the FIO still agrees
+        pg.session.execute(pg.text(
+            'UPDATE practic2 SET "Номер_телефона" = \'79005556677\', phone_digits = \'79005556677\' WHERE id = :id'),
+            {'id': other})
+        pg.session.commit()
+        assert merge_cluster(pg, [keep, dup, other]) == 1
+        assert self._ids(pg) == [keep, other]
+        pg.session.execute(pg.text(
+            'UPDATE practic2 SET "Номер_телефона" = \'79008889900\', phone_digits = \'79008889900\' WHERE id = :id'),
+            {'id': keep})
+        pg.session.commit()
+        assert merge_cluster(pg, [keep, other]) is None
+        assert self._ids(pg) == [keep, other]
@@ -0,0 +1,25 @@
+from app.db_pool import TimedQueuePool, engine_options, load_pool_config
+
+
+class TestPoolConfig:
+
+    def test_env_defaults_and_explicit_values(self, monkeypatch):
+        monkeypatch.setenv('DB_POOL_SIZE', '12')
+        monkeypatch.setenv('DB_POOL_PRE_PING', 'off')
+        config = {'DB_MAX_OVERFLOW': 3}
+        load_pool_config(config)
+        assert config['DB_POOL_SIZE'] == 12
+        assert config['DB_POOL_PRE_PING'] is False
+        assert config['DB_MAX_OVERFLOW'] == 3
+
+    def test_engine_options_postgres(self):
+        config = {'SQLALCHEMY_DATABASE_URI': 'postgresql+psycopg2://u@h/db'}
+        load_pool_config(config)
+        options = engine_options(config)
+        assert options['poolclass'] is TimedQueuePool
+        assert options['pool_size'] == config['DB_POOL_SIZE']
+
+    def test_engine_options_sqlite_untouched(self):
+        config = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'}
+        load_pool_config(config)
+        assert engine_options(config) == {}
@@ -28,3 +28,78 @@ class TestDocumentRoutes:
         assert response.status_code == 200
         data_str = response.data.decode('utf-8', errors='ignore').lower()
         assert 'клиент' in data_str or 'client' in data_str or 'html' in data_str
+
+
+class TestDocumentsIndex:
+
+    def _user_id(self, client, username='testuser'):
+        from app.models.user import User
+        with client.application.app_context():
+            return User.query.filter_by(username=username).one().id
+
+    def _add_docs(self, client, owner_id, names):
+        from datetime import date, datetime, timedelta
+        from app import db
+        from app.models.document import Document
+        with client.application.app_context():
+            start = datetime(2025, 1, 1)
+            for i, name in enumerate(names):
+                db.session.add(Document(full_name=name, birth_date=date(1990, 1, 1), phone='1',
+                                        owner_id=owner_id, created_at=start + timedelta(days=i)))
+            db.session.commit()
+
+    def test_pages_newest_first(self, client, auth_user):
+        import re
+        self._add_docs(client, self._user_id(client), ['Doc A', 'Doc B', 'Doc C'])
+        html = client.get('/documents/?per_page=2').data.decode()
+        assert 'Doc C' in html and 'Doc B' in html and 'Doc A' not in html
+        next_url = re.search(r'href="([^"]*after=[^"]*)"', html).group(1).replace('&amp;', '&')
+        html = client.get(next_url).data.decode()
+        assert 'Doc A' in html and 'Doc B' not in html
+
+    def test_mine_filter(self, client, auth_user):
+        from app import db
+        from app.models.user import User
+        with client.application.app_context():
+            other = User(username='other', password='x', role='user')
+            db.session.add(other)
+            db.session.commit()
+            other_id = other.id
+        self._add_docs(client, self._user_id(client), ['My Doc'])
+        self._add_docs(client, other_id, ['Their Doc'])
+        html = client.get('/documents/?mine=1').data.decode()
+        assert 'My Doc' in html and 'Their Doc' not in html
+        html = client.get('/documents/').data.decode()
+        assert 'My Doc' in html and 'Their Doc' in html and 'other' in html
+
+    def test_constant_number_of_queries(self, client, auth_user):
+        from sqlalchemy import event
+        from app import db
+        self._add_docs(client, self._user_id(client), [f'Doc {i}' for i in range(20)])
+        statements = []
+        with client.application.app_context():
+            engine = db.engine
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            client.get('/documents/')
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+        # the logged-in user and one page of documents with owners joined
+        assert len(statements) <= 2, statements
+
+    def test_created_at_is_required(self, client, auth_user):
+        from sqlalchemy.exc import IntegrityError
+        from app import db
+        owner_id = self._user_id(client)
+        insert = ("INSERT INTO document (full_name, birth_date, phone, owner_id{}) "
+                  "VALUES (:name, '1990-01-01', '1', :owner{})")
+        with client.application.app_context():
+            # the page cursor is (created_at, id): a NULL would drop the row from the list
+            with pytest.raises(IntegrityError):
+                db.session.execute(db.text(insert.format(', created_at', ', NULL')),
+                                   {'name': 'No Date', 'owner': owner_id})
+            db.session.rollback()
+            db.session.execute(db.text(insert.format('', '')), {'name': 'Server Default', 'owner': owner_id})
+            db.session.commit()
+        assert 'Server Default' in client.get('/documents/').data.decode()
@@ -0,0 +1,62 @@
+import logging
+
+from app import metrics
+
+
+def _metrics(client):
+    client.application.config['METRICS_ENABLED'] = True
+    try:
+        return client.get('/metrics', buffered=True).get_data(as_text=True)
+    finally:
+        client.application.config['METRICS_ENABLED'] = False
+
+
+class TestMetrics:
+
+    def test_request_and_query_counters(self, client, auth_user):
+        metrics.clear()
+        client.get('/login', buffered=True)
+        client.post('/login', data={'username': 'testuser', 'password': 'testpass123'}, buffered=True)
+        text = _metrics(client)
+        assert 'http_requests_total{endpoint="auth.login",method="GET",status="200"} 1' in text
+        assert 'http_request_duration_seconds_count{endpoint="auth.login"} 2' in text
+        queries = next(line for line in text.splitlines() if line.startswith('db_queries_total{endpoint="auth.login"}'))
+        assert int(queries.split()[-1]) >= 1
+        assert 'db_pool_checkouts_total' in text
+        assert 'people_search_cache_hits_total' in text
+
+    def test_query_count_warning(self, app, client, auth_user, monkeypatch, caplog):
+        metrics.clear()
+        monkeypatch.setitem(app.config, 'SQL_QUERY_WARN_COUNT', 2)
+        with caplog.at_level(logging.WARNING):
+            # failed probes count too: the version table and the estimate do not exist in SQLite
+            client.get('/clients/', buffered=True)
+        assert any('likely N+1' in r.getMessage() for r in caplog.records)
+        assert 'db_query_count_warnings_total{endpoint="people.get_people"} 1' in _metrics(client)
+
+    def test_off_by_default(self, client):
+        assert client.get('/metrics').status_code == 404
+
+    def test_loopback_only_without_token(self, app, client, monkeypatch):
+        monkeypatch.setitem(app.config, 'METRICS_ENABLED', True)
+        assert client.get('/metrics').status_code == 200
+        remote = {'REMOTE_ADDR': '10.0.0.7'}
+        assert client.get('/metrics', environ_base=remote).status_code == 401
+        monkeypatch.setitem(app.config, 'METRICS_ALLOW_IPS', '10.0.0.7')
+        assert client.get('/metrics', environ_base=remote).status_code == 200
+
+    def test_token(self, app, client, monkeypatch):
+        monkeypatch.setitem(app.config, 'METRICS_ENABLED', True)
+        monkeypatch.setitem(app.config, 'METRICS_TOKEN', 's3cret')
+        assert client.get('/metrics').status_code == 401
+        response = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+
+    def test_sql_stats_keeps_slowest(self):
+        stats = metrics.SqlStats()
+        stats.add('SELECT 1', 0.002)
+        stats.add('SELECT 2', 0.005)
+        stats.add('SELECT 3', 0.001)
+        assert (stats.count, stats.slowest) == (3, 'SELECT 2')
+        assert abs(stats.seconds - 0.008) < 1e-9
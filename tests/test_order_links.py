@@ -0,0 +1,163 @@
+def _add_client(db, fio, phone=None):
+    from app.routes.people_search import _digits_only
+    return db.session.execute(db.text(
+        'INSERT INTO practic2 ("ФИО", "Номер_телефона", phone_digits) VALUES (:fio, :phone, :digits) RETURNING id'),
+        {'fio': fio, 'phone': phone, 'digits': _digits_only(phone or '')}).scalar()
+
+
+def _add_order(db, number, client):
+    from app.routes.people_search import _digits_only
+    db.session.execute(db.text(
+        'INSERT INTO order2 ("номер_заказа", "клиент", "название", phone_digits) VALUES (:n, :client, \'x\', :digits)'),
+        {'n': number, 'client': client, 'digits': _digits_only(client)})
+
+
+def _links(db):
+    return dict((key, (client_id, matched_by)) for key, client_id, matched_by in db.session.execute(db.text(
+        'SELECT order_key, client_id, matched_by FROM order_client_link')).fetchall())
+
+
+class TestLinkOrders:
+
+    def test_rules(self, pg):
+        from app.routes.order_links import link_orders
+        ivanov = _add_client(pg, 'Иванов Иван', '+7 900 111-22-33')
+        petrov = _add_client(pg, 'Петров Пётр', '8 (900) 222-33-44')
+        _add_order(pg, 1, '79001112233')
+        _add_order(pg, 2, '+7 900 222 33 44')
+        _add_order(pg, 3, 'Петров Пётр')
+        _add_order(pg, 4, 'Кто-то Другой')
+        assert link_orders(pg) == 3
+        assert _links(pg) == {'1': (ivanov, 'phone'), '2': (petrov, 'phone_suffix'), '3': (petrov, 'fio')}
+
+    def test_scoped_to_clients(self, pg):
+        from app.routes.order_links import link_orders
+        ivanov = _add_client(pg, 'Иванов Иван', '79001112233')
+        petrov = _add_client(pg, 'Петров Пётр', '79002223344')
+        sidorov = _add_client(pg, 'Сидоров Сидор', '79003334455')
+        for number, phone in ((1, '79001112233'), (2, '79002223344'), (3, '79003334455')):
+            _add_order(pg, number, phone)
+        assert link_orders(pg, client_ids=[]) == 0
+        assert link_orders(pg, client_id=ivanov) == 1
+        assert link_orders(pg, client_ids=[petrov, sidorov]) == 2
+        assert _links(pg) == {'1': (ivanov, 'phone'), '2': (petrov, 'phone'), '3': (sidorov, 'phone')}
+
+    def test_rebuild_keeps_created_and_merged(self, pg):
+        from app.routes.order_links import link_created_order, link_orders
+        ivanov = _add_client(pg, 'Иванов Иван', '79001112233')
+        petrov = _add_client(pg, 'Петров Пётр')
+        _add_order(pg, 1, '79001112233')
+        _add_order(pg, 2, '79001112233')
+        link_created_order(pg, 2, petrov)
+        assert link_orders(pg, rebuild=True) == 1
+        assert _links(pg) == {'1': (ivanov, 'phone'), '2': (petrov, 'created')}
+
+    def test_rebuild_scoped_to_client(self, pg):
+        from app.routes.order_links import link_created_order, link_orders
+        ivanov = _add_client(pg, 'Иванов Иван', '79001112233')
+        petrov = _add_client(pg, 'Петров Пётр', '79002223344')
+        _add_order(pg, 1, '79001112233')
+        _add_order(pg, 2, '79002223344')
+        _add_order(pg, 3, 'x')
+        link_orders(pg)
+        link_created_order(pg, 3, ivanov)
+        pg.session.execute(pg.text("UPDATE practic2 SET phone_digits = '79005556677'"))
+        assert link_orders(pg, client_id=ivanov, rebuild=True) == 0
+        assert _links(pg) == {'2': (petrov, 'phone'), '3': (ivanov, 'created')}
+
+    def test_move_links(self, pg):
+        from app.routes.order_links import link_created_order, link_orders, move_links
+        keep = _add_client(pg, 'Иванов Иван', '79001112233')
+        dup = _add_client(pg, 'Иванов И.', '79004445566')
+        _add_order(pg, 1, '79004445566')
+        _add_order(pg, 2, 'x')
+        link_orders(pg)
+        link_created_order(pg, 2, dup)
+        assert move_links(pg, [dup], keep) == 2
+        assert _links(pg) == {'1': (keep, 'merged'), '2': (keep, 'created')}
+        # merged links survive a rebuild instead of being matched back to nobody
+        link_orders(pg, rebuild=True)
+        assert _links(pg)['1'] == (keep, 'merged')
+
+    def test_links_go_with_the_client(self, pg):
+        from app.routes.order_links import link_orders
+        ivanov = _add_client(pg, 'Иванов Иван', '79001112233')
+        petrov = _add_client(pg, 'Петров Пётр', '79002223344')
+        _add_order(pg, 1, '79001112233')
+        _add_order(pg, 2, '79002223344')
+        link_orders(pg)
+        pg.session.execute(pg.text('DELETE FROM practic2 WHERE id = :id'), {'id': ivanov})
+        assert _links(pg) == {'2': (petrov, 'phone')}
+        assert pg.session.execute(pg.text('SELECT count(*) FROM order2')).scalar() == 2
+
+    def test_schema_failure_keeps_the_pending_write(self, pg, monkeypatch):
+        from app.routes import order_schema
+        from app.routes.order_links import link_orders, sync_links
+
+        def broken(db):
+            # aborts the Postgres transaction like a failed information_schema query
+            db.session.execute(db.text('SELECT * FROM no_such_table'))
+
+        ivanov = _add_client(pg, 'Иванов Иван', '79001112233')
+        monkeypatch.setattr(order_schema, '_load', broken)
+        order_schema.refresh_order_schema()
+        sync_links(pg, link_orders, client_id=ivanov)
+        pg.session.commit()
+        assert pg.session.execute(pg.text('SELECT id FROM practic2')).scalars().all() == [ivanov]
+
+
+class TestEditLinks:
+
+    def test_new_phone_moves_the_links(self, pg, pg_client):
+        ivanov = _add_client(pg, 'Иванов Иван', '79001112233')
+        _add_order(pg, 1, '79001112233')
+        _add_order(pg, 2, '79002223344')
+        pg.session.commit()
+        pg_client.post(f'/clients/{ivanov}/edit', data={'phone': '79001112233'})
+        assert _links(pg) == {'1': (ivanov, 'phone')}
+        pg_client.post(f'/clients/{ivanov}/edit', data={'phone': '+7 900 222-33-44'})
+        assert _links(pg) == {'2': (ivanov, 'phone')}
+
+
+class TestMatchWithoutLinks:
+
+    def test_fio_and_phone(self, pg):
+        from app.routes.people import _match_client_orders
+        _add_order(pg, 1, 'Иванов Иван')
+        _add_order(pg, 2, '8 900 111-22-33')
+        _add_order(pg, 3, None)
+        orders = _match_client_orders(pg, {'ФИО': 'Иванов Иван', 'Номер_телефона': '+7 900 111-22-33'})
+        assert [o['номер_заказа'] for o in orders] == [1, 2]
+        # a client without an FIO does not get the orders without a client
+        assert _match_client_orders(pg, {'ФИО': None}) == []
+
+
+class TestImportLinks:
+
+    def test_import_links_only_the_new_clients(self, pg):
+        from app.routes.people_import import run_import
+        old = _add_client(pg, 'Старый Клиент', '79001112233')
+        _add_order(pg, 1, '79001112233')
+        _add_order(pg, 2, '79002223344')
+        _add_order(pg, 3, '79003334455')
+        pg.session.commit()
+        rows = [{'fio': 'Новый Один', 'phone': '+7 900 222-33-44'},
+                {'fio': 'Новый Два', 'phone': '+7 900 333-44-55'},
+                {'fio': 'Новый Три'}]
+        result = run_import(pg, rows, chunk_size=2)
+        assert result.success == 3 and len(result.client_ids) == 3 and old not in result.client_ids
+        links = _links(pg)
+        # order 1 belongs to a client that was not imported: left to build-links
+        assert set(links) == {'2', '3'}
+        assert links['2'] == (result.client_ids[0], 'phone')
+        assert links['3'] == (result.client_ids[1], 'phone')
+
+    def test_import_without_links_table_still_imports(self, pg):
+        from app.routes.people_import import run_import
+        pg.session.execute(pg.text('ALTER TABLE order_client_link RENAME TO order_client_link_off'))
+        try:
+            result = run_import(pg, [{'fio': 'Новый Один', 'phone': '79002223344'}])
+            assert result.success == 1
+            assert pg.session.execute(pg.text('SELECT count(*) FROM practic2')).scalar() == 1
+        finally:
+            pg.session.rollback()
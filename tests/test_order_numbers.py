@@ -0,0 +1,95 @@
+from collections import deque
+
+import pytest
+from flask import current_app
+
+from app.routes import order_numbers
+
+ID_COLUMN = 'номер_заказа'
+
+
+@pytest.fixture
+def numbers(pg, monkeypatch):
+    """order_numbers with a fresh per-process state and the sequence right after order2."""
+    monkeypatch.setattr(order_numbers, '_block', deque())
+    monkeypatch.setattr(order_numbers, '_block_pid', None)
+    monkeypatch.setattr(order_numbers, '_missing_logged', False)
+    pg.session.execute(pg.text(f"SELECT setval('{order_numbers.SEQUENCE}', 1, false)"))
+    pg.session.commit()
+    return pg
+
+
+def _add_order(db, number):
+    db.session.execute(db.text('INSERT INTO order2 ("номер_заказа", "название") VALUES (:n, \'x\')'), {'n': number})
+
+
+def _nextval_calls(db, action):
+    from sqlalchemy import event
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        result = action()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return result, sum('nextval' in s for s in statements)
+
+
+class TestNextOrderNumber:
+
+    def test_one_number_per_call_by_default(self, numbers):
+        assert [order_numbers.next_order_number(numbers, ID_COLUMN) for _ in range(3)] == [1, 2, 3]
+
+    def test_block_reservation(self, numbers, monkeypatch):
+        monkeypatch.setitem(current_app.config, 'ORDER_ID_BLOCK_SIZE', 5)
+        got, calls = _nextval_calls(numbers, lambda: [
+            order_numbers.next_order_number(numbers, ID_COLUMN) for _ in range(7)])
+        assert got == [1, 2, 3, 4, 5, 6, 7]
+        assert calls == 2
+        # the rest of the second block is reserved: another process gets 11
+        assert numbers.session.execute(numbers.text(f"SELECT nextval('{order_numbers.SEQUENCE}')")).scalar() == 11
+
+    def test_block_is_dropped_after_fork(self, numbers, monkeypatch):
+        # a block inherited from the parent process must not be handed out twice
+        monkeypatch.setattr(order_numbers, '_block', deque([100, 101]))
+        monkeypatch.setattr(order_numbers, '_block_pid', -1)
+        assert order_numbers.next_order_number(numbers, ID_COLUMN) == 1
+        assert list(order_numbers._block) == []
+
+    def test_fallback_without_sequence(self, numbers, caplog):
+        _add_order(numbers, 41)
+        numbers.session.execute(numbers.text(f'DROP SEQUENCE {order_numbers.SEQUENCE}'))
+        try:
+            assert order_numbers.next_order_number(numbers, ID_COLUMN) == 42
+            assert order_numbers.next_order_number(numbers, ID_COLUMN) == 42
+            # the warning is logged once, not on every order
+            assert sum('falling back' in r.getMessage() for r in caplog.records) == 1
+        finally:
+            numbers.session.rollback()
+
+
+class TestSyncSequence:
+
+    def test_moves_past_existing_numbers(self, numbers):
+        _add_order(numbers, 500)
+        assert order_numbers.sync_sequence(numbers, ID_COLUMN) == 501
+        assert order_numbers.next_order_number(numbers, ID_COLUMN) == 501
+
+    def test_never_moves_back(self, numbers):
+        numbers.session.execute(numbers.text(f"SELECT setval('{order_numbers.SEQUENCE}', 1000)"))
+        _add_order(numbers, 500)
+        assert order_numbers.sync_sequence(numbers, ID_COLUMN) == 1001
+        assert order_numbers.sync_sequence(numbers, ID_COLUMN) == 1001
+
+    def test_creates_missing_sequence(self, numbers):
+        _add_order(numbers, 7)
+        numbers.session.execute(numbers.text(f'DROP SEQUENCE {order_numbers.SEQUENCE}'))
+        numbers.session.commit()
+        try:
+            order_numbers._missing_logged = True
+            assert order_numbers.sync_sequence(numbers, ID_COLUMN) == 8
+            assert order_numbers._missing_logged is False
+            numbers.session.commit()
+        finally:
+            numbers.session.execute(numbers.text(f'CREATE SEQUENCE IF NOT EXISTS {order_numbers.SEQUENCE}'))
+            numbers.session.commit()
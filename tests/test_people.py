@@ -1,4 +1,5 @@
 import pytest
+import time
 from io import BytesIO
 
 
@@ -88,6 +89,26 @@ Elena Smirnova,female,Forest St 10,+79998765432,elena@test.com"""
         response = client.post('/clients/import', follow_redirects=True)
         assert response.status_code == 200
     
+    def test_import_csv_async(self, client, auth_user):
+        csv_data = b"FIO,Phone\nAnna Async,+79001230000\nBoris Async,+79001230001\n"
+        response = client.post('/clients/import', data={'file': (BytesIO(csv_data), 'clients.csv'), 'async': '1'},
+                               headers={'Accept': 'application/json'})
+        assert response.status_code == 202
+        status_url = response.headers['Location']
+        for _ in range(100):
+            job = client.get(status_url).get_json()
+            if job['status'] in ('done', 'failed'):
+                break
+            time.sleep(0.05)
+        # practic2 is a legacy table that the test database does not have,
+        # so only the job bookkeeping is checked here
+        assert job['status'] == 'done', job
+        assert job['total'] == 2 and job['processed'] == 2
+
+    def test_import_status_unknown_job(self, client, auth_user):
+        response = client.get('/clients/import/nope')
+        assert response.status_code == 404
+
     def test_view_person_not_found(self, client, auth_user):
         response = client.get('/clients/nonexistent', follow_redirects=True)
         assert response.status_code == 200
@@ -97,3 +118,569 @@ Elena Smirnova,female,Forest St 10,+79998765432,elena@test.com"""
     def test_delete_person_requires_post(self, client, auth_user):
         response = client.get('/clients/test/delete', follow_redirects=False)
         assert response.status_code in [302, 405]
+
+    def test_view_person_by_id_not_found(self, client, auth_user):
+        response = client.get('/clients/999999', follow_redirects=True)
+        assert response.status_code == 200
+        assert 'не найден' in response.data.decode('utf-8', errors='ignore').lower()
+
+    def test_id_routes_win_over_fio_routes(self, app):
+        urls = app.url_map.bind('')
+        assert urls.match('/clients/42/orders/create', method='POST') == ('people.create_order', {'person_id': 42})
+        assert urls.match('/clients/Ivan Petrov/orders', method='GET') == ('people.view_orders_by_fio', {'fio': 'Ivan Petrov'})
+        assert urls.match('/clients/A/B/delete', method='POST') == ('people.delete_person_by_fio', {'fio': 'A/B'})
+
+    def test_get_people_pagination_args(self, client, auth_user):
+        response = client.get('/clients/?per_page=10&after=not-a-cursor')
+        assert response.status_code == 200
+
+    def test_get_people_streamed(self, client, auth_user):
+        response = client.get('/clients/')
+        assert response.is_streamed
+        assert 'Клиентов пока нет' in response.get_data(as_text=True)
+
+    def test_streamed_list_consumes_flashes(self, client, auth_user):
+        # the flash is shown while streaming, but must leave the session
+        # with the response headers, or it would be shown again
+        shown = client.get('/clients/999999', follow_redirects=True)
+        assert 'не найден' in shown.get_data(as_text=True)
+        again = client.get('/clients/')
+        assert 'не найден' not in again.get_data(as_text=True)
+
+    def test_buffered_stream_chunks(self):
+        from app.routes.people import _buffered
+        chunks = list(_buffered(['ab', 'cd', 'e', 'fgh', 'i'], size=4))
+        assert chunks == ['abcd', 'efgh', 'i']
+
+
+class TestBulkActions:
+
+    @pytest.fixture(autouse=True)
+    def practic2(self, client):
+        # practic2 is a legacy table outside db.metadata: a minimal copy for sqlite
+        from app import db
+        db.session.execute(db.text('CREATE TABLE practic2 (id INTEGER PRIMARY KEY, "ФИО" TEXT, "Пол" TEXT, '
+                                   '"Возраст" INTEGER, "Номер_телефона" TEXT, "Почта" TEXT, "Примечания" TEXT)'))
+        db.session.commit()
+        yield
+        db.session.rollback()
+        db.session.execute(db.text('DROP TABLE practic2'))
+        db.session.commit()
+
+    def _add_clients(self, *names):
+        from app import db
+        return [db.session.execute(db.text('INSERT INTO practic2 ("ФИО") VALUES (:fio) RETURNING id'),
+                                   {'fio': name}).scalar() for name in names]
+
+    def _notes(self):
+        from app import db
+        return dict(db.session.execute(db.text('SELECT "ФИО", "Примечания" FROM practic2')).fetchall())
+
+    def test_bulk_update_and_delete(self, client, auth_user):
+        ids = self._add_clients('A', 'B', 'C')
+        from app import db
+        db.session.commit()
+
+        response = client.post('/clients/bulk', data={'action': 'update', 'notes': 'VIP', 'ids': ids[:2] + ['x']},
+                               follow_redirects=True)
+        assert 'Обновлено клиентов: 2' in response.get_data(as_text=True)
+        assert self._notes() == {'A': 'VIP', 'B': 'VIP', 'C': None}
+
+        response = client.post('/clients/bulk', data={'action': 'delete', 'ids': [ids[0], ids[2], ids[0]]},
+                               follow_redirects=True)
+        assert 'Удалено клиентов: 2' in response.get_data(as_text=True)
+        assert list(self._notes()) == ['B']
+
+    def test_bulk_update_needs_notes(self, client, auth_user):
+        from app import db
+        ids = self._add_clients('A', 'B')
+        db.session.execute(db.text('UPDATE practic2 SET "Примечания" = \'keep\''))
+        db.session.commit()
+        for notes in ('', '   ', None):
+            data = {'action': 'update', 'ids': ids}
+            if notes is not None:
+                data['notes'] = notes
+            response = client.post('/clients/bulk', data=data, follow_redirects=True)
+            assert 'Введите примечание' in response.get_data(as_text=True)
+        assert self._notes() == {'A': 'keep', 'B': 'keep'}
+
+        response = client.post('/clients/bulk', data={'action': 'clear_notes', 'ids': ids[:1]}, follow_redirects=True)
+        assert 'Обновлено клиентов: 1' in response.get_data(as_text=True)
+        assert self._notes() == {'A': None, 'B': 'keep'}
+
+    def test_bulk_needs_selection(self, client, auth_user):
+        response = client.post('/clients/bulk', data={'action': 'delete'}, follow_redirects=True)
+        assert 'Отметьте клиентов' in response.get_data(as_text=True)
+
+    def test_list_has_checkboxes(self, app):
+        from flask import render_template
+        from app.routes.people_search import PersonRow
+        person = PersonRow(5, 'A', None, None, None, None, '', None, None)
+        with app.test_request_context('/clients/'):
+            html = render_template('clients.html', people=[person], filters={}, page={}, nav_args={})
+        assert 'id="clients-bulk"' in html
+        assert 'name="ids" value="5" form="clients-bulk"' in html
+
+    def test_bulk_orders_route(self, app):
+        urls = app.url_map.bind('')
+        assert urls.match('/clients/7/orders/bulk', method='POST') == ('people.bulk_orders', {'person_id': 7})
+
+    def test_bulk_requires_login(self, client):
+        ids = self._add_clients('A')
+        for url in ('/clients/bulk', f'/clients/{ids[0]}/orders/bulk'):
+            response = client.post(url, data={'action': 'delete', 'ids': ids, 'pks': ['1']})
+            assert response.status_code == 302
+            assert '/login' in response.headers['Location']
+        assert list(self._notes()) == ['A']
+
+
+class TestFioAddresses:
+    """Old /clients/<ФИО>/... addresses."""
+
+    @pytest.fixture(autouse=True)
+    def practic2(self, client):
+        # practic2 is a legacy table outside db.metadata: a minimal copy for sqlite
+        from app import db
+        db.session.execute(db.text('CREATE TABLE practic2 (id INTEGER PRIMARY KEY, "ФИО" TEXT)'))
+        db.session.execute(db.text('INSERT INTO practic2 ("ФИО") VALUES (\'Иванов\'), (\'Иванов\'), (\'Петров\')'))
+        db.session.commit()
+        yield
+        db.session.rollback()
+        db.session.execute(db.text('DROP TABLE practic2'))
+        db.session.commit()
+
+    def _fios(self):
+        from app import db
+        return [fio for fio, in db.session.execute(db.text('SELECT "ФИО" FROM practic2 ORDER BY id')).fetchall()]
+
+    def test_get_redirects_to_the_id(self, client, auth_user):
+        for method in (client.get, client.head):
+            response = method('/clients/Петров/orders')
+            assert response.status_code == 302
+            assert response.headers['Location'].endswith('/clients/3/orders')
+
+    def test_post_is_not_redirected(self, client, auth_user):
+        assert client.post('/clients/Сидоров/delete').status_code == 404
+        # namesakes: the change must not go to the first one
+        assert client.post('/clients/Иванов/delete').status_code == 409
+        assert self._fios() == ['Иванов', 'Иванов', 'Петров']
+        # a single client with this FIO: the action runs right away
+        response = client.post('/clients/Петров/delete')
+        assert response.status_code == 302 and response.headers['Location'].endswith('/clients/')
+        assert self._fios() == ['Иванов', 'Иванов']
+
+
+class TestBulkOrders:
+    """Bulk actions on the orders page of one client (Postgres)."""
+
+    def test_only_the_clients_orders(self, pg, pg_client):
+        from app.routes.order_links import link_orders
+        ids = [pg.session.execute(pg.text(
+            'INSERT INTO practic2 ("ФИО", "Номер_телефона", phone_digits) VALUES (:fio, :phone, :phone) RETURNING id'),
+            {'fio': fio, 'phone': phone}).scalar() for fio, phone in (('A', '79001112233'), ('B', '79002223344'))]
+        for number, phone in ((1, '79001112233'), (2, '79002223344')):
+            pg.session.execute(pg.text('INSERT INTO order2 ("номер_заказа", "клиент", "название", phone_digits) '
+                                       'VALUES (:n, :phone, \'x\', :phone)'), {'n': number, 'phone': phone})
+        link_orders(pg)
+        pg.session.commit()
+
+        response = pg_client.post(f'/clients/{ids[0]}/orders/bulk', data={'action': 'delete', 'pks': ['1', '2']},
+                                  follow_redirects=True)
+        assert 'Удалено заказов: 1' in response.get_data(as_text=True)
+        response = pg_client.post(f'/clients/{ids[0]}/orders/bulk', data={'action': 'update', 'status': 'x',
+                                                                          'pks': ['2']}, follow_redirects=True)
+        assert 'не принадлежат клиенту' in response.get_data(as_text=True)
+        assert pg.session.execute(pg.text('SELECT "номер_заказа", "статус_заказа" FROM order2')).fetchall() == [(2, None)]
+
+
+class TestPeopleSearchHelpers:
+
+    def test_cursor_roundtrip(self):
+        from app.routes.people_search import encode_cursor, decode_cursor
+        token = encode_cursor('Иванов Иван', 42)
+        assert decode_cursor(token) == ('Иванов Иван', 42)
+
+    def test_cursor_null_fio(self):
+        from app.routes.people_search import encode_cursor, decode_cursor
+        assert decode_cursor(encode_cursor(None, 7)) == ('', 7)
+
+    def test_cursor_garbage(self):
+        from app.routes.people_search import decode_cursor
+        assert decode_cursor('') is None
+        assert decode_cursor('%%%') is None
+        assert decode_cursor('bm90IGpzb24') is None
+
+    def test_like_escape(self):
+        from app.routes.people_search import _like_escape
+        assert _like_escape('50%_a\\b') == '50\\%\\_a\\\\b'
+
+    def test_text_clause_keeps_substring(self):
+        from app.routes.people_search import _text_clause
+        params = {}
+        # no word-start anchoring: 'ив' must still find 'Сивцев'
+        assert _text_clause('"ФИО"', 'fio', 'ив', params) == '"ФИО" ILIKE :fio'
+        assert params == {'fio': '%ив%'}
+
+
+class TestPhoneDigits:
+    """phone_digits is written with every phone and serves the phone search (Postgres)."""
+
+    def _digits(self, db, table='practic2'):
+        return [r[0] for r in db.session.execute(db.text(f'SELECT phone_digits FROM {table} ORDER BY 1')).fetchall()]
+
+    def test_add_and_edit(self, pg, pg_client):
+        pg_client.post('/clients/create', data={'fio': 'Иванов Иван', 'phone': '+7 (900) 111-22-33'})
+        assert self._digits(pg) == ['79001112233']
+        person_id = pg.session.execute(pg.text('SELECT id FROM practic2')).scalar()
+        pg.session.commit()
+        pg_client.post(f'/clients/{person_id}/edit', data={'phone': '8-900-444-55-66'})
+        assert self._digits(pg) == ['89004445566']
+
+    def test_import_and_order(self, pg, pg_client):
+        csv_data = 'ФИО,Номер_телефона\nИванов Иван,+7 900 111-22-33\nБез Телефона,\n'.encode()
+        pg_client.post('/clients/import', data={'file': (BytesIO(csv_data), 'clients.csv')})
+        assert self._digits(pg) == ['', '79001112233']
+        person_id = pg.session.execute(pg.text('SELECT id FROM practic2 WHERE "ФИО" = \'Иванов Иван\'')).scalar()
+        pg.session.commit()
+        pg_client.post(f'/clients/{person_id}/orders/create', data={'название': 'Заказ', 'цена': '100'})
+        assert self._digits(pg, 'order2') == ['79001112233']
+
+    def test_backfill(self, pg, runner):
+        pg.session.execute(pg.text(
+            'INSERT INTO practic2 ("ФИО", "Номер_телефона", phone_digits) VALUES '
+            "('A', '+7 900 111-22-33', NULL), ('B', '8 900 222', 'stale'), ('C', NULL, NULL), ('D', '1-2', '12')"))
+        pg.session.execute(pg.text(
+            'INSERT INTO order2 ("номер_заказа", "клиент") VALUES (1, \'+7 (900) 111-22-33\'), (2, \'Иванов\')'))
+        pg.session.commit()
+        result = runner.invoke(args=['clients', 'backfill-phones', '--batch-size', '2'])
+        assert 'practic2: обновлено 3' in result.output and 'order2: обновлено 2' in result.output
+        assert self._digits(pg) == ['', '12', '79001112233', '8900222']
+        assert self._digits(pg, 'order2') == ['', '79001112233']
+        # already filled rows are not rewritten
+        result = runner.invoke(args=['clients', 'backfill-phones'])
+        assert 'practic2: обновлено 0' in result.output and 'order2: обновлено 0' in result.output
+
+    def test_search_by_start_and_end_of_number(self, pg, pg_app):
+        from app.routes.people_search import search_people
+        rows = [('Иванов Иван', '8 (900) 111-22-33'), ('Петров Пётр', '+7 900 222-33-44'),
+                          ('Без Кода', '900 111 22 33')]
+        for fio, phone in rows:
+            pg.session.execute(pg.text(
+                'INSERT INTO practic2 ("ФИО", "Номер_телефона", phone_digits) VALUES (:fio, :phone, :digits)'),
+                {'fio': fio, 'phone': phone, 'digits': ''.join(c for c in phone if c.isdigit())})
+        pg.session.commit()
+
+        def found(phone):
+            with pg_app.test_request_context():
+                people, _filters, _page = search_people(pg, {'phone': phone})
+            return sorted(p.fio for p in people)
+
+        # another country/trunk prefix: matched on the last 10 digits
+        assert found('+7 900 111-22-33') == ['Без Кода', 'Иванов Иван']
+        assert found('8900') == ['Иванов Иван']
+        assert found('22-33-44') == ['Петров Пётр']
+        assert found('5555') == []
+
+
+class TestOrderSchema:
+
+    def test_derived_columns(self):
+        from app.routes.order_schema import OrderSchema
+        schema = OrderSchema([
+            {'name': 'id', 'is_nullable': 'NO', 'column_default': "nextval('x')", 'data_type': 'integer'},
+            {'name': 'номер_заказа', 'is_nullable': 'NO', 'column_default': None, 'data_type': 'bigint'},
+            {'name': 'Клиент_телефон', 'is_nullable': 'YES', 'column_default': None, 'data_type': 'text'},
+            {'name': 'название', 'is_nullable': 'NO', 'column_default': None, 'data_type': 'text'},
+        ], 'id')
+        assert schema.client_col == 'Клиент_телефон'
+        assert schema.required == ['номер_заказа', 'название']
+        assert schema.id_column == 'номер_заказа'
+        assert schema.pk_type == 'integer'
+        assert 'название' in schema and 'нет' not in schema
+
+    def test_empty_schema(self):
+        from app.routes.order_schema import OrderSchema
+        schema = OrderSchema([], None)
+        assert schema.client_col is None and schema.id_column is None and schema.pk_type is None
+
+
+class TestPeopleImport:
+
+    def test_row_values_from_english_headers(self):
+        from app.routes.people_import import map_row, row_values
+        values = row_values(map_row({' FIO ': 'Ivan', 'Phone Number': '+7 (900) 111-22-33', 'age': ''}))
+        assert values['ФИО'] == 'Ivan'
+        assert values['Возраст'] is None
+        assert values['phone_digits'] == '79001112233'
+
+    def test_error_report_keeps_first_line(self):
+        from app.routes.people_import import ImportResult
+        result = ImportResult()
+        result.add_error(3, ValueError('bad value\nLINE 1: INSERT ...'))
+        assert result.errors == ['Line 3: bad value']
+        assert result.failed == 1 and result.processed == 1
+
+    def test_validate_row_coerces(self):
+        from datetime import date, datetime
+        from app.routes.people_validation import validate_row
+        clean, errors, warnings = validate_row(1, {'fio': '  Иванов   Иван ', 'age': 30.0, 'birth_date': '15.01.1995',
+                                                   'phone': 79001112233.0, 'email': ' a@b.ru '})
+        assert errors == [] and warnings == []
+        assert clean['fio'] == 'Иванов Иван' and clean['age'] == 30
+        assert clean['birth_date'] == date(1995, 1, 15)
+        assert clean['phone'] == '79001112233' and clean['email'] == 'a@b.ru'
+        clean, errors, _warnings = validate_row(1, {'fio': 'X', 'birth_date': datetime(1990, 2, 3, 0, 0)})
+        assert errors == [] and clean['birth_date'] == date(1990, 2, 3) and clean['age'] is None
+
+    def test_validate_row_errors(self):
+        from app.routes.people_validation import validate_row
+        _clean, errors, _warnings = validate_row(7, {'fio': ' ', 'age': 'тридцать', 'birth_date': '31.02.2020'})
+        assert [e.field for e in errors] == ['fio', 'age', 'birth_date']
+        assert str(errors[0]) == 'Line 7: fio: required'
+        # the database would reject these: an error even without strict mode
+        for text in ('abc', 'вчера', '15-01-1995'):
+            _clean, errors, _warnings = validate_row(1, {'fio': 'A', 'birth_date': text})
+            assert [e.field for e in errors] == ['birth_date'], text
+
+    def test_validate_row_date_formats(self):
+        from datetime import date
+        from app.routes.people_validation import validate_row
+        for text in ('1995-01-15', '1995/01/15', '19950115', '15.01.1995', '15/01/1995', '1995-01-15 00:00:00'):
+            clean, errors, warnings = validate_row(1, {'fio': 'A', 'birth_date': text})
+            assert (clean['birth_date'], errors, warnings) == (date(1995, 1, 15), [], []), text
+
+    def test_doubtful_values_warn_and_keep_the_value(self):
+        from datetime import date
+        from app.routes.people_validation import validate_row
+        row = {'fio': 'A', 'age': '-1', 'birth_date': '1850-01-15', 'phone': '123', 'email': 'no-at.ru'}
+        clean, errors, warnings = validate_row(2, row)
+        assert errors == []
+        assert [w.field for w in warnings] == ['age', 'birth_date', 'phone', 'email']
+        assert (clean['age'], clean['birth_date'], clean['phone'], clean['email']) == (
+            -1, date(1850, 1, 15), '123', 'no-at.ru')
+        clean, errors, warnings = validate_row(2, row, strict=True)
+        assert [e.field for e in errors] == ['age', 'birth_date', 'phone', 'email'] and warnings == []
+
+    def test_invalid_rows_skip_the_insert(self):
+        from app.routes.people_import import import_rows
+
+        class NoDb:
+            class session:
+                @staticmethod
+                def begin_nested():
+                    raise AssertionError('no query expected for invalid rows')
+
+        result = import_rows(NoDb, [{'fio': ''}, {'fio': 'A', 'age': '30 лет'}, {'fio': 'B', 'phone': '1'}],
+                             strict=True)
+        assert result.success == 0 and result.failed == 3
+        assert result.errors == ['Line 1: fio: required', "Line 2: age: not a whole number: '30 лет'",
+                                 "Line 3: phone: 1 digits, expected 10..15: '1'"]
+
+    def test_rows_that_imported_before_still_import(self, client, auth_user, monkeypatch):
+        from app import db
+        # practic2 is a legacy table outside db.metadata: a minimal copy for sqlite
+        db.session.execute(db.text(
+            'CREATE TABLE practic2 (id INTEGER PRIMARY KEY, "ФИО" TEXT, "Пол" TEXT, "Адрес" TEXT, '
+            '"Возраст" INTEGER, "Дата_рождения" TEXT, "Номер_телефона" TEXT, "Почта" TEXT, '
+            '"Примечания" TEXT, phone_digits TEXT)'))
+        db.session.commit()
+        csv_data = ('ФИО,Возраст,Номер_телефона,Почта\n'
+                    'Старый Телефон,30,12-34-56,\n'
+                    'Без Домена,,,ivan@localhost\n'
+                    'Долгожитель,160,,\n'
+                    'Обычный,,+7 900 111-22-33,a@b.ru\n'
+                    ',25,79001112233,\n'
+                    'Возраст Словом,тридцать,,\n').encode()
+
+        def imported(strict):
+            monkeypatch.setitem(client.application.config, 'IMPORT_STRICT_VALIDATION', strict)
+            db.session.execute(db.text('DELETE FROM practic2'))
+            db.session.commit()
+            client.post('/clients/import', data={'file': (BytesIO(csv_data), 'clients.csv')})
+            return db.session.execute(db.text(
+                'SELECT "ФИО", "Возраст", "Номер_телефона", "Почта" FROM practic2 ORDER BY id')).fetchall()
+
+        try:
+            assert imported(False) == [('Старый Телефон', 30, '12-34-56', None),
+                                       ('Без Домена', None, None, 'ivan@localhost'),
+                                       ('Долгожитель', 160, None, None),
+                                       ('Обычный', None, '+7 900 111-22-33', 'a@b.ru')]
+            assert [r[0] for r in imported(True)] == ['Обычный']
+        finally:
+            db.session.rollback()
+            db.session.execute(db.text('DROP TABLE practic2'))
+            db.session.commit()
+
+    def test_header_mapping(self):
+        from app.routes.people_import import header_mapping
+        assert header_mapping([' FIO ', None, 'Phone Number', 'Дата рождения', 'x']) == {
+            'fio': 0, 'phone': 2, 'birth_date': 3}
+
+    def test_read_rows_streams_csv_and_gzip(self):
+        import gzip
+        from app.routes.people_import import read_rows
+        data = 'ФИО;x\n'.replace(';', ',').encode('utf-8-sig') + b'A,1\n\n,\nB\n'
+        for payload, name in ((data, 'c.csv'), (gzip.compress(data), 'c.CSV.GZ')):
+            rows = read_rows(BytesIO(payload), name)
+            assert not isinstance(rows, list)
+            assert list(rows) == [{'fio': 'A'}, {'fio': 'B'}]
+
+    def test_read_rows_errors(self):
+        from app.routes.people_import import ImportFileError, read_rows
+        with pytest.raises(ImportFileError):
+            read_rows(BytesIO(b''), 'c.csv')
+        with pytest.raises(ImportFileError):
+            read_rows(BytesIO(b'not gzip'), 'c.csv.gz')
+        with pytest.raises(ImportFileError):
+            read_rows(BytesIO(b'x'), 'c.txt')
+
+    def test_limit_rows_while_streaming(self):
+        from itertools import count
+        from app.routes.people_import import ImportFileError, limit_rows
+        assert list(limit_rows(iter('ab'), 2)) == ['a', 'b']
+        rows = limit_rows(count(), 3)
+        assert [next(rows) for _ in range(3)] == [0, 1, 2]
+        with pytest.raises(ImportFileError):
+            next(rows)
+
+    def test_dry_run_over_limit(self, client, auth_user, monkeypatch):
+        monkeypatch.setitem(client.application.config, 'IMPORT_MAX_ROWS', 2)
+        response = client.post('/clients/import?dry_run=1',
+                               data={'file': (BytesIO(b'fio\na\nb\nc\n'), 'clients.csv')})
+        assert response.status_code == 400
+        assert '2' in response.get_json()['error']
+
+    def test_dry_run_report(self, client, auth_user):
+        csv_data = 'ФИО,Возраст,Дата_рождения\nИван,30,1995-01-15\n,abc,1995-13-01\nПётр,,\n'.encode()
+        response = client.post('/clients/import?dry_run=1', data={'file': (BytesIO(csv_data), 'clients.csv')})
+        assert response.status_code == 200
+        report = response.get_json()
+        assert report['rows'] == 3 and report['valid'] == 2 and report['invalid'] == 1
+        assert [(e['line'], e['field']) for e in report['errors']] == [(2, 'fio'), (2, 'age'), (2, 'birth_date')]
+        assert report['errors_truncated'] is False
+
+
+class TestPeopleExport:
+
+    def test_csv_stream_header_and_rows(self):
+        from app.routes.people_export import csv_stream
+        out = ''.join(csv_stream(iter([[['Ivan', 'м', None, 30, None, '+7900', 'i@x.ru', None]]])))
+        lines = out.lstrip('\ufeff').splitlines()
+        assert lines[0].startswith('ФИО,Пол,')
+        assert lines[1] == 'Ivan,м,,30,,+7900,i@x.ru,'
+
+    def test_export_requires_login(self, client):
+        response = client.get('/clients/export', follow_redirects=False)
+        assert response.status_code == 302
+        assert '/login' in response.headers['Location']
+
+    def test_export_unknown_format(self, client, auth_user):
+        response = client.get('/clients/export?format=pdf', follow_redirects=True)
+        assert response.status_code == 200
+        assert '.csv' in response.data.decode('utf-8', errors='ignore')
+
+
+class TestSearchCache:
+
+    def test_lru_ttl_and_counters(self, monkeypatch):
+        from app.routes import search_cache
+        cache = search_cache.SearchCache()
+        cache.put('a', 1, max_size=2)
+        cache.put('b', 2, max_size=2)
+        assert cache.get('a', ttl=30) == 1
+        cache.put('c', 3, max_size=2)  # evicts 'b', the least recently used
+        assert cache.get('b', ttl=30) is None
+        assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+        now = search_cache.time.monotonic()
+        monkeypatch.setattr(search_cache.time, 'monotonic', lambda: now + 60)
+        assert cache.get('a', ttl=30) is None
+
+    def test_key_normalization_and_version(self):
+        from app.routes import search_cache
+        key = search_cache.make_key({'fio': ' Иван ', 'phone': '+7 (900)'})
+        assert key == search_cache.make_key({'fio': 'иван', 'phone': '7900'})
+        search_cache.invalidate()
+        assert search_cache.make_key({'fio': 'иван', 'phone': '7900'}) != key
+
+
+    def test_key_follows_the_practic2_version(self, app):
+        from flask import g
+        from app.routes import search_cache
+        with app.test_request_context():
+            plain = search_cache.make_key({'fio': 'иван'})
+            g.table_versions = {'practic2': 5, 'order2': 1}
+            v5 = search_cache.make_key({'fio': 'иван'})
+            g.table_versions = {'practic2': 6, 'order2': 1}
+            assert search_cache.make_key({'fio': 'иван'}) not in (plain, v5)
+
+    def test_conditional_page_skips_results_of_another_version(self, pg, pg_client, monkeypatch):
+        from datetime import datetime, timezone
+        from app.routes import conditional, search_cache
+        client = pg_client
+        state = [(('practic2', 1),), datetime(2026, 1, 1, tzinfo=timezone.utc)]
+        monkeypatch.setattr(conditional, 'table_versions', lambda db, tables: tuple(state))
+        client.get('/clients/?fio=x')
+        hits = search_cache.stats()['hits']
+        client.get('/clients/?fio=x')
+        assert search_cache.stats()['hits'] == hits + 1
+        # practic2 changed in another worker: this worker's cached page is not reused
+        state[0] = (('practic2', 2),)
+        client.get('/clients/?fio=x')
+        assert search_cache.stats()['hits'] == hits + 1
+
+class TestConditionalGet:
+
+    def test_no_version_table_no_etag(self, client, auth_user):
+        response = client.get('/clients/')
+        assert response.status_code == 200
+        assert 'ETag' not in response.headers
+
+    def test_etag_and_not_modified(self, client, auth_user, monkeypatch):
+        from datetime import datetime, timezone
+        from app.routes import conditional
+        versions = [(('practic2', 1),), datetime(2026, 1, 1, tzinfo=timezone.utc)]
+        monkeypatch.setattr(conditional, 'table_versions', lambda db, tables: tuple(versions))
+
+        first = client.get('/clients/')
+        etag = first.headers['ETag']
+        assert first.status_code == 200
+        assert first.headers['Cache-Control'] == 'private, no-cache'
+        assert first.headers['Last-Modified']
+
+        again = client.get('/clients/', headers={'If-None-Match': etag})
+        assert again.status_code == 304
+        assert again.data == b''
+        since = client.get('/clients/', headers={'If-Modified-Since': first.headers['Last-Modified']})
+        assert since.status_code == 304
+        # other query string - other page
+        assert client.get('/clients/?fio=x', headers={'If-None-Match': etag}).status_code == 200
+
+        versions[0] = (('practic2', 2),)
+        changed = client.get('/clients/', headers={'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert changed.headers['ETag'] != etag
+
+    def test_new_build_invalidates(self, app, client, auth_user, monkeypatch):
+        from datetime import datetime, timezone
+        from app.routes import conditional
+        state = ((('practic2', 1),), datetime(2000, 1, 1, tzinfo=timezone.utc))
+        monkeypatch.setattr(conditional, 'table_versions', lambda db, tables: state)
+        first = client.get('/clients/')
+        # the build is newer than the data: Last-Modified follows the build
+        assert first.last_modified.year > 2000
+        monkeypatch.setitem(app.config, 'APP_VERSION', 'release-2')
+        after_deploy = client.get('/clients/', headers={'If-None-Match': first.headers['ETag']})
+        assert after_deploy.status_code == 200
+        assert after_deploy.headers['ETag'] != first.headers['ETag']
+
+    def test_changed_at_never_moves_back(self, pg):
+        # a transaction that started earlier but commits later must not move Last-Modified back
+        read = 'SELECT version, changed_at FROM table_versions WHERE table_name = \'practic2\''
+        pg.session.execute(pg.text(
+            "UPDATE table_versions SET changed_at = clock_timestamp() + interval '1 hour' WHERE table_name = 'practic2'"))
+        pg.session.commit()
+        version, later = pg.session.execute(pg.text(read)).one()
+        pg.session.execute(pg.text('INSERT INTO practic2 ("ФИО") VALUES (\'A\')'))
+        pg.session.commit()
+        assert pg.session.execute(pg.text(read)).one() == (version + 1, later)
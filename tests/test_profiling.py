@@ -0,0 +1,99 @@
+import importlib.util
+import os
+
+from app import create_app
+
+
+def _load_report():
+    path = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'prof_report.py')
+    spec = importlib.util.spec_from_file_location('prof_report', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _profiled_app(tmp_path, **config):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'TESTING': True,
+        'PROFILE_DIR': str(tmp_path),
+        **config,
+    })
+
+
+class TestProfilerMiddleware:
+
+    def test_off_by_default(self, app):
+        from app.profiling import ProfilerMiddleware
+        assert not isinstance(app.wsgi_app, ProfilerMiddleware)
+
+    def test_selected_endpoint_with_rotation(self, tmp_path):
+        app = _profiled_app(tmp_path, PROFILE_ENDPOINTS='auth.login', PROFILE_KEEP=2)
+        client = app.test_client()
+        for _ in range(3):
+            assert client.get('/login', buffered=True).status_code == 200
+        client.get('/no-such-page', buffered=True)
+        assert os.listdir(tmp_path) == ['auth.login']
+        assert len(os.listdir(tmp_path / 'auth.login')) == 2
+
+    def test_sample_rate(self, tmp_path, monkeypatch):
+        from app import profiling
+        app = _profiled_app(tmp_path, PROFILE_SAMPLE_RATE=0.5)
+        client = app.test_client()
+        monkeypatch.setattr(profiling.random, 'random', lambda: 0.9)
+        client.get('/login', buffered=True)
+        assert not tmp_path.exists() or not os.listdir(tmp_path)
+        monkeypatch.setattr(profiling.random, 'random', lambda: 0.1)
+        client.get('/login', buffered=True)
+        assert len(os.listdir(tmp_path / 'auth.login')) == 1
+
+
+    def test_one_profiled_request_at_a_time(self, tmp_path):
+        from app import profiling
+        app = _profiled_app(tmp_path, PROFILE_ENDPOINTS='auth.login')
+        client = app.test_client()
+        # another request is being profiled: this one is served unprofiled
+        with profiling._active:
+            assert client.get('/login', buffered=True).status_code == 200
+        assert not tmp_path.exists() or not os.listdir(tmp_path)
+        client.get('/login', buffered=True)
+        assert len(os.listdir(tmp_path / 'auth.login')) == 1
+
+    def test_skipped_when_another_profiler_is_active(self, tmp_path, monkeypatch):
+        import cProfile
+        from app import profiling
+
+        class Busy(cProfile.Profile):
+            def enable(self, *args, **kwargs):
+                # what Python 3.12+ raises while another profiler runs
+                raise ValueError('Another profiling tool is already active')
+
+        app = _profiled_app(tmp_path, PROFILE_ENDPOINTS='auth.login')
+        monkeypatch.setattr(profiling.cProfile, 'Profile', Busy)
+        assert app.test_client().get('/login', buffered=True).status_code == 200
+        assert not tmp_path.exists() or not os.listdir(tmp_path)
+        assert not profiling._active.locked()
+
+class TestProfReport:
+
+    def test_top_and_dot(self, tmp_path, capsys):
+        app = _profiled_app(tmp_path, PROFILE_ENDPOINTS='auth.login')
+        client = app.test_client()
+        client.get('/login', buffered=True)
+        client.get('/login', buffered=True)
+        report = _load_report()
+
+        files = report.find_profiles([str(tmp_path)], endpoint='auth.login')
+        assert len(files) == 2
+        stats = report.load_stats(files)
+        rows = report.top_functions(stats, 5)
+        assert len(rows) == 5
+        assert rows[0][1][3] >= rows[-1][1][3]
+
+        dot = report.to_dot(stats, node_threshold=5)
+        assert dot.startswith('digraph profile {') and '->' in dot
+
+        dot_file = tmp_path / 'out.dot'
+        assert report.main([str(tmp_path), '--top', '3', '--dot', str(dot_file)]) == 0
+        assert dot_file.read_text(encoding='utf-8').startswith('digraph')
+        assert '2 profile(s)' in capsys.readouterr().out